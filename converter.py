@@ -1,551 +1,3066 @@
-# # batch_pkl_to_json_converter.py
-# # 批量PKL文件转JSON转换脚本 - 支持多文件夹和分批处理
-# # 使用方法: python batch_pkl_to_json_converter.py
-
-# import pickle
-# import json
-# import os
-# import glob
-# import argparse
-# from datetime import datetime
-# import sys
-# from pathlib import Path
-
-# class BatchPKLToJSONConverter:
-#     def __init__(self, base_data_path, base_output_path):
-#         """
-#         初始化批量转换器
-        
-#         Args:
-#             base_data_path: 数据根目录路径（包含各个PKL文件和文件夹的根目录）
-#             base_output_path: 输出根目录路径
-#         """
-#         self.base_data_path = Path(base_data_path)
-#         self.base_output_path = Path(base_output_path)
-#         self.ensure_base_output_directory()
-        
-#         # 数据源配置
-#         self.data_sources = {
-#             'Part1': {
-#                 'pkl_file': 'Part1.pkl',
-#                 'image_folder': 'Part1',
-#                 'output_folder': 'part1_data'
-#             },
-#             'Part2': {
-#                 'pkl_file': 'Part2.pkl', 
-#                 'image_folder': 'Part2',
-#                 'output_folder': 'part2_data'
-#             },
-#             'PartNormal': {
-#                 'pkl_file': 'PartNormal.pkl',
-#                 'image_folder': 'PartNormal', 
-#                 'output_folder': 'partnormal_data'
-#             }
-#         }
-        
-#         # LLM响应目录
-#         self.llm_response_folder = 'LLMResponse'
-    
-#     def ensure_base_output_directory(self):
-#         """确保基础输出目录存在"""
-#         self.base_output_path.mkdir(parents=True, exist_ok=True)
-#         print(f"基础输出目录: {self.base_output_path}")
-    
-#     def load_pkl_file(self, file_path):
-#         """安全加载PKL文件"""
-#         try:
-#             with open(file_path, 'rb') as f:
-#                 data = pickle.load(f)
-#                 print(f"✓ 成功加载: {file_path.name} ({self.format_file_size(file_path)})")
-#                 return data
-#         except Exception as e:
-#             print(f"✗ 加载失败 {file_path}: {e}")
-#             return None
-    
-#     def save_json_file(self, data, file_path):
-#         """保存JSON文件"""
-#         try:
-#             file_path.parent.mkdir(parents=True, exist_ok=True)
-#             with open(file_path, 'w', encoding='utf-8') as f:
-#                 json.dump(data, f, ensure_ascii=False, indent=2)
-#             print(f"✓ 已保存: {file_path} ({self.format_file_size(file_path)})")
-#             return True
-#         except Exception as e:
-#             print(f"✗ 保存失败 {file_path}: {e}")
-#             return False
-    
-#     def format_file_size(self, file_path):
-#         """格式化文件大小显示"""
-#         try:
-#             size = file_path.stat().st_size
-#             for unit in ['B', 'KB', 'MB', 'GB']:
-#                 if size < 1024:
-#                     return f"{size:.1f} {unit}"
-#                 size /= 1024
-#             return f"{size:.1f} TB"
-#         except:
-#             return "未知大小"
-    
-#     def safe_int(self, value):
-#         """安全地转换为整数"""
-#         try:
-#             if isinstance(value, str):
-#                 cleaned = ''.join(c for c in value if c.isdigit() or c == '-')
-#                 return int(cleaned) if cleaned and cleaned != '-' else 0
-#             return int(value) if value is not None else 0
-#         except (ValueError, TypeError):
-#             return 0
-    
-#     def convert_single_post(self, post_data):
-#         """转换单个帖子数据"""
-#         try:
-#             # 处理评论数据
-#             comments = []
-#             if 'all_comments' in post_data and post_data['all_comments']:
-#                 for comment in post_data['all_comments']:
-#                     comments.append({
-#                         'comment_id': comment.get('comment_id', ''),
-#                         'content': comment.get('content', ''),
-#                         'user_id': comment.get('user_id', ''),
-#                         'nickname': comment.get('nickname', ''),
-#                         'avatar': comment.get('avatar', ''),
-#                         'like_count': self.safe_int(comment.get('like_count', 0)),
-#                         'sub_comment_count': self.safe_int(comment.get('sub_comment_count', 0)),
-#                         'create_time': self.safe_int(comment.get('create_time', 0)),
-#                         'parent_comment_id': comment.get('parent_comment_id', '0')
-#                     })
+# converter.py
+# 小红书数据转换脚本
+# - BatchPKLToJSONConverter: 分区帖子PKL (Part1/Part2/PartNormal) 批量转JSON
+# - LLMResponseConverter: LLM响应PKL逐文件转JSON
+# 使用方法:
+#   python converter.py                  # LLM响应逐文件转换
+#   python converter.py --io-threads 2   # LLM响应流水线转换 (读取/写入与处理重叠)
+#   python converter.py --log-level verbose  # 输出逐文件的详细过程 (默认只输出进度与汇总)
+#   python converter.py --batch          # 分区数据批量转换
+#   python converter.py --batch --format minified --compress gzip br  # 紧凑JSON + 预压缩副本
+#   python converter.py --batch --columnar  # 额外导出 Parquet 列式文件 (需要 pyarrow)
+#   python converter.py --batch --thumbnails -w 4  # 4 个进程生成图片缩略图 (需要 Pillow)
+#   python converter.py --batch --image-store    # 图片按内容哈希去重存放到 blobs/
+#   python converter.py --watch          # 持续监视 LLMResponse，新的PKL写入完成后自动增量转换
+
+import pickle
+import pickletools
+import json
+import os
+import glob
+import fnmatch
+import argparse
+from datetime import datetime, timezone, timedelta
+import sys
+import time
+from pathlib import Path
+import traceback
+import hashlib
+import zlib
+import base64
+import io
+import re
+import struct
+import gzip
+import shutil
+import mmap
+import queue
+import threading
+from collections import OrderedDict, Counter
+from contextlib import nullcontext, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+# 可选依赖：MessagePack 输出与 Brotli 预压缩，未安装时对应选项不可用
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 可选依赖：列式导出 (Parquet)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# 可选依赖：监视模式使用系统文件事件 (inotify / FSEvents)，未安装时定期扫描目录
+try:
+    from watchdog.observers import Observer as WatchdogObserver
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    WatchdogObserver = None
+    FileSystemEventHandler = object
+
+# 可选依赖：图片衍生版本（缩略图、模糊占位图）
+try:
+    from PIL import Image, ImageFilter, ImageOps, features as pil_features
+except ImportError:
+    Image = None
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """分块计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 与原 json.dumps 参数保持一致，保证输出字节不变
+JSON_ENCODER = json.JSONEncoder(
+    ensure_ascii=False,  # 允许非ASCII字符
+    indent=2,
+    separators=(',', ': '),
+    sort_keys=False,
+    default=str  # 对于无法序列化的对象，转换为字符串
+)
+
+# 紧凑JSON：不缩进、分隔符不带空格
+MINIFIED_JSON_ENCODER = json.JSONEncoder(
+    ensure_ascii=False,
+    separators=(',', ':'),
+    sort_keys=False,
+    default=str
+)
+
+# indent=2 时顶层元素所在行: 恰好两个空格缩进，且不是闭合括号
+_TOP_LEVEL_ITEM_PATTERN = re.compile(rb'\n  [^ \]}]')
+
+def write_json_file(data, file_path, encoder=JSON_ENCODER, stream=False, buffer_size=256 * 1024):
+    """
+    编码并写入JSON，同时计算SHA-256
+    
+    默认一次性编码整个文档：紧凑格式 (indent=None) 时 json 使用C加速的编码器，比逐块的 iterencode 快数倍。
+    stream=True 时逐块编码写入，不在内存中保留完整的编码结果（较大的分片文件使用）。
+    先写临时文件再原子替换，监视模式下前端读取正在更新的文件时不会读到一半的内容
+    
+    Returns:
+        (写入字节数, SHA-256十六进制字符串)
+    """
+    digest = hashlib.sha256()
+    written = 0
+    
+    file_path = Path(file_path)
+    temp_path = file_path.with_name(file_path.name + '.tmp')
+    try:
+        with open(temp_path, 'wb') as f:
+            if not stream:
+                block = encoder.encode(data).encode('utf-8')
+                digest.update(block)
+                f.write(block)
+                written = len(block)
+            else:
+                pending = []
+                pending_chars = 0
+                for chunk in encoder.iterencode(data):
+                    pending.append(chunk)
+                    pending_chars += len(chunk)
+                    if pending_chars >= buffer_size:
+                        block = ''.join(pending).encode('utf-8')
+                        digest.update(block)
+                        f.write(block)
+                        written += len(block)
+                        pending = []
+                        pending_chars = 0
+                
+                if pending:
+                    block = ''.join(pending).encode('utf-8')
+                    digest.update(block)
+                    f.write(block)
+                    written += len(block)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+    
+    return written, digest.hexdigest()
+
+def scan_json_file(file_path, chunk_size=1024 * 1024):
+    """
+    不解析JSON，只读取一遍文件，计算SHA-256并统计顶层元素个数（indent=2 格式）
+    
+    Returns:
+        (文件字节数, SHA-256十六进制字符串, 顶层元素个数)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    records = 0
+    tail = b''
+    
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+            # 带上上一块末尾3字节，避免跨块的匹配被漏掉
+            records += len(_TOP_LEVEL_ITEM_PATTERN.findall(tail + chunk))
+            tail = chunk[-3:]
+    
+    return size, digest.hexdigest(), records
+
+def count_top_level_records(data):
+    """顶层记录数：dict/list/tuple 返回元素个数，其他类型返回 None（不校验）"""
+    if isinstance(data, (dict, list, tuple)):
+        return len(data)
+    return None
+
+class StreamingJSONWriter:
+    """
+    增量写入JSON数组或对象，输出格式与 json.dump 使用同一编码器时一致（indent=2 或紧凑格式），
+    完整文档不会在内存中构建；先写临时文件，关闭时再原子替换目标文件
+    """
+    
+    def __init__(self, file_path, container='list', encoder=JSON_ENCODER):
+        """
+        Args:
+            file_path: 输出文件路径
+            container: 'list' 写JSON数组，'dict' 写JSON对象
+            encoder: 单个元素使用的JSON编码器（indent=2 或不缩进）
+        """
+        self.file_path = Path(file_path)
+        self.temp_path = self.file_path.with_suffix(self.file_path.suffix + '.tmp')
+        self.container = container
+        self.encoder = encoder
+        self.pretty = encoder.indent is not None
+        self.count = 0
+        
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.temp_path, 'w', encoding='utf-8', newline='')
+        self.file.write('[' if container == 'list' else '{')
+    
+    def write(self, value, key=None):
+        """写入一个元素（对象模式下需要提供key）"""
+        encoded = self.encoder.encode(value)
+        if self.pretty:
+            # JSON字符串内不含真实换行，整体缩进一级即可嵌入外层容器
+            encoded = encoded.replace('\n', '\n  ')
+            prefix = ',\n  ' if self.count else '\n  '
+        else:
+            prefix = ',' if self.count else ''
+        if self.container == 'dict':
+            prefix += self.encoder.encode(str(key)) + self.encoder.key_separator
+        self.file.write(prefix + encoded)
+        self.count += 1
+    
+    def close(self):
+        """写入结尾并替换目标文件"""
+        closing = ']' if self.container == 'list' else '}'
+        self.file.write('\n' + closing if self.count and self.pretty else closing)
+        self.file.close()
+        os.replace(self.temp_path, self.file_path)
+    
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        self.file.close()
+        if self.temp_path.exists():
+            self.temp_path.unlink()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class StreamingMsgpackWriter:
+    """
+    增量写入MessagePack数组或映射，接口与 StreamingJSONWriter 相同
+    
+    MessagePack 需要在开头写入元素个数，因此元素先逐个编码到暂存文件，
+    关闭时写入头部并拼接暂存内容，再原子替换目标文件
+    """
+    
+    def __init__(self, file_path, container='list'):
+        self.file_path = Path(file_path)
+        self.temp_path = self.file_path.with_suffix(self.file_path.suffix + '.tmp')
+        self.spool_path = self.file_path.with_suffix(self.file_path.suffix + '.spool')
+        self.container = container
+        self.packer = msgpack.Packer(default=str, use_bin_type=True)
+        self.count = 0
+        
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.spool = open(self.spool_path, 'w+b')
+    
+    def write(self, value, key=None):
+        """写入一个元素（映射模式下需要提供key）"""
+        if self.container == 'dict':
+            self.spool.write(self.packer.pack(str(key)))
+        self.spool.write(self.packer.pack(value))
+        self.count += 1
+    
+    def close(self):
+        """写入头部与暂存内容并替换目标文件"""
+        if self.container == 'list':
+            header = self.packer.pack_array_header(self.count)
+        else:
+            header = self.packer.pack_map_header(self.count)
+        
+        self.spool.seek(0)
+        with open(self.temp_path, 'wb') as f:
+            f.write(header)
+            shutil.copyfileobj(self.spool, f, 1024 * 1024)
+        self.spool.close()
+        self.spool_path.unlink()
+        os.replace(self.temp_path, self.file_path)
+    
+    def abort(self):
+        """放弃写入，删除暂存与临时文件"""
+        self.spool.close()
+        for path in (self.spool_path, self.temp_path):
+            if path.exists():
+                path.unlink()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class OutputFormat:
+    """
+    输出格式选项
+    
+    - json: indent=2 的JSON（默认，与原输出字节一致）
+    - minified: 紧凑JSON
+    - msgpack: MessagePack 二进制（需要安装 msgpack）
+    
+    另外可在写入后生成预压缩副本 (.gz / .br)，静态服务器可直接返回而无需每次请求时压缩。
+    配置与索引文件始终为JSON，只有数据文件使用 msgpack
+    """
+    
+    FORMATS = ('json', 'minified', 'msgpack')
+    # 压缩方式 -> 副本文件后缀
+    COMPRESSIONS = {'gzip': '.gz', 'br': '.br'}
+    
+    def __init__(self, name='json', compressions=()):
+        if name not in self.FORMATS:
+            raise ValueError(f"不支持的输出格式: {name}")
+        if name == 'msgpack' and msgpack is None:
+            raise ValueError("msgpack 输出需要安装 msgpack: pip install msgpack")
+        
+        self.name = name
+        self.compressions = []
+        for compression in compressions:
+            if compression not in self.COMPRESSIONS:
+                raise ValueError(f"不支持的压缩方式: {compression}")
+            if compression == 'br' and brotli is None:
+                print("⚠ 未安装 brotli，跳过 .br 预压缩 (pip install brotli)")
+                continue
+            if compression not in self.compressions:
+                self.compressions.append(compression)
+    
+    @property
+    def suffix(self):
+        """数据文件后缀"""
+        return '.msgpack' if self.name == 'msgpack' else '.json'
+    
+    @property
+    def json_encoder(self):
+        """JSON文件（数据文件及配置文件）使用的编码器"""
+        return JSON_ENCODER if self.name == 'json' else MINIFIED_JSON_ENCODER
+    
+    def describe(self):
+        """记录到配置与清单中的格式描述"""
+        return {"format": self.name, "compressions": list(self.compressions)}
+    
+    def open_writer(self, file_path, container='list'):
+        """创建数据文件的流式写入器"""
+        if self.name == 'msgpack':
+            return StreamingMsgpackWriter(file_path, container)
+        return StreamingJSONWriter(file_path, container, self.json_encoder)
+    
+    def write(self, data, file_path, stream=False):
+        """
+        写入一个完整的数据文件
+        
+        Args:
+            stream: JSON格式时逐块编码写入 (见 write_json_file)
+        
+        Returns:
+            (写入字节数, SHA-256十六进制字符串)
+        """
+        if self.name == 'msgpack':
+            return self.write_bytes(self.encode(data), file_path)
+        return write_json_file(data, file_path, self.json_encoder, stream=stream)
+    
+    def encode(self, data):
+        """将完整数据文件编码为字节，与 write 写入的内容一致（流水线中编码与写入分开执行）"""
+        if self.name == 'msgpack':
+            return msgpack.packb(data, default=str, use_bin_type=True)
+        return self.json_encoder.encode(data).encode('utf-8')
+    
+    def write_bytes(self, block, file_path):
+        """
+        写入已编码的数据文件
+        
+        Returns:
+            (写入字节数, SHA-256十六进制字符串)
+        """
+        temp_path = Path(file_path).with_name(Path(file_path).name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(block)
+        os.replace(temp_path, file_path)
+        return len(block), hashlib.sha256(block).hexdigest()
+    
+    def write_config(self, data, file_path):
+        """写入配置/索引文件（始终为JSON）"""
+        return write_json_file(data, file_path, self.json_encoder)
+    
+    def load(self, file_path):
+        """读取本格式写出的数据文件"""
+        if self.name == 'msgpack':
+            with open(file_path, 'rb') as f:
+                return msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def sibling_paths(self, file_path):
+        """预压缩副本路径 {压缩方式: 路径}"""
+        file_path = Path(file_path)
+        return {
+            compression: file_path.with_name(file_path.name + self.COMPRESSIONS[compression])
+            for compression in self.compressions
+        }
+    
+    def compress(self, file_path, chunk_size=1024 * 1024):
+        """
+        为文件生成预压缩副本（先写临时文件再原子替换），并删除未启用压缩方式的旧副本
+        
+        Returns:
+            {压缩方式: 副本路径}
+        """
+        siblings = self.sibling_paths(file_path)
+        self.remove_siblings(file_path, keep=siblings)
+        for compression, sibling_path in siblings.items():
+            temp_path = sibling_path.with_name(sibling_path.name + '.tmp')
+            with open(file_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                if compression == 'gzip':
+                    # mtime=0 使相同内容得到相同的压缩文件
+                    with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=9, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, chunk_size)
+                else:
+                    compressor = brotli.Compressor(quality=11)
+                    for chunk in iter(lambda: src.read(chunk_size), b''):
+                        dst.write(compressor.process(chunk))
+                    dst.write(compressor.finish())
+            os.replace(temp_path, sibling_path)
+        return siblings
+    
+    def remove_siblings(self, file_path, keep=()):
+        """删除文件的预压缩副本（包括本次未启用的压缩方式），keep 中的压缩方式除外"""
+        file_path = Path(file_path)
+        for compression, extension in self.COMPRESSIONS.items():
+            sibling_path = file_path.with_name(file_path.name + extension)
+            if compression not in keep and sibling_path.exists():
+                sibling_path.unlink()
+    
+    def encodings_for(self, file_path, url_path):
+        """前端配置中描述可用编码：[{encoding, path, size}]，便于客户端选择最小的版本"""
+        return [
+            {
+                "encoding": compression,
+                "path": url_path + self.COMPRESSIONS[compression],
+                "size": sibling_path.stat().st_size
+            }
+            for compression, sibling_path in self.sibling_paths(file_path).items()
+        ]
+
+class PickleCache:
+    """
+    进程内共享的PKL加载器
+    
+    - 每个文件只读取一次字节 (较大的文件使用 mmap)，各解码策略都在内存中重试，不重新打开文件
+    - 先根据协议头与开头部分的操作码判断应使用的解码策略，再参考每个文件及每个目录上次成功的策略，
+      完整解析失败后重试只是例外情况
+    - 调用方传入 cache=True 时解码后的对象保存在有界 LRU 中，以 (路径, 大小, 修改时间) 为键；
+      一次运行中只读取一遍的文件默认不缓存，避免解码后的对象在整个运行期间占用内存。
+      转换器不会修改加载的对象
+    """
+    
+    # 解码策略: (名称, pickle.loads 参数)
+    STRATEGIES = (
+        ('standard', {}),
+        ('encoding', {'encoding': 'bytes'}),
+        ('encoding', {'encoding': 'latin-1'}),
+        ('encoding', {'encoding': 'utf-8'}),
+        ('fix_imports', {'fix_imports': True}),
+    )
+    MMAP_THRESHOLD = 16 * 1024 * 1024
+    # 判断解码策略时最多检查的字节数
+    SNIFF_BYTES = 64 * 1024
+    # Python 2 的 str 对应的操作码，Python 3 中按 encoding 参数解码
+    PY2_STRING_OPCODES = frozenset(('STRING', 'BINSTRING', 'SHORT_BINSTRING'))
+    
+    def __init__(self, max_entries=256, max_bytes=512 * 1024 * 1024):
+        """
+        Args:
+            max_entries: LRU 最多保存的对象数
+            max_bytes: LRU 中对象对应源文件的总字节数上限，超过该上限的单个文件不缓存
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.cached_bytes = 0
+        self.file_strategies = {}
+        self.directory_strategies = {}
+        self.hits = 0
+        self.misses = 0
+        # 本次运行的策略统计: 成功的策略、失败的完整解析次数
+        self.strategy_wins = Counter()
+        self.failed_parses = 0
+    
+    def sniff_strategy(self, buffer):
+        """
+        根据协议头与操作码判断解码策略，返回策略下标，无法判断时为 None
+        
+        - 协议 3 及以上只可能由 Python 3 写入：标准加载
+        - 其余协议检查开头部分的操作码：出现含非 ASCII 字节的 Python 2 str 时标准加载必然失败，
+          直接使用 encoding='bytes' (与按默认顺序尝试的结果一致)；没有时使用标准加载
+        """
+        if len(buffer) >= 2 and buffer[0] == pickle.PROTO[0] and buffer[1] >= 3:
+            return 0
+        
+        try:
+            for opcode, arg, _ in pickletools.genops(bytes(buffer[:self.SNIFF_BYTES])):
+                if opcode.name in self.PY2_STRING_OPCODES:
+                    raw = arg.encode('latin-1') if isinstance(arg, str) else arg
+                    if not raw.isascii():
+                        return 1
+        except UnicodeDecodeError:
+            # 协议 0 的 STRING 操作码含非 ASCII 字节时 pickletools 本身就无法按 ASCII 解码
+            return 1
+        except Exception:
+            # 只检查了开头部分，截断处或无法识别的操作码处停止
+            pass
+        return 0 if len(buffer) <= self.SNIFF_BYTES else None
+    
+    def strategy_order(self, file_path, buffer):
+        """尝试顺序：该文件上次成功的策略、按文件头判断的策略、同目录上次成功的策略，然后是默认顺序"""
+        preferred = [
+            self.file_strategies.get(str(file_path)),
+            self.sniff_strategy(buffer),
+            self.directory_strategies.get(str(file_path.parent))
+        ]
+        order = []
+        for index in preferred + list(range(len(self.STRATEGIES))):
+            if index is not None and index not in order:
+                order.append(index)
+        return order
+    
+    def read_buffer(self, file_handle, size):
+        """读取整个文件：较大的文件使用只读 mmap"""
+        if size >= self.MMAP_THRESHOLD:
+            return mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return file_handle.read()
+    
+    def load(self, file_path, cache=False, verbose=False, buffer=None):
+        """
+        加载PKL文件
+        
+        Args:
+            file_path: PKL文件路径
+            cache: 是否将结果放入 LRU (同一文件会被重复读取时传 True)
+            verbose: 是否打印每个策略的结果
+            buffer: 已预先读取的文件内容，为 None 时读取文件
+        
+        Returns:
+            (数据, 错误信息)，成功时错误信息为 None
+        """
+        # 缓存键与策略记录统一使用解析后的绝对路径
+        file_path = Path(file_path).resolve()
+        stat = file_path.stat()
+        key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if verbose:
+                print(f"    ✓ 命中PKL缓存")
+            return self.entries[key], None
+        self.misses += 1
+        
+        last_error = None
+        with open(file_path, 'rb') if buffer is None else nullcontext() as f:
+            if buffer is None:
+                buffer = self.read_buffer(f, stat.st_size)
+            try:
+                for index in self.strategy_order(file_path, buffer):
+                    method, kwargs = self.STRATEGIES[index]
+                    try:
+                        data = pickle.loads(buffer, **kwargs)
+                    except Exception as e:
+                        last_error = e
+                        self.failed_parses += 1
+                        if verbose:
+                            print(f"    ✗ 策略{index + 1}失败: {str(e)[:100]}")
+                        continue
+                    
+                    if verbose:
+                        print(f"    ✓ 策略{index + 1}成功: {method}")
+                    if data is None:
+                        self.failed_parses += 1
+                        if verbose:
+                            print(f"    ⚠ 数据为空")
+                        continue
+                    
+                    self.strategy_wins[self.strategy_label(index)] += 1
+                    self.file_strategies[str(file_path)] = index
+                    self.directory_strategies[str(file_path.parent)] = index
+                    if cache:
+                        self.store(key, data, stat.st_size)
+                    return data, None
+            finally:
+                if isinstance(buffer, mmap.mmap):
+                    buffer.close()
+        
+        return None, f"所有加载策略都失败: {last_error}" if last_error else "所有加载策略都失败"
+    
+    def store(self, key, data, size):
+        """放入 LRU，超出条数或字节上限时淘汰最久未使用的对象"""
+        if size > self.max_bytes:
+            return
+        self.entries[key] = data
+        self.cached_bytes += size
+        while len(self.entries) > self.max_entries or self.cached_bytes > self.max_bytes:
+            evicted_key, _ = self.entries.popitem(last=False)
+            self.cached_bytes -= evicted_key[1]
+    
+    def strategy_label(self, index):
+        method, kwargs = self.STRATEGIES[index]
+        return f"{method}({kwargs['encoding']})" if 'encoding' in kwargs else method
+    
+    def describe(self):
+        description = f"PKL缓存: 命中 {self.hits} 次, 解码 {self.misses} 次, 当前缓存 {len(self.entries)} 个对象"
+        if self.strategy_wins or self.failed_parses:
+            wins = ', '.join(f"{label} {count}" for label, count in self.strategy_wins.most_common())
+            description += f"; 成功策略: {wins or '无'}; 失败的完整解析: {self.failed_parses} 次"
+        return description
+
+# 默认共享的PKL加载缓存
+PICKLE_CACHE = PickleCache()
+
+# batch_pkl_to_json_converter.py
+# 批量PKL文件转JSON转换脚本 - 支持多文件夹和分批处理
+
+# 图片清单支持的扩展名
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+def read_image_size(file_path):
+    """
+    只读取文件头获取图片像素尺寸，支持 JPEG/PNG/GIF/WebP
+    
+    Returns:
+        (width, height)，无法识别时返回 (None, None)
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(32)
+            
+            # PNG: IHDR 紧跟在签名之后
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
             
-#             # 转换后的帖子数据
-#             converted = {
-#                 'note_id': post_data.get('note_id', ''),
-#                 'type': post_data.get('type', 'image'),
-#                 'title': post_data.get('title', ''),
-#                 'desc': post_data.get('desc', ''),
-#                 'video_url': post_data.get('video_url', ''),
-#                 'time': self.safe_int(post_data.get('time', 0)),
-#                 'user_id': post_data.get('user_id', ''),
-#                 'nickname': post_data.get('nickname', ''),
-#                 'avatar': post_data.get('avatar', ''),
-#                 'liked_count': self.safe_int(post_data.get('liked_count', 0)),
-#                 'collected_count': self.safe_int(post_data.get('collected_count', 0)),
-#                 'comment_count': self.safe_int(post_data.get('comment_count', 0)),
-#                 'share_count': self.safe_int(post_data.get('share_count', 0)),
-#                 'image_list': post_data.get('image_list', ''),
-#                 'tag_list': post_data.get('tag_list', ''),
-#                 'source_keyword': post_data.get('source_keyword', ''),
-#                 'all_comments': comments,
-#                 'image_folder_path': post_data.get('image_folder_path', ''),
-#                 'ip_location': post_data.get('ip_location', ''),
-#                 'note_url': post_data.get('note_url', ''),
-#                 'xsec_token': post_data.get('xsec_token', ''),
-#                 'last_modify_ts': post_data.get('last_modify_ts', 0),
-#                 'last_update_time': post_data.get('last_update_time', 0)
-#             }
+            # GIF: 逻辑屏幕宽高（小端）
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', head[6:10])
             
-#             return converted
+            # WebP: VP8 / VP8L / VP8X 三种格式
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                chunk = head[12:16]
+                if chunk == b'VP8 ':
+                    width, height = struct.unpack('<HH', head[26:30])
+                    return width & 0x3fff, height & 0x3fff
+                if chunk == b'VP8L':
+                    bits = int.from_bytes(head[21:25], 'little')
+                    return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+                if chunk == b'VP8X':
+                    return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+                return None, None
             
-#         except Exception as e:
-#             print(f"✗ 转换帖子数据失败: {e}")
-#             return None
+            # JPEG: 逐段查找 SOF 标记
+            if head[:2] == b'\xff\xd8':
+                f.seek(2)
+                while True:
+                    marker = f.read(2)
+                    if len(marker) < 2 or marker[0] != 0xff:
+                        return None, None
+                    # 跳过填充字节
+                    while marker[1] == 0xff:
+                        marker = marker[1:] + f.read(1)
+                    code = marker[1]
+                    if code in (0xd8, 0x01) or 0xd0 <= code <= 0xd7:
+                        continue
+                    length_bytes = f.read(2)
+                    if len(length_bytes) < 2:
+                        return None, None
+                    length = struct.unpack('>H', length_bytes)[0]
+                    if code in (0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf):
+                        height, width = struct.unpack('>xHH', f.read(5))
+                        return width, height
+                    f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        pass
+    
+    return None, None
+
+def image_sort_key(file_name):
+    """图片按序号排序 (0.jpg, 1.jpg, ..., 10.jpg)，非数字文件名排在后面"""
+    stem = os.path.splitext(file_name)[0]
+    return (0, int(stem), file_name) if stem.isdigit() else (1, 0, file_name)
+
+# 与前端 parseTags 相同的标签分隔符
+_TAG_SEPARATOR_PATTERN = re.compile(r'[,，、;；]')
+
+def split_tags(tag_list):
+    """拆分标签字符串，规则与前端 DataService.parseTags 一致"""
+    if not tag_list:
+        return []
+    if isinstance(tag_list, (list, tuple)):
+        return [str(tag).strip() for tag in tag_list if str(tag).strip()]
+    if not isinstance(tag_list, str):
+        return []
+    if tag_list.startswith(('[', '{')):
+        try:
+            tags = json.loads(tag_list)
+        except ValueError:
+            return []
+        return [str(tag) for tag in tags] if isinstance(tags, list) else []
+    return [tag.strip() for tag in _TAG_SEPARATOR_PATTERN.split(tag_list) if tag.strip()]
+
+def search_texts(post):
+    """帖子中参与搜索的文本：标题、正文、昵称、标签、搜索关键词与评论内容"""
+    texts = [post.get('title'), post.get('desc'), post.get('nickname'), post.get('source_keyword')]
+    texts.extend(split_tags(post.get('tag_list')))
+    texts.extend(comment.get('content') for comment in post.get('all_comments') or ())
+    return [text.lower() for text in texts if isinstance(text, str) and text]
+
+def build_comment_tree(comments):
+    """
+    按 parent_comment_id 把评论组装成回复树，每条评论带 replies 列表
+    
+    顶层评论按点赞数降序（同点赞按时间倒序），回复按时间正序。父评论缺失或成环的评论作为顶层评论
+    """
+    nodes = [dict(comment, replies=[]) for comment in comments or () if isinstance(comment, dict)]
+    by_id = {}
+    for node in nodes:
+        by_id.setdefault(str(node.get('comment_id') or ''), node)
+    by_id.pop('', None)
+    
+    def parent_of(node):
+        parent_id = str(node.get('parent_comment_id') or '0')
+        return None if parent_id == '0' else by_id.get(parent_id)
+    
+    roots = []
+    for node in nodes:
+        # 沿父链向上查找，回到已经过的评论说明成环
+        seen = {id(node)}
+        ancestor = parent_of(node)
+        while ancestor is not None and id(ancestor) not in seen:
+            seen.add(id(ancestor))
+            ancestor = parent_of(ancestor)
+        parent = parent_of(node)
+        if parent is None or ancestor is not None:
+            roots.append(node)
+        else:
+            parent['replies'].append(node)
+    
+    for node in nodes:
+        node['replies'].sort(key=lambda reply: reply.get('create_time') or 0)
+    roots.sort(key=lambda node: (-(node.get('like_count') or 0), -(node.get('create_time') or 0)))
+    return roots
+
+def text_ngrams(text, n=2):
+    """文本的字符 n-gram 集合，长度不足 n 的文本整体作为一个词项"""
+    if len(text) < n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+# 计数文本："1.2万"、"3千"、"5k"、"1万+" 等
+_COUNT_PATTERN = re.compile(r'\s*(-?\d+(?:\.\d+)?)\s*([万千kKwW])?\+?\s*')
+COUNT_UNITS = {'万': 10000, 'w': 10000, 'W': 10000, '千': 1000, 'k': 1000, 'K': 1000}
+
+def parse_count(value):
+    """计数转整数：展开 万/千/k 单位，其余文本按原规则只保留数字与负号，无法解析时为 0"""
+    if not isinstance(value, str):
+        try:
+            return int(value) if value is not None else 0
+        except (ValueError, TypeError, OverflowError):
+            return 0
+    
+    match = _COUNT_PATTERN.fullmatch(value)
+    if match:
+        number, unit = match.groups()
+        if unit:
+            return int(round(float(number) * COUNT_UNITS[unit]))
+        return int(float(number)) if '.' in number else int(number)
+    
+    cleaned = ''.join(c for c in value if c.isdigit() or c == '-')
+    try:
+        return int(cleaned) if cleaned and cleaned != '-' else 0
+    except ValueError:
+        return 0
+
+def parse_counts(values):
+    """批量解析一列计数：先对整列去重，每个不同取值只解析一次，再整列映射回去"""
+    try:
+        parsed_values = {value: parse_count(value) for value in set(values)}
+    except TypeError:
+        # 含不可哈希的取值时逐个解析
+        return [parse_count(value) for value in values]
+    return list(map(parsed_values.__getitem__, values))
+
+def js_truthy(value):
+    """按 JavaScript 的真值规则判断（空列表/空字典为真），与前端解析逻辑保持一致"""
+    if value is None or value is False or value == '':
+        return False
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value == value and value != 0
+    return True
+
+def js_or(*values):
+    """等价于 JavaScript 的 a || b || ...，返回第一个真值，否则返回最后一个值"""
+    for value in values[:-1]:
+        if js_truthy(value):
+            return value
+    return values[-1]
+
+class PostShardBuilder:
+    """
+    按时间排序的分片输出 (shards/posts-00000.json + shards/index.json)
+    
+    转换过程中帖子逐行暂存到临时NDJSON文件，内存中只保留排序键与文件偏移量；
+    全部分区处理完后按时间倒序切分为固定大小的分片。审核结论已预先合并到帖子的
+    moderation 字段，分片不再附带原始LLM响应。每个分片另有一个搜索倒排索引 (search-00000.json)
+    和一个评论文件 (comments-00000.json)：评论按 note_id 分组并预先组装成回复树，
+    分片中的帖子只保留点赞最多的几条顶层评论，详情页打开时再按需加载完整评论
+    """
+    
+    INDEX_FILENAME = 'index.json'
+    SHARD_FILENAME = 'posts-{:05d}'
+    SEARCH_FILENAME = 'search-{:05d}.json'
+    COMMENTS_FILENAME = 'comments-{:05d}.json'
+    # 搜索索引的 n-gram 长度（二元组适合中文）
+    SEARCH_NGRAM = 2
+    # 分片帖子中保留的顶层评论条数
+    FEED_COMMENT_COUNT = 3
+    
+    def __init__(self, output_dir, shard_size=200, output_format=None):
+        self.output_dir = Path(output_dir)
+        self.shard_size = shard_size
+        self.output_format = output_format or OutputFormat()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        self.posts_spool_path = self.output_dir / '.posts.spool.ndjson'
+        self.posts_spool = open(self.posts_spool_path, 'w+b')
+        
+        # 帖子排序键: (-time, 序号, 偏移量)
+        self.post_keys = []
+    
+    def add_post(self, post, source, original_index):
+        """暂存一条帖子，记录其来源分区与分区内序号"""
+        record = dict(post, source=source, original_index=original_index)
+        offset = self.posts_spool.tell()
+        self.posts_spool.write(json.dumps(record, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+        self.post_keys.append((-post.get('time', 0), len(self.post_keys), offset))
+    
+    def read_spooled(self, spool, offset):
+        """读取暂存文件中指定偏移量的一条记录"""
+        spool.seek(offset)
+        return json.loads(spool.readline())
+    
+    def finalize(self):
+        """
+        按时间倒序写出分片与索引文件，并删除暂存文件
+        
+        Returns:
+            索引数据
+        """
+        self.post_keys.sort()
+        
+        shards = []
+        written_files = set()
+        try:
+            for start in range(0, len(self.post_keys), self.shard_size):
+                keys = self.post_keys[start:start + self.shard_size]
+                posts = [self.read_spooled(self.posts_spool, offset) for _, _, offset in keys]
+                
+                shard_number = len(shards)
+                # 搜索索引基于完整评论构建，之后分片帖子只保留前几条评论
+                postings = self.build_search_postings(posts)
+                
+                # 分片评论文件：note_id -> 回复树，没有评论的帖子不写入
+                comments_file = self.COMMENTS_FILENAME.format(shard_number)
+                comment_trees = {}
+                for post in posts:
+                    tree = build_comment_tree(post.get('all_comments'))
+                    comment_trees[post.get('note_id', '')] = tree
+                    post['comments_total'] = len(post.get('all_comments') or ())
+                    post['comments_file'] = comments_file if tree else None
+                    post['all_comments'] = tree[:self.FEED_COMMENT_COUNT]
+                write_json_file({
+                    "shard": shard_number,
+                    "comments": {note_id: tree for note_id, tree in comment_trees.items() if tree}
+                }, self.output_dir / comments_file, self.output_format.json_encoder)
+                siblings = self.output_format.compress(self.output_dir / comments_file)
+                written_files.add(comments_file)
+                written_files.update(sibling.name for sibling in siblings.values())
+                
+                shard_file = self.SHARD_FILENAME.format(shard_number) + self.output_format.suffix
+                self.output_format.write({
+                    "shard": shard_number,
+                    "start": start,
+                    "posts": posts
+                }, self.output_dir / shard_file, stream=True)
+                siblings = self.output_format.compress(self.output_dir / shard_file)
+                written_files.add(shard_file)
+                written_files.update(sibling.name for sibling in siblings.values())
+                
+                # 分片搜索索引：n-gram -> 分片内序号的倒排列表
+                # 倒排列表始终使用紧凑JSON，indent=2 会让每个序号各占一行
+                search_file = self.SEARCH_FILENAME.format(shard_number)
+                write_json_file({
+                    "shard": shard_number,
+                    "ngram": self.SEARCH_NGRAM,
+                    "postings": postings
+                }, self.output_dir / search_file, MINIFIED_JSON_ENCODER)
+                siblings = self.output_format.compress(self.output_dir / search_file)
+                written_files.add(search_file)
+                written_files.update(sibling.name for sibling in siblings.values())
+                
+                shards.append({
+                    "file": shard_file,
+                    "search": search_file,
+                    "comments": comments_file,
+                    "start": start,
+                    "count": len(posts),
+                    "moderated_count": sum(1 for post in posts if post.get('moderation') is not None),
+                    "time_from": posts[0].get('time', 0),
+                    "time_to": posts[-1].get('time', 0)
+                })
+        finally:
+            self.close_spools()
+        
+        # 删除上次运行遗留的多余分片、搜索索引与评论文件（包括其他格式的分片与预压缩副本）
+        for pattern in ('posts-*', 'search-*', 'comments-*'):
+            for old_file in self.output_dir.glob(pattern):
+                if old_file.name not in written_files:
+                    old_file.unlink()
+        
+        index = {
+            "version": 2,
+            "sort": "time_desc",
+            "format": self.output_format.name,
+            "encodings": list(self.output_format.compressions),
+            "shard_size": self.shard_size,
+            "total_posts": len(self.post_keys),
+            "total_moderated": sum(shard['moderated_count'] for shard in shards),
+            "created_at": datetime.now().isoformat(),
+            "shards": shards
+        }
+        self.output_format.write_config(index, self.output_dir / self.INDEX_FILENAME)
+        self.output_format.compress(self.output_dir / self.INDEX_FILENAME)
+        
+        print(f"✓ 已生成 {len(shards)} 个分片 (每片 {self.shard_size} 条): {self.output_dir}")
+        return index
+    
+    def build_search_postings(self, posts):
+        """
+        构建分片的倒排索引 {n-gram: [分片内序号, ...]}，序号升序
+        
+        前端对查询词的各个 n-gram 求倒排列表交集得到候选帖子，再逐条确认是否包含查询词
+        """
+        postings = {}
+        for position, post in enumerate(posts):
+            grams = set()
+            for text in search_texts(post):
+                grams.update(text_ngrams(text, self.SEARCH_NGRAM))
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        return postings
+    
+    def close_spools(self):
+        """关闭并删除暂存文件"""
+        self.posts_spool.close()
+        if self.posts_spool_path.exists():
+            self.posts_spool_path.unlink()
+
+class StatisticsBuilder:
+    """
+    转换时累计看板统计 (stats.json)，前端统计视图只需一次请求，与数据量无关
+    
+    - totals: 与前端 generateStatistics 相同的总体指标
+    - by_partition / by_keyword / by_location / by_day: 各维度的审核结论计数
+    - histograms: 点赞、收藏、评论数的对数分桶直方图
+    """
+    
+    STATS_FILENAME = 'stats.json'
+    # 按北京时间划分日期
+    DAY_TIMEZONE = timezone(timedelta(hours=8))
+    # 直方图分桶下界：第 i 个桶为 [bounds[i], bounds[i+1])，最后一个桶无上界
+    HISTOGRAM_BOUNDS = (0, 1, 10, 100, 1000, 10000, 100000)
+    HISTOGRAM_FIELDS = ('liked_count', 'collected_count', 'comment_count')
+    
+    def __init__(self):
+        self.total_posts = 0
+        self.users = set()
+        self.decisions = {'safe': 0, 'review': 0, 'block': 0}
+        self.moderated_posts = 0
+        self.with_images = 0
+        self.with_comments = 0
+        self.image_manifest = True
+        self.total_interactions = 0
+        self.earliest_time = None
+        self.latest_time = None
+        
+        self.by_partition = {}
+        self.by_keyword = {}
+        self.by_location = {}
+        self.by_day = {}
+        self.histograms = {field: [0] * len(self.HISTOGRAM_BOUNDS) for field in self.HISTOGRAM_FIELDS}
+    
+    def moderation_category(self, moderation):
+        """审核结论归类为 safe/review/block，规则与前端 expandModeration 一致"""
+        if not moderation:
+            return 'safe'
+        decision = str(moderation.get('decision') or 'safe').lower()
+        if decision in ('block', 'blocked'):
+            return 'block'
+        if decision in ('review', 'needs_review'):
+            return 'review'
+        return 'safe'
+    
+    def count_group(self, groups, key, category):
+        """在分组中累计一条帖子"""
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'posts': 0, 'safe': 0, 'review': 0, 'block': 0}
+        group['posts'] += 1
+        group[category] += 1
+    
+    def day_of(self, timestamp):
+        """时间戳（毫秒或秒）对应的日期字符串，超出可表示范围的异常时间戳返回 None"""
+        seconds = timestamp / 1000 if timestamp > 1e10 else timestamp
+        try:
+            return datetime.fromtimestamp(seconds, self.DAY_TIMEZONE).strftime('%Y-%m-%d')
+        except (ValueError, OverflowError, OSError):
+            return None
+    
+    def add_post(self, post, source):
+        """累计一条转换后的帖子"""
+        self.total_posts += 1
+        if post.get('user_id'):
+            self.users.add(post['user_id'])
+        
+        moderation = post.get('moderation')
+        category = self.moderation_category(moderation)
+        self.decisions[category] += 1
+        if moderation is not None:
+            self.moderated_posts += 1
+        
+        if 'images' in post:
+            if post['images']:
+                self.with_images += 1
+        else:
+            # 没有图片清单时图片数只能由前端探测得到
+            self.image_manifest = False
+        
+        if any(str(comment.get('content') or '').strip() for comment in post.get('all_comments') or ()):
+            self.with_comments += 1
+        
+        self.total_interactions += (post.get('liked_count') or 0) + (post.get('comment_count') or 0) \
+            + (post.get('collected_count') or 0)
+        
+        post_time = post.get('time') or 0
+        if post_time > 0:
+            self.earliest_time = post_time if self.earliest_time is None else min(self.earliest_time, post_time)
+            self.latest_time = post_time if self.latest_time is None else max(self.latest_time, post_time)
+            day = self.day_of(post_time)
+            if day is not None:
+                self.count_group(self.by_day, day, category)
+        
+        self.count_group(self.by_partition, source, category)
+        self.count_group(self.by_keyword, post.get('source_keyword') or '未知', category)
+        self.count_group(self.by_location, post.get('ip_location') or '未知', category)
+        
+        for field in self.HISTOGRAM_FIELDS:
+            value = post.get(field) or 0
+            bucket = 0
+            while bucket + 1 < len(self.HISTOGRAM_BOUNDS) and value >= self.HISTOGRAM_BOUNDS[bucket + 1]:
+                bucket += 1
+            self.histograms[field][bucket] += 1
+    
+    def finalize(self):
+        """生成统计数据"""
+        # 与前端 Math.round 一致（.5 向上取整）
+        avg_interactions = int(self.total_interactions / self.total_posts + 0.5) if self.total_posts else 0
+        
+        return {
+            "version": 1,
+            "created_at": datetime.now().isoformat(),
+            "totals": {
+                "totalPosts": self.total_posts,
+                "totalUsers": len(self.users),
+                "safeContent": self.decisions['safe'],
+                "blockedContent": self.decisions['block'],
+                "reviewContent": self.decisions['review'],
+                "moderatedPosts": self.moderated_posts,
+                "withImages": self.with_images if self.image_manifest else None,
+                "withComments": self.with_comments,
+                "avgInteractions": avg_interactions,
+                "timeRange": {"earliest": self.earliest_time, "latest": self.latest_time}
+            },
+            "by_partition": self.by_partition,
+            "by_keyword": dict(sorted(self.by_keyword.items(), key=lambda item: -item[1]['posts'])),
+            "by_location": dict(sorted(self.by_location.items(), key=lambda item: -item[1]['posts'])),
+            "by_day": dict(sorted(self.by_day.items())),
+            "histograms": {
+                field: {"bounds": list(self.HISTOGRAM_BOUNDS), "counts": counts}
+                for field, counts in self.histograms.items()
+            }
+        }
+
+class ColumnarExporter:
+    """
+    列式导出 (columnar/posts.parquet 与 columnar/comments.parquet)，供离线分析只读取需要的列
+    
+    帖子以 note_id、评论以 comment_id 为键；计数与时间为 int64，昵称/IP属地/搜索关键词等
+    低基数文本列使用字典编码；每个分区写为一个 row group。需要安装 pyarrow
+    """
+    
+    POSTS_FILENAME = 'posts.parquet'
+    COMMENTS_FILENAME = 'comments.parquet'
+    
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        dictionary_string = pa.dictionary(pa.int32(), pa.string())
+        self.posts_schema = pa.schema([
+            ('note_id', pa.string()),
+            ('partition', dictionary_string),
+            ('type', dictionary_string),
+            ('title', pa.string()),
+            ('desc', pa.string()),
+            ('time', pa.int64()),
+            ('user_id', pa.string()),
+            ('nickname', dictionary_string),
+            ('liked_count', pa.int64()),
+            ('collected_count', pa.int64()),
+            ('comment_count', pa.int64()),
+            ('share_count', pa.int64()),
+            ('tag_list', pa.string()),
+            ('source_keyword', dictionary_string),
+            ('ip_location', dictionary_string),
+            ('note_url', pa.string()),
+            ('last_modify_ts', pa.int64()),
+            ('last_update_time', pa.int64()),
+            ('image_count', pa.int32()),
+            ('moderation_decision', dictionary_string),
+            ('moderation_confidence', pa.float64())
+        ])
+        self.comments_schema = pa.schema([
+            ('comment_id', pa.string()),
+            ('note_id', pa.string()),
+            ('partition', dictionary_string),
+            ('content', pa.string()),
+            ('user_id', pa.string()),
+            ('nickname', dictionary_string),
+            ('like_count', pa.int64()),
+            ('sub_comment_count', pa.int64()),
+            ('create_time', pa.int64()),
+            ('parent_comment_id', pa.string())
+        ])
+        
+        self.posts_path = self.output_dir / self.POSTS_FILENAME
+        self.comments_path = self.output_dir / self.COMMENTS_FILENAME
+        self.posts_writer = pq.ParquetWriter(self.temp_path(self.posts_path), self.posts_schema)
+        self.comments_writer = pq.ParquetWriter(self.temp_path(self.comments_path), self.comments_schema)
+        self.reset_buffers()
+        
+        self.posts_count = 0
+        self.comments_count = 0
+    
+    def temp_path(self, path):
+        return path.with_name(path.name + '.tmp')
+    
+    def reset_buffers(self):
+        """当前分区的列缓冲"""
+        self.post_columns = {name: [] for name in self.posts_schema.names}
+        self.comment_columns = {name: [] for name in self.comments_schema.names}
+    
+    def as_int(self, value):
+        """整数列取值：已是整数直接使用，纯数字字符串转换，其余为空"""
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, int):
+            return value
+        if isinstance(value, str) and value.strip().isdigit():
+            return int(value.strip())
+        return None
+    
+    def as_text(self, value):
+        return value if isinstance(value, str) else (None if value is None else str(value))
+    
+    def add_post(self, post, partition_name):
+        """追加一条转换后的帖子及其评论"""
+        columns = self.post_columns
+        moderation = post.get('moderation')
+        confidence = moderation.get('confidence') if moderation else None
+        
+        columns['partition'].append(partition_name)
+        for name in ('note_id', 'type', 'title', 'desc', 'user_id', 'nickname', 'tag_list',
+                     'source_keyword', 'ip_location', 'note_url'):
+            columns[name].append(self.as_text(post.get(name)))
+        for name in ('time', 'liked_count', 'collected_count', 'comment_count', 'share_count',
+                     'last_modify_ts', 'last_update_time'):
+            columns[name].append(self.as_int(post.get(name)))
+        columns['image_count'].append(len(post['images']) if 'images' in post else None)
+        columns['moderation_decision'].append(moderation.get('decision') if moderation else None)
+        columns['moderation_confidence'].append(
+            float(confidence) if isinstance(confidence, (int, float)) and not isinstance(confidence, bool) else None
+        )
+        
+        comment_columns = self.comment_columns
+        for comment in post.get('all_comments') or ():
+            comment_columns['note_id'].append(self.as_text(post.get('note_id')))
+            comment_columns['partition'].append(partition_name)
+            for name in ('comment_id', 'content', 'user_id', 'nickname', 'parent_comment_id'):
+                comment_columns[name].append(self.as_text(comment.get(name)))
+            for name in ('like_count', 'sub_comment_count', 'create_time'):
+                comment_columns[name].append(self.as_int(comment.get(name)))
+    
+    def flush_partition(self):
+        """将当前分区写为一个 row group"""
+        posts_rows = len(self.post_columns['note_id'])
+        if posts_rows:
+            table = pa.Table.from_pydict(self.post_columns, schema=self.posts_schema)
+            self.posts_writer.write_table(table, row_group_size=posts_rows)
+            self.posts_count += posts_rows
+        
+        comments_rows = len(self.comment_columns['note_id'])
+        if comments_rows:
+            table = pa.Table.from_pydict(self.comment_columns, schema=self.comments_schema)
+            self.comments_writer.write_table(table, row_group_size=comments_rows)
+            self.comments_count += comments_rows
+        
+        self.reset_buffers()
+    
+    def close(self):
+        """写入剩余数据并替换目标文件"""
+        self.flush_partition()
+        for writer, path in ((self.posts_writer, self.posts_path), (self.comments_writer, self.comments_path)):
+            writer.close()
+            os.replace(self.temp_path(path), path)
+        print(f"✓ 列式导出: {self.posts_count} 条帖子, {self.comments_count} 条评论 -> {self.output_dir}")
+    
+    def abort(self):
+        """放弃导出，删除临时文件"""
+        for writer, path in ((self.posts_writer, self.posts_path), (self.comments_writer, self.comments_path)):
+            writer.close()
+            if self.temp_path(path).exists():
+                self.temp_path(path).unlink()
+
+def render_image_derivatives(source_path, target_stem, variants, image_format, placeholder_width, quality):
+    """
+    生成一张图片的衍生版本（在图片处理进程中执行）
+    
+    Args:
+        source_path: 原图路径
+        target_stem: 衍生文件路径前缀，各版本写为 {target_stem}-{版本名}.{扩展名}
+        variants: ((版本名, 最大宽度), ...)，原图更窄时不放大
+        image_format: 'WEBP' 或 'JPEG'
+        placeholder_width: 模糊占位图宽度
+        quality: 编码质量
+        
+    Returns:
+        ({版本名: {"file", "width", "height", "size"}}, 占位图 data URI, 错误信息)
+    """
+    extension = ImageDerivativeBuilder.FORMAT_EXTENSIONS[image_format]
+    save_options = {'quality': quality}
+    save_options.update({'method': 4} if image_format == 'WEBP' else {'optimize': True, 'progressive': True})
+    try:
+        with Image.open(source_path) as source:
+            source = ImageOps.exif_transpose(source)
+            # WebP 支持透明通道，JPEG 需要先转为 RGB
+            source = source.convert('RGBA' if image_format == 'WEBP' and 'A' in source.getbands() else 'RGB')
+            
+            results = {}
+            for name, max_width in variants:
+                width = min(max_width, source.width)
+                height = max(1, round(source.height * width / source.width))
+                resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+                target = Path(f"{target_stem}-{name}.{extension}")
+                temp_path = target.with_name(target.name + '.tmp')
+                resized.save(temp_path, format=image_format, **save_options)
+                os.replace(temp_path, target)
+                results[name] = {"file": target.name, "width": width, "height": height,
+                                 "size": target.stat().st_size}
+            
+            height = max(1, round(source.height * placeholder_width / source.width))
+            tiny = source.resize((placeholder_width, height), Image.BILINEAR).filter(ImageFilter.GaussianBlur(1))
+            buffer = io.BytesIO()
+            tiny.save(buffer, format=image_format, quality=40)
+            mime = 'image/webp' if image_format == 'WEBP' else 'image/jpeg'
+            placeholder = f"data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+            return results, placeholder, None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+class ImageDerivativeBuilder:
+    """
+    图片衍生版本 (derivatives/{分区}/{note_id}/{原图文件名}-thumb.webp 等)，网格卡片与详情页不再加载原图
+    
+    衍生文件名保留原图扩展名，同一帖子中的 0.jpg 与 0.png 不会写入同一个文件
+    
+    每张原图生成网格缩略图 (thumb)、详情尺寸 (detail) 与一张内联到清单中的模糊占位图；
+    生成结果记录在 derivatives/manifest.json，原图的修改时间与大小不变（或内容哈希不变）时
+    直接复用上次的衍生文件。图片在进程池中并行处理，需要安装 Pillow
+    """
+    
+    MANIFEST_FILENAME = 'manifest.json'
+    # 版本名与最大宽度（像素）
+    VARIANTS = (('thumb', 360), ('detail', 1080))
+    PLACEHOLDER_WIDTH = 16
+    QUALITY = 80
+    FORMAT_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+    # 衍生文件命名方式，变化时上次的清单全部失效
+    LAYOUT_VERSION = 2
+    
+    def __init__(self, output_dir, url_prefix, workers=1):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.workers = max(1, workers)
+        # Pillow 未编译 WebP 支持时改用 JPEG
+        self.image_format = 'WEBP' if pil_features.check('webp') else 'JPEG'
+        self.settings = {
+            "layout": self.LAYOUT_VERSION,
+            "format": self.image_format,
+            "variants": dict(self.VARIANTS),
+            "placeholder_width": self.PLACEHOLDER_WIDTH,
+            "quality": self.QUALITY
+        }
+        
+        # 上次运行的清单：{分区/note_id/文件名: {"mtime_ns", "size", "sha256", "variants", "placeholder"}}
+        # 生成参数变化时全部重新生成
+        self.manifest_path = self.output_dir / self.MANIFEST_FILENAME
+        previous = {}
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 图片衍生清单无法读取，全部重新生成: {e}")
+        self.entries = previous.get('images', {}) if previous.get('settings') == self.settings else {}
+        # 生成参数变化而失效的上次记录，保存清单时删除其中不再使用的衍生文件
+        self.discarded = {} if previous.get('settings') == self.settings else previous.get('images', {})
+        self.seen = set()
+        self.processed_partitions = set()
+        self.counts = Counter()
+    
+    def process(self, partition_name, image_dir, image_index):
+        """
+        为分区图片清单中的每张图片生成（或复用）衍生版本，并写入清单记录
+        
+        Args:
+            partition_name: 分区名称
+            image_dir: 分区图片目录
+            image_index: scan_partition_images 返回的 {note_id: [图片记录]}，原地添加 variants 与 placeholder
+        """
+        self.processed_partitions.add(partition_name)
+        jobs = []
+        for note_id, images in image_index.items():
+            for image in images:
+                file_name = image['path'].rsplit('/', 1)[-1]
+                key = f"{partition_name}/{note_id}/{file_name}"
+                self.seen.add(key)
+                source_path = Path(image_dir) / note_id / file_name
+                if self.reuse(key, source_path):
+                    self.counts['reused'] += 1
+                else:
+                    jobs.append((key, source_path))
+        
+        if jobs:
+            arguments = []
+            for key, source_path in jobs:
+                target = self.output_dir / key
+                target.parent.mkdir(parents=True, exist_ok=True)
+                arguments.append((str(source_path), str(target), self.VARIANTS, self.image_format,
+                                  self.PLACEHOLDER_WIDTH, self.QUALITY))
+            
+            if self.workers > 1 and len(jobs) > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    results = list(executor.map(render_image_derivatives, *zip(*arguments),
+                                                chunksize=max(1, len(jobs) // (self.workers * 4))))
+            else:
+                results = [render_image_derivatives(*args) for args in arguments]
+            
+            for (key, source_path), (variants, placeholder, error) in zip(jobs, results):
+                if error:
+                    self.counts['failed'] += 1
+                    self.entries.pop(key, None)
+                    print(f"⚠️ 图片处理失败: {source_path} - {error}")
+                    continue
+                stat = source_path.stat()
+                self.entries[key] = {
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "sha256": file_sha256(source_path),
+                    "variants": variants,
+                    "placeholder": placeholder
+                }
+                self.counts['generated'] += 1
+        
+        for note_id, images in image_index.items():
+            for image in images:
+                entry = self.entries.get(f"{partition_name}/{note_id}/{image['path'].rsplit('/', 1)[-1]}")
+                if entry is None:
+                    continue
+                url_dir = f"{self.url_prefix}/{partition_name}/{note_id}"
+                image['variants'] = {
+                    name: {"path": f"{url_dir}/{variant['file']}", "width": variant['width'],
+                           "height": variant['height']}
+                    for name, variant in entry['variants'].items()
+                }
+                image['placeholder'] = entry['placeholder']
+    
+    def reuse(self, key, source_path):
+        """原图未变化且衍生文件都在时复用上次结果；修改时间变化但内容哈希不变时同样复用"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        target_dir = (self.output_dir / key).parent
+        if not all((target_dir / variant['file']).exists() for variant in entry['variants'].values()):
+            return False
+        
+        stat = source_path.stat()
+        if entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return True
+        if entry['size'] == stat.st_size and entry['sha256'] == file_sha256(source_path):
+            entry['mtime_ns'] = stat.st_mtime_ns
+            return True
+        return False
+    
+    def close(self):
+        """删除本次处理的分区中已不存在的原图对应的衍生文件及失效的旧衍生文件，并保存清单"""
+        for key in [key for key in self.entries if key not in self.seen]:
+            if key.split('/', 1)[0] not in self.processed_partitions:
+                continue
+            target_dir = (self.output_dir / key).parent
+            for variant in self.entries.pop(key)['variants'].values():
+                stale = target_dir / variant['file']
+                if stale.exists():
+                    stale.unlink()
+            self.counts['removed'] += 1
+        
+        referenced = {(self.output_dir / key).parent / variant['file']
+                      for key, entry in self.entries.items() for variant in entry['variants'].values()}
+        for key, entry in self.discarded.items():
+            target_dir = (self.output_dir / key).parent
+            for variant in entry.get('variants', {}).values():
+                stale = target_dir / variant['file']
+                if stale not in referenced and stale.exists():
+                    stale.unlink()
+        
+        write_json_file({
+            "settings": self.settings,
+            "created_at": datetime.now().isoformat(),
+            "images": self.entries
+        }, self.manifest_path, MINIFIED_JSON_ENCODER)
+        print(f"✓ 图片衍生版本 ({self.image_format}): 生成 {self.counts['generated']} 张, "
+              f"复用 {self.counts['reused']} 张, 失败 {self.counts['failed']} 张, "
+              f"移除 {self.counts['removed']} 张 -> {self.output_dir}")
+
+def image_dhash(file_path, hash_size=8):
+    """差值哈希 (dHash)：缩放为 (hash_size+1)×hash_size 灰度图后逐行比较相邻像素，返回整数"""
+    with Image.open(file_path) as image:
+        pixels = list(image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            offset = row * (hash_size + 1) + col
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return value
+
+class ImageStore:
+    """
+    内容寻址的图片存储 (blobs/ab/abcdef....jpg)，跨帖子、跨分区的重复图片只保存和下载一次
+    
+    每张图片按 SHA-256 存放一份（默认复制；hardlink=True 时硬链接原图，跨文件系统时复制），帖子图片清单的
+    path 改为共享路径；文件名即内容哈希，前端可长期缓存。开启感知哈希时，dHash 汉明距离不超过
+    NEAR_DUPLICATE_DISTANCE 且宽高比相近的近似重复图片指向最先出现的那一份；纯色等细节过少的
+    图片 dHash 几乎全为 0 或 1，不参与近似匹配。
+    原图的哈希及其存放位置记录在 blobs/index.json，修改时间与大小不变时不再重新计算；
+    关闭时只清理本次存入过的分区中不再引用的存储文件，其他分区的记录与存储文件保持不变
+    """
+    
+    INDEX_FILENAME = 'index.json'
+    NEAR_DUPLICATE_DISTANCE = 3
+    # 64 位 dHash 切为 4 段：距离不超过 3 的两个哈希至少有一段完全相同，按段分桶查找候选
+    DHASH_BANDS = 4
+    DHASH_BITS = 64
+    # 置位数少于此值（或多于 64 减此值）的 dHash 视为细节过少
+    DHASH_MIN_DETAIL = 8
+    ASPECT_RATIO_TOLERANCE = 0.05
+    
+    def __init__(self, output_dir, url_prefix, perceptual=False, hardlink=False):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.perceptual = perceptual
+        self.hardlink = hardlink
+        
+        # 原图指纹缓存：{原图路径: {"mtime_ns", "size", "sha256", "dhash", "blob"}}
+        self.index_path = self.output_dir / self.INDEX_FILENAME
+        self.fingerprints = {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.fingerprints = json.load(f).get('sources', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 图片存储索引无法读取，重新计算哈希: {e}")
+        
+        # 本次运行的存储内容：{sha256: {"file", "size", "width", "height", "order"}}
+        self.blobs = {}
+        # 近似重复图片的 SHA-256 -> 实际存放的那一份
+        self.aliases = {}
+        self.dhash_buckets = {}
+        self.dhash_of = {}
+        self.seen_sources = set()
+        # 本次存入过的分区图片目录，关闭时只清理这些分区不再引用的存储文件
+        self.ingested_dirs = set()
+        self.counts = Counter()
+    
+    def ingest(self, partition_name, image_dir, image_index):
+        """
+        将分区图片存入内容寻址存储，并把图片清单中的 path 改为共享路径
+        
+        帖子按 note_id 排序处理，近似重复图片指向的那一份每次运行都相同
+        
+        Args:
+            partition_name: 分区名称
+            image_dir: 分区图片目录
+            image_index: scan_partition_images 返回的 {note_id: [图片记录]}，原地修改
+        """
+        self.ingested_dirs.add(str(Path(image_dir)))
+        for note_id in sorted(image_index):
+            for image in image_index[note_id]:
+                source_path = Path(image_dir) / note_id / image['path'].rsplit('/', 1)[-1]
+                try:
+                    sha256, dhash = self.fingerprint(source_path)
+                except (OSError, ValueError) as e:
+                    self.counts['failed'] += 1
+                    print(f"⚠️ 图片无法存入存储，保留原路径: {source_path} - {e}")
+                    continue
+                
+                if sha256 in self.blobs or sha256 in self.aliases:
+                    self.counts['duplicates'] += 1
+                    self.counts['saved_bytes'] += image['size']
+                    sha256 = self.aliases.get(sha256, sha256)
+                else:
+                    near = self.find_near_duplicate(dhash, image) if dhash is not None else None
+                    if near is not None:
+                        self.counts['near_duplicates'] += 1
+                        self.counts['saved_bytes'] += image['size']
+                        self.aliases[sha256] = near
+                        sha256 = near
+                    else:
+                        self.store(source_path, sha256, image)
+                        if dhash is not None and self.has_detail(dhash):
+                            self.add_dhash(sha256, dhash)
+                
+                blob = self.blobs[sha256]
+                self.fingerprints[str(source_path)]['blob'] = blob['file']
+                image.update({
+                    "path": f"{self.url_prefix}/{blob['file']}",
+                    "sha256": sha256,
+                    "size": blob['size'],
+                    "width": blob['width'],
+                    "height": blob['height']
+                })
+    
+    def fingerprint(self, source_path):
+        """原图的 (SHA-256, dHash)，修改时间与大小不变时使用缓存；未开启感知哈希时 dHash 为 None"""
+        key = str(source_path)
+        self.seen_sources.add(key)
+        stat = source_path.stat()
+        cached = self.fingerprints.get(key)
+        if cached is None or cached['mtime_ns'] != stat.st_mtime_ns or cached['size'] != stat.st_size:
+            cached = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                      "sha256": file_sha256(source_path), "dhash": None}
+            self.fingerprints[key] = cached
+            self.counts['hashed'] += 1
+        
+        if not self.perceptual:
+            return cached['sha256'], None
+        if cached['dhash'] is None:
+            try:
+                cached['dhash'] = format(image_dhash(source_path), 'x')
+            except Exception:
+                # 无法解码的图片只做精确去重
+                return cached['sha256'], None
+        return cached['sha256'], int(cached['dhash'], 16)
+    
+    def dhash_bands(self, dhash):
+        """dHash 的各段 (段序号, 段值)"""
+        width = self.DHASH_BITS // self.DHASH_BANDS
+        mask = (1 << width) - 1
+        return [(band, (dhash >> (band * width)) & mask) for band in range(self.DHASH_BANDS)]
+    
+    def add_dhash(self, sha256, dhash):
+        self.dhash_of[sha256] = dhash
+        for band in self.dhash_bands(dhash):
+            self.dhash_buckets.setdefault(band, []).append(sha256)
+    
+    def has_detail(self, dhash):
+        bits = bin(dhash).count('1')
+        return self.DHASH_MIN_DETAIL <= bits <= self.DHASH_BITS - self.DHASH_MIN_DETAIL
     
-#     def convert_llm_responses_for_partition(self, partition_name, note_ids):
-#         """为特定分区转换LLM响应数据"""
-#         print(f"\n--- 为 {partition_name} 处理LLM响应 ---")
+    def similar_aspect_ratio(self, blob, image):
+        if not (blob['width'] and blob['height'] and image['width'] and image['height']):
+            return False
+        ratio = (blob['width'] / blob['height']) / (image['width'] / image['height'])
+        return abs(ratio - 1) <= self.ASPECT_RATIO_TOLERANCE
+    
+    def find_near_duplicate(self, dhash, image):
+        """查找 dHash 距离不超过阈值、宽高比相近且最先存入的图片，没有时返回 None"""
+        if not self.has_detail(dhash):
+            return None
+        candidates = set()
+        for band in self.dhash_bands(dhash):
+            candidates.update(self.dhash_buckets.get(band, ()))
+        matches = [sha256 for sha256 in candidates
+                   if bin(self.dhash_of[sha256] ^ dhash).count('1') <= self.NEAR_DUPLICATE_DISTANCE
+                   and self.similar_aspect_ratio(self.blobs[sha256], image)]
+        # 候选集合无序，按存入顺序选出最先出现的一份
+        return min(matches, key=lambda sha256: self.blobs[sha256]['order']) if matches else None
+    
+    def store(self, source_path, sha256, image):
+        """
+        存放一份图片：目标已存在且内容有效时跳过，否则复制（hardlink 时硬链接，失败再复制）
         
-#         llm_response_dir = self.base_data_path / self.llm_response_folder
-#         if not llm_response_dir.exists():
-#             print(f"✗ LLMResponse目录不存在: {llm_response_dir}")
-#             return {}
+        默认复制：硬链接与原图共用同一份数据，爬虫原地改写原图时以哈希命名的存储文件也会随之改变
+        """
+        relative = f"{sha256[:2]}/{sha256}{source_path.suffix.lower()}"
+        target = self.output_dir / relative
+        if not self.blob_is_valid(target, source_path, sha256, image):
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = target.with_name(target.name + '.tmp')
+            if temp_path.exists():
+                temp_path.unlink()
+            linked = False
+            if self.hardlink:
+                try:
+                    os.link(source_path, temp_path)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                shutil.copy2(source_path, temp_path)
+            self.counts['linked' if linked else 'copied'] += 1
+            os.replace(temp_path, target)
         
-#         llm_responses = {}
-#         response_types = ['overall', 'text', 'image']
+        self.blobs[sha256] = {
+            "file": relative,
+            "size": image['size'],
+            "width": image['width'],
+            "height": image['height'],
+            "order": len(self.blobs)
+        }
+    
+    def blob_is_valid(self, target, source_path, sha256, image):
+        """
+        已存在的存储文件是否仍为该哈希对应的内容
         
-#         processed_count = 0
-#         for note_id in note_ids:
-#             note_responses = {}
-            
-#             for response_type in response_types:
-#                 response_file = llm_response_dir / f"{note_id}{response_type}.pkl"
-                
-#                 if response_file.exists():
-#                     response_data = self.load_pkl_file(response_file)
-#                     if response_data is not None:
-#                         note_responses[response_type] = response_data
-#                 else:
-#                     print(f"  ⚠ 未找到: {response_file.name}")
+        - 复制模式：大小一致且不与其他文件共用数据（之前以硬链接存放的文件改为独立副本）
+        - 硬链接模式：与当前原图为同一文件时内容已由 fingerprint 确认；否则重新计算哈希，
+          原图被原地改写（大小可能不变）后链接到它的存储文件会被发现并重新存放
+        """
+        try:
+            stat = target.stat()
+        except FileNotFoundError:
+            return False
+        if stat.st_size != image['size']:
+            return False
+        if not self.hardlink:
+            return stat.st_nlink == 1
+        if os.path.samestat(stat, source_path.stat()):
+            return True
+        self.counts['verified'] += 1
+        return file_sha256(target) == sha256
+    
+    def close(self):
+        """
+        保存原图指纹索引，删除不再引用的存储文件
+        
+        本次未存入的分区（例如源文件缺失或转换失败）保留其索引记录，它们指向的存储文件同样保留
+        """
+        sources = {key: value for key, value in self.fingerprints.items()
+                   if key in self.seen_sources or str(Path(key).parent.parent) not in self.ingested_dirs}
+        referenced = {blob['file'] for blob in self.blobs.values()}
+        for key, value in sources.items():
+            if key not in self.seen_sources:
+                # 较早的索引没有记录存放位置，按原图哈希与扩展名推算
+                referenced.add(value.get('blob') or f"{value['sha256'][:2]}/{value['sha256']}{Path(key).suffix.lower()}")
+        removed = 0
+        for blob_path in self.output_dir.glob('??/*'):
+            if blob_path.relative_to(self.output_dir).as_posix() not in referenced:
+                blob_path.unlink()
+                removed += 1
+        
+        write_json_file({
+            "created_at": datetime.now().isoformat(),
+            "perceptual": self.perceptual,
+            "sources": sources
+        }, self.index_path, MINIFIED_JSON_ENCODER)
+        
+        images = len(self.seen_sources)
+        print(f"✓ 图片存储: {images} 张图片 -> {len(self.blobs)} 份 (完全重复 {self.counts['duplicates']}, "
+              f"近似重复 {self.counts['near_duplicates']}, 节省 {self.counts['saved_bytes'] / 1024 / 1024:.2f} MB; "
+              f"硬链接 {self.counts['linked']}, 复制 {self.counts['copied']}, 校验 {self.counts['verified']}, "
+              f"重新计算哈希 {self.counts['hashed']}, "
+              f"移除 {removed}) -> {self.output_dir}")
+
+class PostDeduplicator:
+    """
+    跨分区帖子去重 (merge_report.json)
+    
+    相同 note_id 的帖子，以及标题+正文 MinHash 相似度不低于 NEAR_DUPLICATE_THRESHOLD 的近似重复帖子
+    归为一组，每组只保留 last_modify_ts 最新的一条；时间相同时按分区顺序、分区内序号取最先出现的一条，
+    每次运行结果相同。MinHash 使用单次哈希分桶 (one permutation hashing)，按 LSH 分段查找候选
+    """
+    
+    REPORT_FILENAME = 'merge_report.json'
+    SIGNATURE_SIZE = 64
+    LSH_BANDS = 16
+    SHINGLE_SIZE = 3
+    # 词项过少的短文本（空标题、"分享图片"等）不参与近似匹配
+    MIN_SHINGLES = 10
+    NEAR_DUPLICATE_THRESHOLD = 0.9
+    # 空桶借用右侧第 k 个非空桶的值时加上 k 倍偏移，与该桶自身的值区分
+    DENSIFY_OFFSET = (1 << 32) // SIGNATURE_SIZE
+    
+    def __init__(self, near_duplicates=True):
+        self.near_duplicates = near_duplicates
+        # 每条帖子: (分区名, 分区内序号, note_id, last_modify_ts)
+        self.records = []
+        self.signatures = {}
+        self.partition_order = {}
+        self.removed = set()
+        self.groups = []
+    
+    def partition_entries(self, posts_data):
+        """
+        提取分区中每条帖子的去重信息 [(分区内序号, note_id, last_modify_ts, 签名)]
+        
+        序号与转换时遍历分区数据的序号一致；结果不引用原始帖子，分区数据可随即释放
+        """
+        entries = []
+        for index, post in enumerate(posts_data):
+            if not isinstance(post, dict):
+                continue
+            signature = None
+            if self.near_duplicates:
+                signature = self.minhash(f"{post.get('title') or ''}{post.get('desc') or ''}")
+            entries.append((index, str(post.get('note_id') or ''), parse_count(post.get('last_modify_ts')),
+                            signature))
+        return entries
+    
+    def add_partition(self, partition_name, entries):
+        """登记一个分区的帖子 (partition_entries 的结果)"""
+        self.partition_order.setdefault(partition_name, len(self.partition_order))
+        for index, note_id, last_modify_ts, signature in entries:
+            number = len(self.records)
+            self.records.append((partition_name, index, note_id, last_modify_ts))
+            if signature is not None:
+                self.signatures[number] = signature
+    
+    @classmethod
+    def minhash(cls, text):
+        """
+        文本字符 n-gram 的 MinHash 签名，词项过少时返回 None
+        
+        文本编码为 UTF-32 后每个字符定长 4 字节，直接对字节切片计算 CRC32，不必逐个构造 n-gram 字符串；
+        重复的 n-gram 哈希值相同，不影响各桶的最小值
+        """
+        data = re.sub(r'\s+', '', str(text).lower()).encode('utf-32-le')
+        width = cls.SHINGLE_SIZE * 4
+        if len(data) // 4 - cls.SHINGLE_SIZE + 1 < cls.MIN_SHINGLES:
+            return None
+        
+        size = cls.SIGNATURE_SIZE
+        hashes = sorted((zlib.crc32(data[i:i + width]) for i in range(0, len(data) - width + 4, 4)), reverse=True)
+        # 降序写入，每个桶最后写入的即为最小值
+        bins = {value % size: value // size for value in hashes}
+        if len(bins) == size:
+            return tuple(bins[slot] for slot in range(size))
+        
+        signature = []
+        for slot in range(size):
+            distance = 0
+            while (slot + distance) % size not in bins:
+                distance += 1
+            signature.append(bins[(slot + distance) % size] + distance * cls.DENSIFY_OFFSET)
+        return tuple(signature)
+    
+    def similarity(self, first, second):
+        """两条帖子的 MinHash 相似度估计，任一方没有签名时为 None"""
+        if first not in self.signatures or second not in self.signatures:
+            return None
+        matches = sum(a == b for a, b in zip(self.signatures[first], self.signatures[second]))
+        return matches / self.SIGNATURE_SIZE
+    
+    def resolve(self):
+        """
+        合并重复组并选出每组保留的帖子
+        
+        先按 note_id 合并；各 note_id 组保留的帖子再按保留顺序与已有各组保留的帖子比较，只并入相似度
+        不低于阈值的组。近似重复总是直接与所在组保留的帖子比较，不会经 A~B、B~C 传递把不相似的 A、C 合并
+        """
+        # 没有 note_id 的帖子各自成组
+        note_groups = {}
+        for number, (_, _, note_id, _) in enumerate(self.records):
+            note_groups.setdefault(note_id or number, []).append(number)
+        leader_of = {}
+        for members in note_groups.values():
+            leader = min(members, key=self.preference)
+            for number in members:
+                leader_of[number] = leader
+        
+        # LSH：签名分为若干段，任一段完全相同的组成为候选，再按相似度确认
+        # 桶中只放各组保留的帖子，按保留顺序处理时组内保留的帖子总是最先出现，之后不会改变
+        rows = self.SIGNATURE_SIZE // self.LSH_BANDS
+        buckets = {}
+        winner_of = {}
+        leader_similarity = {}
+        for leader in sorted(set(leader_of.values()), key=self.preference):
+            winner_of[leader] = leader
+            signature = self.signatures.get(leader)
+            if signature is None:
+                continue
+            band_keys = [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.LSH_BANDS)]
+            candidates = {other for key in band_keys for other in buckets.get(key, ())}
+            best, best_similarity = None, self.NEAR_DUPLICATE_THRESHOLD
+            for other in sorted(candidates, key=self.preference):
+                similarity = self.similarity(other, leader)
+                if similarity >= best_similarity and (best is None or similarity > best_similarity):
+                    best, best_similarity = other, similarity
+            if best is None:
+                for key in band_keys:
+                    buckets.setdefault(key, []).append(leader)
+            else:
+                winner_of[leader] = best
+                leader_similarity[leader] = best_similarity
+        
+        clusters = {}
+        for number in range(len(self.records)):
+            clusters.setdefault(winner_of[leader_of[number]], []).append(number)
+        
+        self.removed = set()
+        self.groups = []
+        for winner, members in clusters.items():
+            if len(members) < 2:
+                continue
+            winner_note = self.records[winner][2]
+            duplicates = []
+            for number in members:
+                if number == winner:
+                    continue
+                partition_name, index, note_id, last_modify_ts = self.records[number]
+                self.removed.add((partition_name, index))
+                if note_id and note_id == winner_note:
+                    duplicates.append(dict(self.describe_record(number), reason='note_id',
+                                           similarity=self.similarity(winner, number)))
+                else:
+                    # 相似度为该帖子所在 note_id 组保留的帖子与本组保留的帖子之间的相似度
+                    duplicates.append(dict(self.describe_record(number), reason='near_duplicate',
+                                           similarity=leader_similarity[leader_of[number]]))
+            self.groups.append({"kept": self.describe_record(winner), "removed": duplicates})
+        self.groups.sort(key=lambda group: (self.partition_order[group['kept']['partition']], group['kept']['index']))
+        
+        near = sum(1 for group in self.groups for record in group['removed'] if record['reason'] == 'near_duplicate')
+        print(f"✓ 帖子去重: {len(self.records)} 条帖子, {len(self.groups)} 组重复, 移除 {len(self.removed)} 条 "
+              f"(note_id 重复 {len(self.removed) - near}, 近似重复 {near})")
+    
+    def preference(self, number):
+        """保留顺序：last_modify_ts 最新，其次分区顺序，再次分区内序号"""
+        partition_name, index, _, last_modify_ts = self.records[number]
+        return (-last_modify_ts, self.partition_order[partition_name], index)
+    
+    def describe_record(self, number):
+        partition_name, index, note_id, last_modify_ts = self.records[number]
+        return {"partition": partition_name, "index": index, "note_id": note_id, "last_modify_ts": last_modify_ts}
+    
+    def is_kept(self, partition_name, index):
+        return (partition_name, index) not in self.removed
+    
+    def removed_indices(self, partition_name):
+        """分区中被移除的帖子序号"""
+        return frozenset(index for name, index in self.removed if name == partition_name)
+    
+    def write_report(self, report_path):
+        """写出合并报告：每组保留的帖子与被移除的重复帖子"""
+        write_json_file({
+            "created_at": datetime.now().isoformat(),
+            "near_duplicates": self.near_duplicates,
+            "near_duplicate_threshold": self.NEAR_DUPLICATE_THRESHOLD if self.near_duplicates else None,
+            "total_posts": len(self.records),
+            "kept_posts": len(self.records) - len(self.removed),
+            "removed_posts": len(self.removed),
+            "groups": self.groups
+        }, report_path)
+        print(f"✓ 合并报告已保存: {report_path}")
+
+class BatchPKLToJSONConverter:
+    # 需要解析为整数的帖子与评论字段
+    POST_NUMERIC_FIELDS = ('time', 'liked_count', 'collected_count', 'comment_count', 'share_count')
+    COMMENT_NUMERIC_FIELDS = ('like_count', 'sub_comment_count', 'create_time')
+    
+    # 审核结论中记录的内容标记（对应前端 hasViolentContent 等字段）
+    MODERATION_FLAGS = ('violent_content', 'inappropriate_content', 'emotional_content', 'excessive_slang')
+    
+    # LLM响应文件: {note_id}{类型}.pkl
+    LLM_RESPONSE_TYPES = ('overall', 'text', 'image')
+    
+    def __init__(self, base_data_path, base_output_path, shard_size=200, output_format=None, columnar=False,
+                 pickle_cache=None, thumbnails=False, image_workers=1, image_store=False, perceptual_dedup=False,
+                 dedup='near', cache_llm_responses=False, image_store_hardlink=False):
+        """
+        初始化批量转换器
+        
+        Args:
+            base_data_path: 数据根目录路径（包含各个PKL文件和文件夹的根目录）
+            base_output_path: 输出根目录路径
+            shard_size: 分片输出中每个分片的帖子数，0 表示不生成分片
+            pickle_cache: PKL加载缓存，默认使用共享的 PICKLE_CACHE
+            thumbnails: 是否生成图片衍生版本（缩略图、详情尺寸、模糊占位图），需要 Pillow
+            image_workers: 生成图片衍生版本的进程数
+            image_store: 是否把图片存入内容寻址存储并去重
+            perceptual_dedup: 图片存储是否按感知哈希合并近似重复图片，需要 Pillow
+            image_store_hardlink: 图片存储是否硬链接原图而不是复制
+            dedup: 跨分区帖子去重方式: off (不去重), note_id (相同 note_id), near (另外合并近似重复帖子)
+            cache_llm_responses: LLM响应是否放入PKL缓存（监视模式下分区重新转换时未变化的响应直接命中）
+        """
+        self.base_data_path = Path(base_data_path)
+        self.base_output_path = Path(base_output_path)
+        self.shard_size = shard_size
+        self.ensure_base_output_directory()
+        
+        # 数据源配置
+        self.data_sources = {
+            'Part1': {
+                'pkl_file': 'Part1.pkl',
+                'image_folder': 'Part1',
+                'output_folder': 'part1_data'
+            },
+            'Part2': {
+                'pkl_file': 'Part2.pkl', 
+                'image_folder': 'Part2',
+                'output_folder': 'part2_data'
+            },
+            'PartNormal': {
+                'pkl_file': 'PartNormal.pkl',
+                'image_folder': 'PartNormal', 
+                'output_folder': 'partnormal_data'
+            }
+        }
+        
+        # LLM响应目录，目录索引在首次使用时扫描一次，所有分区共用
+        self.llm_response_folder = 'LLMResponse'
+        self.llm_response_index = None
+        
+        # 分片输出目录（前端按需加载）
+        self.shard_folder = 'shards'
+        self.output_format = output_format or OutputFormat()
+        # 列式导出 (Parquet) 目录，需要 pyarrow
+        self.columnar = columnar
+        self.columnar_folder = 'columnar'
+        self.pickle_cache = pickle_cache or PICKLE_CACHE
+        # 图片衍生版本目录，需要 Pillow
+        self.thumbnails = thumbnails
+        self.image_workers = image_workers
+        self.derivatives_folder = 'derivatives'
+        # 内容寻址的图片存储目录
+        self.image_store = image_store
+        self.perceptual_dedup = perceptual_dedup
+        self.image_store_hardlink = image_store_hardlink
+        self.image_store_folder = 'blobs'
+        # 跨分区帖子去重
+        self.dedup = dedup
+        self.cache_llm_responses = cache_llm_responses
+        
+        # 分阶段计时，每次 convert_all_partitions 重新开始
+        self.metrics = BatchConversionMetrics()
+        
+        # 监视模式下跨轮次保留的状态
+        # 各分区的去重信息: {分区: ((大小, 修改时间), partition_entries 结果)}
+        self.dedup_entries = {}
+        # 各分区上次转换的输入: {分区: {"source", "removed", "note_ids", "posts_count", "llm_responses_count"}}
+        self.partition_state = {}
+    
+    def ensure_base_output_directory(self):
+        """确保基础输出目录存在"""
+        self.base_output_path.mkdir(parents=True, exist_ok=True)
+        print(f"基础输出目录: {self.base_output_path}")
+    
+    def load_pkl_file(self, file_path, cache=False):
+        """安全加载PKL文件 (经共享的PKL加载器，cache=True 时放入缓存)"""
+        try:
+            with self.metrics.timer('load'):
+                data, error = self.pickle_cache.load(file_path, cache=cache)
+        except Exception as e:
+            data, error = None, e
+        if data is None:
+            print(f"✗ 加载失败 {file_path}: {error}")
+            return None
+        self.metrics.add('bytes_in', file_path.stat().st_size)
+        print(f"✓ 成功加载: {file_path.name} ({self.format_file_size(file_path)})")
+        return data
+    
+    def save_json_file(self, data, file_path):
+        """保存JSON文件（配置文件始终为JSON，按输出格式决定是否缩进及生成预压缩副本）"""
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.metrics.timer('write'):
+                self.output_format.write_config(data, file_path)
+                self.output_format.compress(file_path)
+            print(f"✓ 已保存: {file_path} ({self.format_file_size(file_path)})")
+            return True
+        except Exception as e:
+            print(f"✗ 保存失败 {file_path}: {e}")
+            return False
+    
+    def format_file_size(self, file_path):
+        """格式化文件大小显示"""
+        try:
+            size = file_path.stat().st_size
+            for unit in ['B', 'KB', 'MB', 'GB']:
+                if size < 1024:
+                    return f"{size:.1f} {unit}"
+                size /= 1024
+            return f"{size:.1f} TB"
+        except:
+            return "未知大小"
+    
+    def safe_int(self, value):
+        """安全地转换为整数 (支持 "1.2万" 等计数写法)"""
+        return parse_count(value)
+    
+    def normalize_numeric_fields(self, posts_data):
+        """
+        分区级数值规整：按列收集整个分区的计数与时间字段，批量解析后按位置取回
+        
+        Returns:
+            每个帖子一项: (帖子数值元组, 评论数值元组列表)，字段顺序同 POST_NUMERIC_FIELDS /
+            COMMENT_NUMERIC_FIELDS；非 dict 帖子为 None
+        """
+        posts = [post for post in posts_data if isinstance(post, dict)]
+        comment_lists = [
+            [comment for comment in post['all_comments'] if isinstance(comment, dict)]
+            if 'all_comments' in post and post['all_comments'] else []
+            for post in posts
+        ]
+        comments = [comment for comment_list in comment_lists for comment in comment_list]
+        
+        post_rows = list(zip(*(
+            parse_counts([post.get(field, 0) for post in posts]) for field in self.POST_NUMERIC_FIELDS
+        )))
+        comment_rows = list(zip(*(
+            parse_counts([comment.get(field, 0) for comment in comments]) for field in self.COMMENT_NUMERIC_FIELDS
+        )))
+        
+        numbers = []
+        row_index = 0
+        comment_offset = 0
+        for post in posts_data:
+            if not isinstance(post, dict):
+                numbers.append(None)
+                continue
+            comment_count = len(comment_lists[row_index])
+            numbers.append((post_rows[row_index], comment_rows[comment_offset:comment_offset + comment_count]))
+            comment_offset += comment_count
+            row_index += 1
+        return numbers
+    
+    def convert_single_post(self, post_data, numbers=None):
+        """
+        转换单个帖子数据
+        
+        Args:
+            post_data: 原始帖子
+            numbers: normalize_numeric_fields 预先解析的数值字段，为 None 时逐字段解析
+        """
+        try:
+            if numbers is None:
+                numbers = self.normalize_numeric_fields([post_data])[0]
+            post_numbers, comment_numbers = numbers
+            post_time, liked_count, collected_count, comment_count, share_count = post_numbers
             
-#             if note_responses:
-#                 llm_responses[note_id] = note_responses
-#                 processed_count += 1
-                
-#                 # 每处理100个显示一次进度
-#                 if processed_count % 100 == 0:
-#                     print(f"  已处理LLM响应: {processed_count}/{len(note_ids)}")
-        
-#         print(f"✓ {partition_name} LLM响应处理完成: {processed_count}/{len(note_ids)}")
-#         return llm_responses
-    
-#     def convert_partition_data(self, partition_name, config):
-#         """转换单个分区数据"""
-#         print(f"\n{'='*60}")
-#         print(f"开始处理: {partition_name}")
-#         print(f"{'='*60}")
-        
-#         # 创建分区专用输出目录
-#         partition_output_dir = self.base_output_path / config['output_folder']
-#         partition_output_dir.mkdir(parents=True, exist_ok=True)
-        
-#         # 检查PKL文件是否存在
-#         pkl_file_path = self.base_data_path / config['pkl_file']
-#         if not pkl_file_path.exists():
-#             print(f"✗ PKL文件不存在: {pkl_file_path}")
-#             return [], {}
-        
-#         print(f"数据源: {pkl_file_path}")
-#         print(f"输出目录: {partition_output_dir}")
-        
-#         # 加载分区数据
-#         posts_data = self.load_pkl_file(pkl_file_path)
-#         if posts_data is None:
-#             return [], {}
-        
-#         print(f"找到 {len(posts_data)} 个帖子")
-        
-#         # 转换所有帖子
-#         converted_posts = []
-#         note_ids = []
-        
-#         for i, post in enumerate(posts_data):
-#             converted_post = self.convert_single_post(post)
-#             if converted_post:
-#                 converted_posts.append(converted_post)
-#                 note_ids.append(converted_post['note_id'])
+            # 处理评论数据
+            comments = []
+            if 'all_comments' in post_data and post_data['all_comments']:
+                comment_rows = iter(comment_numbers)
+                for comment in post_data['all_comments']:
+                    like_count, sub_comment_count, create_time = next(comment_rows) if isinstance(comment, dict) else (0, 0, 0)
+                    comments.append({
+                        'comment_id': comment.get('comment_id', ''),
+                        'content': comment.get('content', ''),
+                        'user_id': comment.get('user_id', ''),
+                        'nickname': comment.get('nickname', ''),
+                        'avatar': comment.get('avatar', ''),
+                        'like_count': like_count,
+                        'sub_comment_count': sub_comment_count,
+                        'create_time': create_time,
+                        'parent_comment_id': comment.get('parent_comment_id', '0')
+                    })
             
-#             # 显示进度
-#             if (i + 1) % 100 == 0 or (i + 1) == len(posts_data):
-#                 print(f"帖子转换进度: {i + 1}/{len(posts_data)}")
-        
-#         # 保存帖子数据
-#         posts_json_path = partition_output_dir / f"{partition_name.lower()}_posts.json"
-#         self.save_json_file(converted_posts, posts_json_path)
-        
-#         # 转换对应的LLM响应
-#         llm_responses = self.convert_llm_responses_for_partition(partition_name, note_ids)
-        
-#         # 保存LLM响应数据
-#         if llm_responses:
-#             llm_json_path = partition_output_dir / f"{partition_name.lower()}_llm_responses.json"
-#             self.save_json_file(llm_responses, llm_json_path)
-        
-#         # 创建分区配置文件
-#         partition_config = {
-#             "partition_name": partition_name,
-#             "posts_count": len(converted_posts),
-#             "llm_responses_count": len(llm_responses),
-#             "created_at": datetime.now().isoformat(),
-#             "source_pkl": str(pkl_file_path),
-#             "image_folder": config.get('image_folder', ''),
-#             "files": {
-#                 "posts": f"{partition_name.lower()}_posts.json",
-#                 "llm_responses": f"{partition_name.lower()}_llm_responses.json"
-#             }
-#         }
-        
-#         config_path = partition_output_dir / "config.json"
-#         self.save_json_file(partition_config, config_path)
-        
-#         print(f"\n✓ {partition_name} 处理完成!")
-#         print(f"  - 帖子数据: {len(converted_posts)} 条")
-#         print(f"  - LLM响应: {len(llm_responses)} 条")
-#         print(f"  - 输出目录: {partition_output_dir}")
-        
-#         return converted_posts, llm_responses
-    
-#     def convert_all_partitions(self):
-#         """转换所有分区数据"""
-#         print("开始批量转换PKL文件到JSON格式...")
-#         print(f"数据根目录: {self.base_data_path}")
-#         print(f"输出根目录: {self.base_output_path}")
-        
-#         all_posts = []
-#         all_llm_responses = {}
-#         partition_summary = {}
-        
-#         # 处理每个分区
-#         for partition_name, config in self.data_sources.items():
-#             posts, llm_responses = self.convert_partition_data(partition_name, config)
+            # 转换后的帖子数据
+            converted = {
+                'note_id': post_data.get('note_id', ''),
+                'type': post_data.get('type', 'image'),
+                'title': post_data.get('title', ''),
+                'desc': post_data.get('desc', ''),
+                'video_url': post_data.get('video_url', ''),
+                'time': post_time,
+                'user_id': post_data.get('user_id', ''),
+                'nickname': post_data.get('nickname', ''),
+                'avatar': post_data.get('avatar', ''),
+                'liked_count': liked_count,
+                'collected_count': collected_count,
+                'comment_count': comment_count,
+                'share_count': share_count,
+                'image_list': post_data.get('image_list', ''),
+                'tag_list': post_data.get('tag_list', ''),
+                'source_keyword': post_data.get('source_keyword', ''),
+                'all_comments': comments,
+                'image_folder_path': post_data.get('image_folder_path', ''),
+                'ip_location': post_data.get('ip_location', ''),
+                'note_url': post_data.get('note_url', ''),
+                'xsec_token': post_data.get('xsec_token', ''),
+                'last_modify_ts': post_data.get('last_modify_ts', 0),
+                'last_update_time': post_data.get('last_update_time', 0)
+            }
             
-#             # 合并到总数据中
-#             all_posts.extend(posts)
-#             all_llm_responses.update(llm_responses)
+            return converted
             
-#             # 记录分区汇总信息
-#             partition_summary[partition_name] = {
-#                 "posts_count": len(posts),
-#                 "llm_responses_count": len(llm_responses),
-#                 "output_folder": config['output_folder']
-#             }
-        
-#         # 保存合并的所有数据
-#         if all_posts:
-#             print(f"\n{'='*60}")
-#             print("保存合并数据")
-#             print(f"{'='*60}")
+        except Exception as e:
+            print(f"✗ 转换帖子数据失败: {e}")
+            return None
+    
+    def parse_llm_response_name(self, file_name):
+        """解析LLM响应文件名 {note_id}{类型}.pkl，返回 (note_id, 类型)，不匹配时为 None"""
+        for response_type in self.LLM_RESPONSE_TYPES:
+            suffix = f"{response_type}.pkl"
+            if file_name.endswith(suffix) and len(file_name) > len(suffix):
+                return file_name[:-len(suffix)], response_type
+        return None
+    
+    def build_llm_response_index(self):
+        """
+        扫描一次LLMResponse目录，建立 note_id -> {类型: 文件路径} 索引
+        
+        Returns:
+            索引 dict，目录不存在时为 None
+        """
+        llm_response_dir = self.base_data_path / self.llm_response_folder
+        
+        index = {}
+        file_count = 0
+        try:
+            with os.scandir(llm_response_dir) as entries:
+                for entry in entries:
+                    parsed = self.parse_llm_response_name(entry.name)
+                    if parsed is not None:
+                        note_id, response_type = parsed
+                        index.setdefault(note_id, {})[response_type] = Path(entry.path)
+                        file_count += 1
+        except FileNotFoundError:
+            print(f"✗ LLMResponse目录不存在: {llm_response_dir}")
+            return None
+        
+        print(f"✓ LLMResponse目录索引: {len(index)} 个帖子, {file_count} 个响应文件")
+        return index
+    
+    def iter_llm_responses_for_partition(self, partition_name, note_ids):
+        """为特定分区逐条产出LLM响应数据 (note_id, {类型: 响应})"""
+        print(f"\n--- 为 {partition_name} 处理LLM响应 ---")
+        
+        if self.llm_response_index is None:
+            self.llm_response_index = self.build_llm_response_index()
+            if self.llm_response_index is None:
+                return
+        
+        missing_counts = dict.fromkeys(self.LLM_RESPONSE_TYPES, 0)
+        no_response_count = 0
+        processed_count = 0
+        for note_id in note_ids:
+            note_files = self.llm_response_index.get(note_id)
+            if not note_files:
+                no_response_count += 1
+                continue
             
-#             # 保存所有帖子数据
-#             all_posts_path = self.base_output_path / 'all_posts.json'
-#             self.save_json_file(all_posts, all_posts_path)
+            note_responses = {}
+            for response_type in self.LLM_RESPONSE_TYPES:
+                response_file = note_files.get(response_type)
+                if response_file is None:
+                    missing_counts[response_type] += 1
+                    continue
+                response_data = self.load_pkl_file(response_file, cache=self.cache_llm_responses)
+                if response_data is not None:
+                    note_responses[response_type] = response_data
             
-#             # 保存所有LLM响应数据
-#             all_llm_path = self.base_output_path / 'all_llm_responses.json'
-#             self.save_json_file(all_llm_responses, all_llm_path)
+            if note_responses:
+                processed_count += 1
+                yield note_id, note_responses
+                
+                # 每处理100个显示一次进度
+                if processed_count % 100 == 0:
+                    print(f"  已处理LLM响应: {processed_count}/{len(note_ids)}")
+        
+        if no_response_count or any(missing_counts.values()):
+            missing_summary = ', '.join(f"{response_type} {count}" for response_type, count in missing_counts.items())
+            print(f"  ⚠ {no_response_count} 个帖子没有LLM响应; 部分缺失的响应类型: {missing_summary}")
+        print(f"✓ {partition_name} LLM响应处理完成: {processed_count}/{len(note_ids)}")
+    
+    def build_moderation_block(self, note_responses):
+        """
+        将一个帖子的LLM响应 {overall, text, image} 归一化为精简的审核结论
+        
+        解析规则与前端 DataService.parseLLMResult 保持一致，前端只需展开该结论，
+        无需加载和解析原始LLM响应
+        
+        Returns:
+            {"decision", "reasons", "confidence", "flags", "text", "image", "comments"}
+        """
+        try:
+            analysis = note_responses
+            if js_truthy(note_responses.get('analysis')):
+                analysis = note_responses['analysis']
+            overall = note_responses.get('overall')
+            if js_truthy(overall) and isinstance(overall, dict) and js_truthy(overall.get('analysis')):
+                analysis = overall['analysis']
+            if not isinstance(analysis, dict):
+                analysis = {}
             
-#             # 创建总配置文件
-#             master_config = {
-#                 "total_posts": len(all_posts),
-#                 "total_llm_responses": len(all_llm_responses),
-#                 "partitions": partition_summary,
-#                 "created_at": datetime.now().isoformat(),
-#                 "source_directory": str(self.base_data_path),
-#                 "files": {
-#                     "all_posts": "all_posts.json",
-#                     "all_llm_responses": "all_llm_responses.json"
-#                 }
-#             }
+            # 确定总体决策
+            decision = 'safe'
+            if js_truthy(analysis.get('final_decision')):
+                decision = analysis['final_decision']
+            elif js_truthy(analysis.get('decision')):
+                decision = analysis['decision']
+            elif analysis.get('is_safe') is False:
+                decision = 'block'
+            elif analysis.get('needs_review') is True:
+                decision = 'review'
             
-#             master_config_path = self.base_output_path / 'master_config.json'
-#             self.save_json_file(master_config, master_config_path)
+            if not isinstance(decision, str):
+                raise TypeError(f"无法识别的决策类型: {type(decision).__name__}")
             
-#             # 创建前端兼容的配置文件
-#             frontend_config = {
-#                 "dataPath": "/data",
-#                 "lastUpdated": datetime.now().isoformat(),
-#                 "totalPosts": len(all_posts),
-#                 "totalLLMResponses": len(all_llm_responses),
-#                 "availableFiles": [
-#                     {
-#                         "name": "all_posts.json",
-#                         "size": all_posts_path.stat().st_size,
-#                         "path": "/data/all_posts.json",
-#                         "type": "posts"
-#                     },
-#                     {
-#                         "name": "all_llm_responses.json", 
-#                         "size": all_llm_path.stat().st_size,
-#                         "path": "/data/all_llm_responses.json",
-#                         "type": "llm_responses"
-#                     }
-#                 ]
-#             }
+            return {
+                "decision": decision,
+                "reasons": js_or(analysis.get('reasons'), analysis.get('issues'), []),
+                "confidence": js_or(analysis.get('confidence'), 0.8),
+                "flags": [flag for flag in self.MODERATION_FLAGS if js_truthy(analysis.get(flag))],
+                "text": self.parse_content_moderation(js_or(note_responses.get('text'), analysis.get('text'))),
+                "image": self.parse_content_moderation(js_or(note_responses.get('image'), analysis.get('image'))),
+                "comments": self.parse_comments_moderation(
+                    js_or(note_responses.get('comments'), analysis.get('comments'))
+                )
+            }
+        except Exception as e:
+            print(f"  ⚠ 审核结论解析失败: {e}")
+            return {"decision": "safe", "reasons": [], "confidence": 0.5, "flags": []}
+    
+    def parse_content_moderation(self, content_result):
+        """文本/图片审核结果，对应前端 parseContentResult"""
+        if not js_truthy(content_result) or not isinstance(content_result, dict):
+            return {"isSafe": True, "reasons": []}
+        
+        is_safe = content_result.get('is_safe') is not False
+        if any(js_truthy(content_result.get(key)) for key in ('has_violation', 'violation', 'blocked')):
+            is_safe = False
+        
+        return {
+            "isSafe": is_safe,
+            "reasons": js_or(content_result.get('reasons'), content_result.get('issues'), []),
+            "confidence": js_or(content_result.get('confidence'), 0.8)
+        }
+    
+    def parse_comments_moderation(self, comments_result):
+        """评论审核结果，对应前端 parseCommentsResult"""
+        if not js_truthy(comments_result) or not isinstance(comments_result, dict):
+            return {"isSafe": True, "reasons": [], "blockedCount": 0}
+        
+        return {
+            "isSafe": comments_result.get('is_safe') is not False,
+            "reasons": js_or(comments_result.get('reasons'), comments_result.get('issues'), []),
+            "blockedCount": js_or(comments_result.get('blocked_count'), 0),
+            "confidence": js_or(comments_result.get('confidence'), 0.8)
+        }
+    
+    def scan_partition_images(self, partition_name, config):
+        """
+        构建时扫描分区图片目录 (image_folder/{note_id}/*.jpg)，生成每个帖子的图片清单
+        
+        Returns:
+            {note_id: [{"path", "size", "width", "height"}]}，图片目录不存在时返回 None
+        """
+        image_dir = self.base_data_path / config.get('image_folder', partition_name)
+        if not image_dir.is_dir():
+            print(f"⚠ 图片目录不存在，跳过图片清单: {image_dir}")
+            return None
+        
+        image_index = {}
+        image_count = 0
+        with os.scandir(image_dir) as note_entries:
+            for note_entry in note_entries:
+                if not note_entry.is_dir():
+                    continue
+                
+                images = []
+                with os.scandir(note_entry.path) as image_entries:
+                    image_files = sorted(
+                        (entry for entry in image_entries
+                         if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)),
+                        key=lambda entry: image_sort_key(entry.name)
+                    )
+                for entry in image_files:
+                    width, height = read_image_size(entry.path)
+                    images.append({
+                        "path": f"/data/{partition_name}/images/{note_entry.name}/{entry.name}",
+                        "size": entry.stat().st_size,
+                        "width": width,
+                        "height": height
+                    })
+                
+                image_index[note_entry.name] = images
+                image_count += len(images)
+        
+        print(f"✓ 图片清单: {len(image_index)} 个帖子目录, {image_count} 张图片")
+        return image_index
+    
+    def iter_converted_posts(self, posts_data):
+        """逐条产出转换后的帖子数据 (数值字段先按整个分区批量解析)"""
+        with self.metrics.timer('convert'):
+            numeric_rows = self.normalize_numeric_fields(posts_data)
+        for i, post in enumerate(posts_data):
+            with self.metrics.timer('convert'):
+                converted_post = self.convert_single_post(post, numeric_rows[i])
+            if converted_post:
+                yield converted_post
             
-#             frontend_config_path = self.base_output_path / 'config.json'
-#             self.save_json_file(frontend_config, frontend_config_path)
-        
-#         # 打印最终汇总
-#         print(f"\n{'='*60}")
-#         print("转换完成汇总")
-#         print(f"{'='*60}")
-#         print(f"总帖子数: {len(all_posts)}")
-#         print(f"总LLM响应数: {len(all_llm_responses)}")
-#         print(f"处理的分区:")
-#         for partition_name, summary in partition_summary.items():
-#             print(f"  - {partition_name}: {summary['posts_count']} 帖子, {summary['llm_responses_count']} LLM响应")
-#         print(f"\n所有文件已保存到: {self.base_output_path}")
-        
-#         return all_posts, all_llm_responses, partition_summary
-    
-#     def create_copy_instructions(self):
-#         """创建文件复制说明"""
-#         instructions = f"""
-# # 文件复制说明
-
-# ## 转换完成的文件结构:
-# {self.base_output_path}/
-# ├── all_posts.json              # 所有帖子合并数据 (前端主要使用)
-# ├── all_llm_responses.json      # 所有LLM响应合并数据 (前端主要使用)  
-# ├── config.json                 # 前端配置文件
-# ├── master_config.json          # 主配置文件
-# ├── part1_data/                 # Part1分区数据
-# │   ├── part1_posts.json
-# │   ├── part1_llm_responses.json
-# │   └── config.json
-# ├── part2_data/                 # Part2分区数据
-# │   ├── part2_posts.json
-# │   ├── part2_llm_responses.json  
-# │   └── config.json
-# └── partnormal_data/            # PartNormal分区数据
-#     ├── partnormal_posts.json
-#     ├── partnormal_llm_responses.json
-#     └── config.json
-
-# ## 复制到前端项目:
-
-# 1. 创建前端数据目录:
-#    mkdir 你的前端项目/public/data
-
-# 2. 复制主要文件(推荐):
-#    copy "{self.base_output_path}/all_posts.json" "你的前端项目/public/data/"
-#    copy "{self.base_output_path}/all_llm_responses.json" "你的前端项目/public/data/"
-#    copy "{self.base_output_path}/config.json" "你的前端项目/public/data/"
-
-# 3. 或者复制所有文件:
-#    xcopy "{self.base_output_path}" "你的前端项目/public/data/" /E /I
-
-# ## 前端加载说明:
-# - 前端会优先加载 all_posts.json 和 all_llm_responses.json
-# - 如果需要分区加载，可以修改前端代码使用各分区的单独文件
-# - config.json 包含了文件元信息，帮助前端了解数据结构
-# """
-        
-#         instructions_path = self.base_output_path / 'COPY_INSTRUCTIONS.txt'
-#         with open(instructions_path, 'w', encoding='utf-8') as f:
-#             f.write(instructions)
-        
-#         print(f"✓ 已创建复制说明文件: {instructions_path}")
-
-# def main():
-#     """主函数 - 命令行参数版本"""
-#     parser = argparse.ArgumentParser(description='批量PKL文件转JSON转换工具')
-#     parser.add_argument('--input', '-i', required=True, help='PKL文件根目录路径 (包含Part1.pkl, Part2.pkl等)')
-#     parser.add_argument('--output', '-o', required=True, help='JSON文件输出根目录路径')
-    
-#     args = parser.parse_args()
-    
-#     # 验证输入路径
-#     input_path = Path(args.input)
-#     if not input_path.exists():
-#         print(f"✗ 输入路径不存在: {input_path}")
-#         sys.exit(1)
-    
-#     # 创建转换器并执行转换
-#     converter = BatchPKLToJSONConverter(input_path, args.output)
-#     converter.convert_all_partitions()
-#     converter.create_copy_instructions()
-    
-#     print(f"\n✓ 批量转换完成！")
-#     print(f"请查看 {converter.base_output_path}/COPY_INSTRUCTIONS.txt 了解如何复制文件到前端项目")
-
-# def interactive_main():
-#     """交互式主函数"""
-#     print("批量PKL文件转JSON转换工具")
-#     print("=" * 60)
-#     print("此工具会处理以下文件:")
-#     print("- Part1.pkl -> part1_data/")
-#     print("- Part2.pkl -> part2_data/") 
-#     print("- PartNormal.pkl -> partnormal_data/")
-#     print("- LLMResponse/ -> 对应分区的LLM响应文件")
-#     print("=" * 60)
-    
-#     # # 获取输入路径
-#     # while True:
-#     #     input_path = input("\n请输入PKL文件根目录路径 (包含Part1.pkl, Part2.pkl等): ").strip().strip('"')
-#     #     if not input_path:
-#     #         print("输入路径不能为空")
-#     #         continue
+            # 显示进度
+            if (i + 1) % 100 == 0 or (i + 1) == len(posts_data):
+                print(f"帖子转换进度: {i + 1}/{len(posts_data)}")
+    
+    def convert_partition_data(self, partition_name, config, all_posts_writer=None, all_llm_writer=None,
+                               shard_builder=None, stats_builder=None, columnar_exporter=None, image_deriver=None,
+                               image_store=None, deduplicator=None):
+        """
+        转换单个分区数据
+        
+        先逐条转换LLM响应并归一化为审核结论，再逐条转换帖子并合并其审核结论，
+        逐条写入分区文件（以及可选的合并文件）；内存中只保留精简的审核结论
+        
+        Args:
+            partition_name: 分区名称
+            config: 分区配置
+            all_posts_writer: 合并帖子文件的写入器，为 None 时只写分区文件
+            all_llm_writer: 合并LLM响应文件的写入器
+            shard_builder: 分片输出构建器，为 None 时不生成分片
+            stats_builder: 统计累计器，为 None 时不统计
+            columnar_exporter: 列式导出器，为 None 时不导出
+            image_deriver: 图片衍生版本生成器，为 None 时不生成
+            image_store: 内容寻址的图片存储，为 None 时图片清单使用分区内的原路径
+            deduplicator: 已完成合并的跨分区去重器，为 None 时不去重
             
-#     #     input_path = Path(input_path)
-#     #     if not input_path.exists():
-#     #         print(f"✗ 路径不存在: {input_path}")
-#     #         continue
+        Returns:
+            (帖子数, LLM响应数)
+        """
+        print(f"\n{'='*60}")
+        print(f"开始处理: {partition_name}")
+        print(f"{'='*60}")
+        
+        # 创建分区专用输出目录
+        partition_output_dir = self.base_output_path / config['output_folder']
+        partition_output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 转换完成前不保留上次的状态，中途失败时下一轮重新转换
+        self.partition_state.pop(partition_name, None)
+        
+        # 检查PKL文件是否存在
+        pkl_file_path = self.base_data_path / config['pkl_file']
+        source = self.source_key(pkl_file_path)
+        if source is None:
+            print(f"✗ PKL文件不存在: {pkl_file_path}")
+            return 0, 0
+        
+        print(f"数据源: {pkl_file_path}")
+        print(f"输出目录: {partition_output_dir}")
+        
+        # 加载分区数据
+        # 分区帖子PKL不放入缓存，转换完即可释放（去重阶段同样不缓存，峰值内存只有一个分区）
+        posts_data = self.load_pkl_file(pkl_file_path, cache=False)
+        if posts_data is None:
+            return 0, 0
+        
+        print(f"找到 {len(posts_data)} 个帖子")
+        if deduplicator is not None:
+            total_posts = len(posts_data)
+            posts_data = [post for index, post in enumerate(posts_data) if deduplicator.is_kept(partition_name, index)]
+            if len(posts_data) < total_posts:
+                print(f"去重后保留 {len(posts_data)} 个帖子 (移除 {total_posts - len(posts_data)} 个重复帖子)")
+        
+        # 转换并流式保存对应的LLM响应，同时生成每个帖子的审核结论
+        note_ids = [post.get('note_id', '') for post in posts_data if isinstance(post, dict)]
+        moderation_index = {}
+        suffix = self.output_format.suffix
+        llm_json_path = partition_output_dir / f"{partition_name.lower()}_llm_responses{suffix}"
+        with self.output_format.open_writer(llm_json_path, 'dict') as llm_writer:
+            for note_id, note_responses in self.iter_llm_responses_for_partition(partition_name, note_ids):
+                with self.metrics.timer('write'):
+                    llm_writer.write(note_responses, key=note_id)
+                    if all_llm_writer is not None:
+                        all_llm_writer.write(note_responses, key=note_id)
+                with self.metrics.timer('convert'):
+                    moderation_index[note_id] = self.build_moderation_block(note_responses)
+        llm_responses_count = llm_writer.count
         
-#     #     # 检查必要文件
-#     #     missing_files = []
-#     #     required_files = ['Part1.pkl', 'Part2.pkl', 'PartNormal.pkl']
-#     #     for file in required_files:
-#     #         if not (input_path / file).exists():
-#     #             missing_files.append(file)
+        if llm_responses_count:
+            with self.metrics.timer('write'):
+                self.output_format.compress(llm_json_path)
+            self.metrics.add('bytes_out', llm_json_path.stat().st_size)
+            print(f"✓ 已保存: {llm_json_path} ({self.format_file_size(llm_json_path)})")
+        else:
+            llm_json_path.unlink()
+            self.output_format.remove_siblings(llm_json_path)
+        
+        # 构建时生成图片清单，前端无需逐张探测图片是否存在
+        image_index = self.scan_partition_images(partition_name, config)
+        image_dir = self.base_data_path / config.get('image_folder', partition_name)
+        if image_index is not None and image_deriver is not None:
+            image_deriver.process(partition_name, image_dir, image_index)
+        # 衍生版本按原图生成，之后再把图片清单的路径改为共享存储路径
+        if image_index is not None and image_store is not None:
+            image_store.ingest(partition_name, image_dir, image_index)
+        
+        # 转换并流式保存帖子数据，没有LLM响应的帖子 moderation 为 null
+        posts_json_path = partition_output_dir / f"{partition_name.lower()}_posts{suffix}"
+        with self.output_format.open_writer(posts_json_path, 'list') as posts_writer:
+            for converted_post in self.iter_converted_posts(posts_data):
+                if image_index is not None:
+                    converted_post['images'] = image_index.get(converted_post['note_id'], [])
+                converted_post['moderation'] = moderation_index.get(converted_post['note_id'])
+                with self.metrics.timer('shard_stats'):
+                    if shard_builder is not None:
+                        shard_builder.add_post(converted_post, partition_name, posts_writer.count)
+                    if stats_builder is not None:
+                        stats_builder.add_post(converted_post, partition_name)
+                    if columnar_exporter is not None:
+                        columnar_exporter.add_post(converted_post, partition_name)
+                with self.metrics.timer('write'):
+                    posts_writer.write(converted_post)
+                    if all_posts_writer is not None:
+                        all_posts_writer.write(converted_post)
+        posts_count = posts_writer.count
+        self.metrics.add('posts', posts_count)
+        with self.metrics.timer('write'):
+            self.output_format.compress(posts_json_path)
+        self.metrics.add('bytes_out', posts_json_path.stat().st_size)
+        if columnar_exporter is not None:
+            with self.metrics.timer('shard_stats'):
+                columnar_exporter.flush_partition()
+        print(f"✓ 已保存: {posts_json_path} ({self.format_file_size(posts_json_path)})")
+        
+        # 原始帖子数据不再需要
+        del posts_data
+        
+        # 创建分区配置文件
+        partition_config = {
+            "partition_name": partition_name,
+            "posts_count": posts_count,
+            "llm_responses_count": llm_responses_count,
+            "created_at": datetime.now().isoformat(),
+            "source_pkl": str(pkl_file_path),
+            "image_folder": config.get('image_folder', ''),
+            "output_format": self.output_format.describe(),
+            "files": {
+                "posts": posts_json_path.name,
+                # 没有LLM响应时不生成该文件
+                "llm_responses": llm_json_path.name if llm_responses_count else None
+            }
+        }
+        
+        config_path = partition_output_dir / "config.json"
+        self.save_json_file(partition_config, config_path)
         
-#     #     if missing_files:
-#     #         print(f"⚠ 以下文件不存在: {', '.join(missing_files)}")
-#     #         choice = input("是否继续处理存在的文件? (y/N): ").lower()
-#     #         if choice != 'y':
-#     #             continue
+        print(f"\n✓ {partition_name} 处理完成!")
+        print(f"  - 帖子数据: {posts_count} 条")
+        print(f"  - LLM响应: {llm_responses_count} 条")
+        print(f"  - 输出目录: {partition_output_dir}")
         
-#     #     break
+        self.partition_state[partition_name] = {
+            "source": source,
+            "removed": deduplicator.removed_indices(partition_name) if deduplicator is not None else frozenset(),
+            "note_ids": frozenset(note_ids),
+            "posts_count": posts_count,
+            "llm_responses_count": llm_responses_count
+        }
+        return posts_count, llm_responses_count
     
-#     # # 获取输出路径
-#     # while True:
-#     #     output_path = input("请输入JSON文件输出根目录路径: ").strip().strip('"')
-#     #     if not output_path:
-#     #         print("输出路径不能为空")
-#     #         continue
-#     #     break
+    def source_key(self, file_path):
+        """文件的 (大小, 修改时间)，不存在时为 None"""
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
     
-#     # print(f"\n开始转换...")
-#     # print(f"输入目录: {input_path}")
-#     # print(f"输出目录: {output_path}")
+    def partition_output_paths(self, partition_name, config):
+        """分区帖子与LLM响应输出文件路径"""
+        partition_output_dir = self.base_output_path / config['output_folder']
+        suffix = self.output_format.suffix
+        return (partition_output_dir / f"{partition_name.lower()}_posts{suffix}",
+                partition_output_dir / f"{partition_name.lower()}_llm_responses{suffix}")
     
-#     # # 创建转换器并执行转换
-#     # converter = BatchPKLToJSONConverter(input_path, output_path)
-#     # converter.convert_all_partitions()
-#     # converter.create_copy_instructions()
+    def changed_llm_note_ids(self, changed_files):
+        """变化的文件中LLM响应文件对应的 note_id"""
+        llm_response_dir = (self.base_data_path / self.llm_response_folder).resolve()
+        note_ids = set()
+        for file_path in map(Path, changed_files):
+            if file_path.parent.resolve() != llm_response_dir:
+                continue
+            parsed = self.parse_llm_response_name(file_path.name)
+            if parsed is not None:
+                note_ids.add(parsed[0])
+        return note_ids
     
-#     # print(f"\n✓ 批量转换完成！")
-#     # print(f"请查看 {converter.base_output_path}/COPY_INSTRUCTIONS.txt 了解如何复制文件到前端项目")
-
-# if __name__ == "__main__":
+    def can_reuse_partition(self, partition_name, config, deduplicator, changed_note_ids):
+        """
+        分区能否直接复用上次的输出：分区PKL未变化、去重后保留的帖子不变、
+        这些帖子的LLM响应都没有变化，且输出文件仍在
+        """
+        state = self.partition_state.get(partition_name)
+        if state is None or state['source'] != self.source_key(self.base_data_path / config['pkl_file']):
+            return False
+        removed = deduplicator.removed_indices(partition_name) if deduplicator is not None else frozenset()
+        if removed != state['removed'] or not state['note_ids'].isdisjoint(changed_note_ids):
+            return False
+        posts_json_path, llm_json_path = self.partition_output_paths(partition_name, config)
+        return posts_json_path.exists() and (llm_json_path.exists() or not state['llm_responses_count'])
     
-#     input_path = "/Users/roychen/Desktop/xhs/Rednote"  # 修改为你的PKL文件目录
-#     output_path = "/Users/roychen/Desktop/xhs/xiaohongshu/frontend/public/data"  # 修改为你的JSON输出目录
+    def replay_partition(self, partition_name, config, all_posts_writer=None, all_llm_writer=None,
+                         shard_builder=None, stats_builder=None, columnar_exporter=None, image_store=None):
+        """
+        复用未变化分区的输出：读回分区输出文件，写入合并文件并交给分片、统计与列式导出，
+        不再加载分区PKL与LLM响应，也不重新处理图片衍生版本
+        
+        Returns:
+            (帖子数, LLM响应数)
+        """
+        print(f"\n♻️  {partition_name} 未变化，复用分区输出")
+        state = self.partition_state[partition_name]
+        posts_json_path, llm_json_path = self.partition_output_paths(partition_name, config)
+        
+        if state['llm_responses_count'] and all_llm_writer is not None:
+            with self.metrics.timer('load'):
+                llm_responses = self.output_format.load(llm_json_path)
+            with self.metrics.timer('write'):
+                for note_id, note_responses in llm_responses.items():
+                    all_llm_writer.write(note_responses, key=note_id)
+            del llm_responses
+        
+        # 图片存储会清理本轮未引用的文件，复用的分区同样登记其图片（指纹取自索引，不重新计算哈希）
+        if image_store is not None:
+            image_index = self.scan_partition_images(partition_name, config)
+            if image_index is not None:
+                image_store.ingest(partition_name, self.base_data_path / config.get('image_folder', partition_name),
+                                   image_index)
+        
+        with self.metrics.timer('load'):
+            posts = self.output_format.load(posts_json_path)
+        for index, converted_post in enumerate(posts):
+            with self.metrics.timer('shard_stats'):
+                if shard_builder is not None:
+                    shard_builder.add_post(converted_post, partition_name, index)
+                if stats_builder is not None:
+                    stats_builder.add_post(converted_post, partition_name)
+                if columnar_exporter is not None:
+                    columnar_exporter.add_post(converted_post, partition_name)
+            if all_posts_writer is not None:
+                with self.metrics.timer('write'):
+                    all_posts_writer.write(converted_post)
+        self.metrics.add('posts', len(posts))
+        if columnar_exporter is not None:
+            with self.metrics.timer('shard_stats'):
+                columnar_exporter.flush_partition()
+        return len(posts), state['llm_responses_count']
     
-#     print("批量PKL文件转JSON转换工具")
-#     print("=" * 60)
-#     print(f"输入目录: {input_path}")
-#     print(f"输出目录: {output_path}")
-#     print("=" * 60)
+    def plan_deduplication(self):
+        """
+        转换前遍历所有分区，按 note_id 与标题+正文近似度合并重复帖子
+        
+        分区PKL不放入缓存，登记完 (序号, note_id, 时间, 签名) 即释放，同一时刻只有一个分区的数据在内存中；
+        转换阶段再逐个分区重新加载。去重信息按分区PKL的大小与修改时间保留，监视模式下未变化的分区不再重新加载
+        """
+        print(f"\n{'='*60}")
+        print(f"跨分区帖子去重 ({self.dedup})")
+        print(f"{'='*60}")
+        deduplicator = PostDeduplicator(near_duplicates=self.dedup == 'near')
+        for partition_name, config in self.data_sources.items():
+            pkl_file_path = self.base_data_path / config['pkl_file']
+            source = self.source_key(pkl_file_path)
+            cached = self.dedup_entries.pop(partition_name, None)
+            if source is None:
+                continue
+            if cached is not None and cached[0] == source:
+                entries = cached[1]
+            else:
+                posts_data = self.load_pkl_file(pkl_file_path, cache=False)
+                if posts_data is None:
+                    continue
+                with self.metrics.timer('dedup'):
+                    entries = deduplicator.partition_entries(posts_data)
+                del posts_data
+            self.dedup_entries[partition_name] = (source, entries)
+            with self.metrics.timer('dedup'):
+                deduplicator.add_partition(partition_name, entries)
+        with self.metrics.timer('dedup'):
+            deduplicator.resolve()
+        return deduplicator
     
-#     # 验证输入路径
-#     input_path_obj = Path(input_path)
-#     if not input_path_obj.exists():
-#         print(f"✗ 输入路径不存在: {input_path}")
-#         sys.exit(1)
+    def convert_all_partitions(self, changed_files=None):
+        """
+        转换所有分区数据，合并文件与分区文件同时流式写入
+        
+        Args:
+            changed_files: 监视模式下本轮变化的文件路径；为 None 时重新转换所有分区，否则只重新转换受影响的分区
+                (分区PKL变化、其帖子的LLM响应变化或去重结果变化)，其余分区复用上次的输出重新生成合并文件
+        """
+        print("开始批量转换PKL文件到JSON格式...")
+        print(f"数据根目录: {self.base_data_path}")
+        print(f"输出根目录: {self.base_output_path}")
+        
+        partition_summary = {}
+        self.metrics.reset()
+        # 每次运行重新扫描LLM响应目录（监视模式下同一转换器会多次运行）
+        self.llm_response_index = None
+        deduplicator = self.plan_deduplication() if self.dedup != 'off' else None
+        changed_note_ids = self.changed_llm_note_ids(changed_files) if changed_files is not None else None
+        
+        suffix = self.output_format.suffix
+        all_posts_path = self.base_output_path / f'all_posts{suffix}'
+        all_llm_path = self.base_output_path / f'all_llm_responses{suffix}'
+        
+        stats_builder = StatisticsBuilder()
+        shard_builder = None
+        if self.shard_size > 0:
+            shard_builder = PostShardBuilder(self.base_output_path / self.shard_folder, self.shard_size,
+                                             self.output_format)
+        columnar_exporter = None
+        if self.columnar:
+            if pa is None:
+                print("⚠️ 未安装 pyarrow，跳过列式导出 (pip install pyarrow)")
+            else:
+                columnar_exporter = ColumnarExporter(self.base_output_path / self.columnar_folder)
+        image_deriver = None
+        if self.thumbnails:
+            if Image is None:
+                print("⚠️ 未安装 Pillow，跳过图片衍生版本 (pip install Pillow)")
+            else:
+                image_deriver = ImageDerivativeBuilder(self.base_output_path / self.derivatives_folder,
+                                                       f"/data/{self.derivatives_folder}", self.image_workers)
+        image_store = None
+        if self.image_store:
+            perceptual = self.perceptual_dedup
+            if perceptual and Image is None:
+                print("⚠️ 未安装 Pillow，图片存储只做完全重复去重 (pip install Pillow)")
+                perceptual = False
+            image_store = ImageStore(self.base_output_path / self.image_store_folder,
+                                     f"/data/{self.image_store_folder}", perceptual, self.image_store_hardlink)
+        
+        with self.output_format.open_writer(all_posts_path, 'list') as all_posts_writer, \
+                self.output_format.open_writer(all_llm_path, 'dict') as all_llm_writer:
+            # 处理每个分区
+            for partition_name, config in self.data_sources.items():
+                try:
+                    if changed_note_ids is not None and self.can_reuse_partition(partition_name, config, deduplicator,
+                                                                                 changed_note_ids):
+                        posts_count, llm_responses_count = self.replay_partition(
+                            partition_name, config, all_posts_writer, all_llm_writer, shard_builder, stats_builder,
+                            columnar_exporter, image_store
+                        )
+                    else:
+                        posts_count, llm_responses_count = self.convert_partition_data(
+                            partition_name, config, all_posts_writer, all_llm_writer, shard_builder, stats_builder,
+                            columnar_exporter, image_deriver, image_store, deduplicator
+                        )
+                except BaseException:
+                    if shard_builder is not None:
+                        shard_builder.close_spools()
+                    if columnar_exporter is not None:
+                        columnar_exporter.abort()
+                    raise
+                
+                # 记录分区汇总信息
+                partition_summary[partition_name] = {
+                    "posts_count": posts_count,
+                    "llm_responses_count": llm_responses_count,
+                    "output_folder": config['output_folder']
+                }
+        
+        total_posts = all_posts_writer.count
+        total_llm_responses = all_llm_writer.count
+        
+        # 保存合并的所有数据
+        if total_posts:
+            print(f"\n{'='*60}")
+            print("保存合并数据")
+            print(f"{'='*60}")
+            for merged_path in (all_posts_path, all_llm_path):
+                with self.metrics.timer('write'):
+                    self.output_format.compress(merged_path)
+                self.metrics.add('bytes_out', merged_path.stat().st_size)
+                print(f"✓ 已保存: {merged_path} ({self.format_file_size(merged_path)})")
+            if columnar_exporter is not None:
+                with self.metrics.timer('shard_stats'):
+                    columnar_exporter.close()
+            if image_deriver is not None:
+                image_deriver.close()
+            if image_store is not None:
+                image_store.close()
+            
+            # 创建总配置文件
+            master_config = {
+                "total_posts": total_posts,
+                "total_llm_responses": total_llm_responses,
+                "partitions": partition_summary,
+                "created_at": datetime.now().isoformat(),
+                "source_directory": str(self.base_data_path),
+                "output_format": self.output_format.describe(),
+                "files": {
+                    "all_posts": all_posts_path.name,
+                    "all_llm_responses": all_llm_path.name
+                }
+            }
+            if columnar_exporter is not None:
+                master_config["files"]["columnar"] = {
+                    "posts": f"{self.columnar_folder}/{ColumnarExporter.POSTS_FILENAME}",
+                    "comments": f"{self.columnar_folder}/{ColumnarExporter.COMMENTS_FILENAME}"
+                }
+            if image_deriver is not None:
+                master_config["files"]["derivatives"] = (
+                    f"{self.derivatives_folder}/{ImageDerivativeBuilder.MANIFEST_FILENAME}"
+                )
+            if image_store is not None:
+                master_config["files"]["image_store"] = f"{self.image_store_folder}/{ImageStore.INDEX_FILENAME}"
+            if deduplicator is not None:
+                deduplicator.write_report(self.base_output_path / PostDeduplicator.REPORT_FILENAME)
+                master_config["files"]["merge_report"] = PostDeduplicator.REPORT_FILENAME
+            
+            master_config_path = self.base_output_path / 'master_config.json'
+            self.save_json_file(master_config, master_config_path)
+            
+            # 创建前端兼容的配置文件
+            frontend_config = {
+                "dataPath": "/data",
+                "lastUpdated": datetime.now().isoformat(),
+                "totalPosts": total_posts,
+                "totalLLMResponses": total_llm_responses,
+                "format": self.output_format.name,
+                "encodings": list(self.output_format.compressions),
+                "availableFiles": [
+                    self.describe_available_file(all_posts_path, "posts"),
+                    self.describe_available_file(all_llm_path, "llm_responses")
+                ]
+            }
+            
+            # 分片输出：前端先加载索引与第一个分片，其余分片按需加载
+            if shard_builder is not None:
+                with self.metrics.timer('shard_stats'):
+                    shard_index = shard_builder.finalize()
+                frontend_config["shards"] = {
+                    "index": f"/data/{self.shard_folder}/{PostShardBuilder.INDEX_FILENAME}",
+                    "count": len(shard_index["shards"]),
+                    "shardSize": self.shard_size,
+                    "encodings": shard_index["encodings"]
+                }
+            
+            # 看板统计：前端统计视图只需加载这一个文件
+            stats_path = self.base_output_path / StatisticsBuilder.STATS_FILENAME
+            with self.metrics.timer('shard_stats'):
+                stats = stats_builder.finalize()
+            self.save_json_file(stats, stats_path)
+            frontend_config["stats"] = f"/data/{StatisticsBuilder.STATS_FILENAME}"
+            
+            frontend_config_path = self.base_output_path / 'config.json'
+            self.save_json_file(frontend_config, frontend_config_path)
+        else:
+            if shard_builder is not None:
+                shard_builder.close_spools()
+            if columnar_exporter is not None:
+                columnar_exporter.abort()
+            # 没有任何帖子时不保留空的合并文件
+            for merged_path in (all_posts_path, all_llm_path):
+                merged_path.unlink()
+                self.output_format.remove_siblings(merged_path)
+        
+        # 打印最终汇总
+        print(f"\n{'='*60}")
+        print("转换完成汇总")
+        print(f"{'='*60}")
+        print(f"总帖子数: {total_posts}")
+        print(f"总LLM响应数: {total_llm_responses}")
+        print(self.pickle_cache.describe())
+        print(f"阶段耗时: {self.metrics.describe()}")
+        print(f"处理的分区:")
+        for partition_name, summary in partition_summary.items():
+            print(f"  - {partition_name}: {summary['posts_count']} 帖子, {summary['llm_responses_count']} LLM响应")
+        print(f"\n所有文件已保存到: {self.base_output_path}")
+        
+        return {
+            "total_posts": total_posts,
+            "total_llm_responses": total_llm_responses,
+            "partitions": partition_summary
+        }
     
-#     # 创建转换器并执行转换
-#     converter = BatchPKLToJSONConverter(input_path, output_path)
-#     converter.convert_all_partitions()
-#     converter.create_copy_instructions()
+    def describe_available_file(self, file_path, file_type):
+        """前端配置 availableFiles 中的一项，附带格式与预压缩副本信息"""
+        url_path = f"/data/{file_path.name}"
+        return {
+            "name": file_path.name,
+            "size": file_path.stat().st_size,
+            "path": url_path,
+            "type": file_type,
+            "format": self.output_format.name,
+            "encodings": self.output_format.encodings_for(file_path, url_path)
+        }
     
-#     print(f"\n✓ 批量转换完成！")
-#     print(f"请查看 {converter.base_output_path}/COPY_INSTRUCTIONS.txt 了解如何复制文件到前端项目")
-#     # 如果没有命令行参数，提供交互式输入
-#     if len(sys.argv) == 1:
-#         interactive_main()
-#     else:
-#         main()
-
-
+    def create_copy_instructions(self):
+        """创建文件复制说明"""
+        instructions = f"""
+# 文件复制说明
 
+## 转换完成的文件结构:
+{self.base_output_path}/
+├── all_posts.json              # 所有帖子合并数据 (前端主要使用)
+├── all_llm_responses.json      # 所有LLM响应合并数据 (原始响应，审核结论已合并到帖子中)  
+├── config.json                 # 前端配置文件
+├── stats.json                  # 看板统计 (审核结论分布、直方图等)
+├── master_config.json          # 主配置文件
+├── merge_report.json           # 跨分区去重报告: 每组重复帖子中保留与移除的记录
+├── shards/                     # 按时间倒序的分片数据 (前端按需加载)
+│   ├── index.json              # 分片索引: 每个分片的起始位置、条数、时间范围
+│   ├── posts-00000.json ...    # 帖子分片 (帖子已合并审核结论，只含前几条评论)
+│   ├── search-00000.json ...   # 分片搜索索引 (二元组倒排列表)
+│   └── comments-00000.json ... # 分片评论 (按 note_id 分组的回复树，详情页按需加载)
+├── columnar/                   # 列式导出 (仅 --columnar，供离线分析，无需复制到前端)
+│   ├── posts.parquet           # 帖子表，每个分区一个 row group
+│   └── comments.parquet        # 评论表 (展开 all_comments)
+├── derivatives/                # 图片衍生版本 (仅 --thumbnails): 网格缩略图与详情尺寸
+│   ├── manifest.json           # 原图修改时间/哈希与衍生文件记录 (增量生成)
+│   └── Part1/{{note_id}}/0.jpg-thumb.webp ... # 衍生文件名为 {{原图文件名}}-thumb.webp 等
+├── blobs/                      # 内容寻址的图片存储 (仅 --image-store): 重复图片只存一份
+│   ├── index.json              # 原图指纹缓存 (SHA-256 与感知哈希)
+│   └── ab/abcdef....jpg ...    # 以内容哈希命名的图片
+├── part1_data/                 # Part1分区数据
+│   ├── part1_posts.json
+│   ├── part1_llm_responses.json
+│   └── config.json
+├── part2_data/                 # Part2分区数据
+│   ├── part2_posts.json
+│   ├── part2_llm_responses.json  
+│   └── config.json
+└── partnormal_data/            # PartNormal分区数据
+    ├── partnormal_posts.json
+    ├── partnormal_llm_responses.json
+    └── config.json
 
+## 复制到前端项目:
 
+1. 创建前端数据目录:
+   mkdir 你的前端项目/public/data
 
+2. 复制主要文件(推荐):
+   copy "{self.base_output_path}/all_posts.json" "你的前端项目/public/data/"
+   copy "{self.base_output_path}/all_llm_responses.json" "你的前端项目/public/data/"
+   copy "{self.base_output_path}/config.json" "你的前端项目/public/data/"
 
+3. 或者复制所有文件:
+   xcopy "{self.base_output_path}" "你的前端项目/public/data/" /E /I
 
+## 前端加载说明:
+- 存在 shards/index.json 时，前端只加载第一个分片，其余分片在翻页时按需加载
+- 否则前端会加载各分区的 posts 与 llm_responses 文件
+- 如果需要分区加载，可以修改前端代码使用各分区的单独文件
+- config.json 包含了文件元信息，帮助前端了解数据结构
+- 使用 --compress gzip 时每个文件旁有 .gz 副本，前端会优先请求 .gz 并在浏览器中解压；
+  .br 副本供支持 brotli_static 的静态服务器直接返回
+- msgpack 格式的数据文件供其他程序使用，前端需要 json 或 minified 格式
+- 使用 --thumbnails 时帖子图片清单带有 variants (thumb/detail) 与 placeholder，
+  需要同时复制 derivatives/ 目录，网格卡片与详情页会优先加载衍生版本
+- 使用 --image-store 时帖子图片清单指向 blobs/ 中的共享图片，需要同时复制 blobs/ 目录；
+  文件名即内容哈希，静态服务器可为 /data/blobs/ 设置长期缓存 (immutable)
+"""
+        
+        instructions_path = self.base_output_path / 'COPY_INSTRUCTIONS.txt'
+        with open(instructions_path, 'w', encoding='utf-8') as f:
+            f.write(instructions)
+        
+        print(f"✓ 已创建复制说明文件: {instructions_path}")
 
 # llm_response_converter.py
 # 专用于LLM响应PKL文件转JSON转换脚本 - 每个PKL文件转换为单独的JSON文件
-# 使用方法: python llm_response_converter.py
 
-import pickle
-import json
-import os
-import glob
-import argparse
-from datetime import datetime
-import sys
-from pathlib import Path
-import traceback
+# 工作进程内的转换器实例（由 _init_conversion_worker 创建）
+_worker_converter = None
+
+def _init_conversion_worker(llm_response_path, output_dir, converter_options):
+    """进程池初始化：每个工作进程创建一个转换器（构造时的目录信息主进程已打印过）"""
+    global _worker_converter
+    with redirect_stdout(io.StringIO()):
+        _worker_converter = LLMResponseConverter(llm_response_path, output_dir, **converter_options)
+
+def _convert_in_worker(pkl_file):
+    """
+    在工作进程中转换单个PKL文件，同时返回该文件的计时与计数，以及转换过程的打印输出
+    
+    打印输出（错误信息以及按输出级别的逐文件信息）由主进程按文件顺序输出，各进程的输出不会交错
+    """
+    _worker_converter.metrics.reset()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            result = _worker_converter.convert_and_record(pkl_file)
+        except Exception as e:
+            result = (False, f"工作进程异常: {e}", None)
+            print(f"✗ {Path(pkl_file).name} {result[1]}")
+    return result + (_worker_converter.metrics.snapshot(), output.getvalue())
+
+# clean_string: 需要还原的转义序列
+_ESCAPE_REPLACEMENTS = {
+    '\\t': '\t',
+    '\\r': '\r',
+    # 保留 \\n 为原样，不转换为实际换行符
+}
+
+# 一次扫描同时匹配转义序列与需要移除的控制字符（保留换行和制表符）
+_CLEAN_STRING_PATTERN = re.compile(r'\\[tr]|[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]')
+
+def _replace_dirty_match(match):
+    """转义序列替换为对应字符，控制字符直接移除"""
+    return _ESCAPE_REPLACEMENTS.get(match.group(), '')
+
+# process_data_recursively 中可直接原样返回的基本类型
+_PASSTHROUGH_TYPES = (int, float, bool)
+
+class _PrecomputedValue:
+    """process_data_recursively 内部使用：已经确定结果、无需再处理的值"""
+    __slots__ = ('value',)
+    
+    def __init__(self, value):
+        self.value = value
+
+class ConversionMetrics:
+    """
+    转换过程的分阶段计时与计数，可在线程间共享，工作进程的结果通过 merge 合并
+    
+    阶段: load (读取并解码PKL), clean (清理数据), encode (编码), write (写入临时文件并替换；
+    串行模式下编码与写入在同一步完成，整体计入 write), validate (--paranoid 时写入后校验)
+    """
+    
+    STAGES = ('load', 'clean', 'encode', 'write', 'validate')
+    COUNTERS = ('bytes_in', 'bytes_out', 'strings_cleaned', 'fallback_decoded_values', 'fallback_decoded_bytes')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        self.stage_seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.stage_calls = dict.fromkeys(self.STAGES, 0)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+    
+    def add_time(self, stage, seconds):
+        with self.lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_calls[stage] += 1
+    
+    def add(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+    
+    def timer(self, stage):
+        """计时上下文: with metrics.timer('load'): ..."""
+        return _StageTimer(self, stage)
+    
+    def snapshot(self):
+        with self.lock:
+            return {
+                'stage_seconds': dict(self.stage_seconds),
+                'stage_calls': dict(self.stage_calls),
+                'counters': dict(self.counters)
+            }
+    
+    def merge(self, snapshot):
+        """合并其他进程的 snapshot"""
+        with self.lock:
+            for stage, seconds in snapshot['stage_seconds'].items():
+                self.stage_seconds[stage] += seconds
+                self.stage_calls[stage] += snapshot['stage_calls'][stage]
+            for counter, amount in snapshot['counters'].items():
+                self.counters[counter] += amount
+    
+    def describe(self):
+        """一行阶段耗时汇总"""
+        return ', '.join(f"{stage} {self.stage_seconds[stage]:.2f}s" for stage in self.STAGES)
+
+class BatchConversionMetrics(ConversionMetrics):
+    """
+    分区批量转换的分阶段计时与计数
+    
+    阶段: load (读取并解码分区PKL与LLM响应，以及复用分区时读回的输出), dedup (跨分区去重的登记与合并),
+    convert (帖子转换、数值字段规整与审核结论),
+    shard_stats (分片、统计与列式导出的累计及最终生成), write (编码并写入分区文件、合并文件与配置文件，以及预压缩)
+    计数: bytes_in 为读取的PKL字节数，bytes_out 为分区与合并输出文件的字节数
+    """
+    
+    STAGES = ('load', 'dedup', 'convert', 'shard_stats', 'write')
+    COUNTERS = ('bytes_in', 'bytes_out', 'posts')
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+    
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.metrics.add_time(self.stage, time.perf_counter() - self.start)
+        return False
 
 class LLMResponseConverter:
-    def __init__(self, llm_response_path, output_dir):
+    # 增量转换清单文件名（保存在输出目录中）
+    MANIFEST_FILENAME = 'conversion_manifest.json'
+    MANIFEST_VERSION = 1
+    # 流水线转换中每个阶段队列的最大长度（限制同时驻留内存的文件数）
+    PIPELINE_QUEUE_SIZE = 4
+    # 输出级别: quiet 只输出汇总与错误, info 另外输出逐文件进度, verbose 另外输出逐文件的详细过程
+    LOG_LEVELS = ('quiet', 'info', 'verbose')
+    
+    def __init__(self, llm_response_path, output_dir, paranoid=False, output_format=None, pickle_cache=None,
+                 log_level='info'):
         """
         初始化LLM响应转换器
         
         Args:
             llm_response_path: LLMResponse文件夹路径
             output_dir: 输出JSON文件夹路径
+            paranoid: 是否在写入后重新读取文件，校验哈希与记录数并完整解析JSON进行验证
+            output_format: 输出格式 (OutputFormat)，默认 indent=2 的JSON
+            pickle_cache: PKL加载缓存，默认使用共享的 PICKLE_CACHE
+            log_level: 输出级别，见 LOG_LEVELS
         """
+        if log_level not in self.LOG_LEVELS:
+            raise ValueError(f"不支持的输出级别: {log_level}")
         self.llm_response_path = Path(llm_response_path)
         self.output_dir = Path(output_dir)
+        self.paranoid = paranoid
+        self.output_format = output_format or OutputFormat()
+        self.pickle_cache = pickle_cache or PICKLE_CACHE
+        self.log_level = log_level
+        self.verbose = log_level == 'verbose'
+        self.metrics = ConversionMetrics()
+        
+        # 最近写入的JSON文件摘要 {文件名: (字节数, SHA-256)}，供转换清单复用
+        self.output_digests = {}
+        # 最近解码的PKL文件摘要 {文件名: (读取前的 stat, 所解码字节的 SHA-256)}，供转换清单复用
+        self.source_digests = {}
         
         # 确保输出目录存在
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -553,46 +3068,43 @@ class LLMResponseConverter:
         print(f"LLM响应目录: {self.llm_response_path}")
         print(f"输出目录: {self.output_dir}")
     
-    def load_pkl_file_safely(self, file_path):
-        """安全加载PKL文件，支持多种编码和错误处理"""
-        print(f"  正在加载: {file_path.name}")
-        
-        loading_strategies = [
-            # 策略1: 标准加载
-            {'method': 'standard', 'kwargs': {}},
-            # 策略2: 指定编码
-            {'method': 'encoding', 'kwargs': {'encoding': 'bytes'}},
-            {'method': 'encoding', 'kwargs': {'encoding': 'latin-1'}},
-            {'method': 'encoding', 'kwargs': {'encoding': 'utf-8'}},
-            # 策略3: 修复损坏的pickle
-            {'method': 'fix_imports', 'kwargs': {'fix_imports': True}},
-        ]
+    def log(self, message, level='verbose'):
+        """按输出级别打印"""
+        if self.LOG_LEVELS.index(level) <= self.LOG_LEVELS.index(self.log_level):
+            print(message)
+    
+    def read_source(self, file_path):
+        """读取PKL文件内容，返回 (内容, 读取前的 stat)；较大的文件使用只读 mmap"""
+        with open(file_path, 'rb') as f:
+            source_stat = os.fstat(f.fileno())
+            return self.pickle_cache.read_buffer(f, source_stat.st_size), source_stat
+    
+    def load_pkl_file_safely(self, file_path, buffer=None, source_stat=None):
+        """
+        安全加载PKL文件，支持多种编码和错误处理 (经共享的PKL加载器，文件只读取一次)
         
-        for i, strategy in enumerate(loading_strategies):
-            try:
-                with open(file_path, 'rb') as f:
-                    if strategy['method'] == 'standard':
-                        data = pickle.load(f)
-                    else:
-                        data = pickle.load(f, **strategy['kwargs'])
-                    
-                    print(f"    ✓ 策略{i+1}成功: {strategy['method']}")
-                    
-                    # 验证数据不为空
-                    if data is not None:
-                        # 检查数据结构
-                        data_info = self.analyze_data_structure(data)
-                        print(f"    数据结构: {data_info}")
-                        return data, None
-                    else:
-                        print(f"    ⚠ 数据为空")
-                        continue
-                        
-            except Exception as e:
-                print(f"    ✗ 策略{i+1}失败: {str(e)[:100]}")
-                continue
+        转换清单中的源文件大小、修改时间与哈希取自实际解码的内容及读取前的 stat，不再重新读取文件
+        """
+        self.log(f"  正在加载: {file_path.name}")
+        
+        try:
+            with self.metrics.timer('load'):
+                if buffer is None:
+                    buffer, source_stat = self.read_source(file_path)
+                self.metrics.add('bytes_in', len(buffer))
+                if source_stat is not None:
+                    self.source_digests[file_path.name] = (source_stat, hashlib.sha256(buffer).hexdigest())
+                data, error = self.pickle_cache.load(file_path, verbose=self.verbose, buffer=buffer)
+        except Exception as e:
+            return None, f"读取失败: {e}"
+        if data is None:
+            self.source_digests.pop(file_path.name, None)
+            return None, error
         
-        return None, f"所有加载策略都失败"
+        # 检查数据结构
+        if self.verbose:
+            self.log(f"    数据结构: {self.analyze_data_structure(data)}")
+        return data, None
     
     def analyze_data_structure(self, data):
         """分析数据结构"""
@@ -612,51 +3124,156 @@ class LLMResponseConverter:
             return f"{type(data).__name__}"
     
     def process_data_recursively(self, data, depth=0, max_depth=50):
-        """递归处理数据，确保所有内容都被正确转换，防止无限递归"""
-        # 防止无限递归
-        if depth > max_depth:
-            return f"<递归深度超限: {type(data).__name__}>"
+        """
+        处理数据，确保所有内容都被正确转换，防止无限递归
         
-        if isinstance(data, dict):
-            result = {}
-            for key, value in data.items():
-                # 确保key是字符串
-                try:
-                    str_key = str(key) if not isinstance(key, str) else key
-                    # 处理特殊字符的key
-                    str_key = self.clean_string(str_key)
-                    result[str_key] = self.process_data_recursively(value, depth + 1, max_depth)
-                except Exception as e:
-                    result[f"<错误的key_{depth}>"] = f"<key处理错误: {e}>"
+        使用显式栈遍历，不受Python递归深度限制；同一对象（按 id）只转换一次；
+        子树无需清理时直接返回原对象（元组原样保留，JSON中同样输出为数组）
+        """
+        # 已处理对象: id -> (结果, 子树高度)，仅在 深度 + 子树高度 <= max_depth 时复用
+        memo = {}
+        
+        result, height, expanded = self._process_node(data, depth, max_depth, memo)
+        if not expanded:
             return result
+        
+        # 栈帧: [原容器, 深度, 清理后的key列表(dict)或None, 子项列表, 下一个子项下标, 子项结果列表, 子树高度]
+        # 入栈的容器都非空，子树高度至少为1
+        # 子项结果列表在第一次出现改动时才创建，未改动的子树不产生任何新对象
+        stack = [self._new_container_frame(data, depth)]
+        child_result = child_height = None
+        
+        while stack:
+            frame = stack[-1]
+            values = frame[3]
+            index = frame[4]
+            child_depth = frame[1] + 1
             
-        elif isinstance(data, list):
-            try:
-                return [self.process_data_recursively(item, depth + 1, max_depth) for item in data]
-            except Exception as e:
-                return f"<列表处理错误: {e}>"
+            if child_height is not None:
+                # 刚完成的子容器结果，记录到当前帧
+                self._record_child(frame, index, child_result, child_height)
+                index += 1
+                child_result = child_height = None
+            
+            pushed = False
+            while index < len(values):
+                value = values[index]
+                
+                # 常见叶子节点的内联快速路径
+                if child_depth <= max_depth and (
+                    value is None
+                    or type(value) in _PASSTHROUGH_TYPES
+                    or (type(value) is str and '\\' not in value and value.isprintable())
+                ):
+                    if frame[5] is not None:
+                        frame[5].append(value)
+                    index += 1
+                    continue
+                
+                result, height, expanded = self._process_node(value, child_depth, max_depth, memo)
+                if expanded:
+                    frame[4] = index
+                    stack.append(self._new_container_frame(value, child_depth))
+                    pushed = True
+                    break
+                
+                self._record_child(frame, index, result, height)
+                index += 1
+            
+            if pushed:
+                continue
             
-        elif isinstance(data, tuple):
+            # 所有子项处理完毕，组装当前容器
+            stack.pop()
+            container = frame[0]
+            child_result = self._build_container(container, frame[2], frame[5])
+            child_height = frame[6]
+            memo[id(container)] = (child_result, child_height)
+        
+        return child_result
+    
+    def _record_child(self, frame, index, result, height):
+        """记录子项处理结果，第一次出现改动时才复制已处理的前缀"""
+        if frame[5] is None and result is not frame[3][index]:
+            frame[5] = list(frame[3][:index])
+        if frame[5] is not None:
+            frame[5].append(result)
+        if height + 1 > frame[6]:
+            frame[6] = height + 1
+    
+    def _new_container_frame(self, container, depth):
+        """为 dict/list/tuple 创建遍历栈帧，dict 的 key 在此时清理"""
+        if not isinstance(container, dict):
+            return [container, depth, None, container, 0, None, 1]
+        
+        keys = []
+        values = []
+        keys_changed = False
+        for key, value in container.items():
+            # 确保key是字符串
             try:
-                return [self.process_data_recursively(item, depth + 1, max_depth) for item in data]
+                str_key = str(key) if not isinstance(key, str) else key
+                # 处理特殊字符的key
+                str_key = self.clean_string(str_key)
             except Exception as e:
-                return f"<元组处理错误: {e}>"
-            
+                str_key = f"<错误的key_{depth}>"
+                value = _PrecomputedValue(f"<key处理错误: {e}>")
+            keys_changed = keys_changed or str_key is not key
+            keys.append(str_key)
+            values.append(value)
+        
+        # key 有改动时从一开始就收集结果
+        results = [] if keys_changed else None
+        return [container, depth, keys, values, 0, results, 1]
+    
+    def _build_container(self, container, keys, results):
+        """根据子项结果组装容器，没有任何改动时返回原对象"""
+        if results is None:
+            return container
+        if keys is not None:
+            return dict(zip(keys, results))
+        return results
+    
+    def _process_node(self, data, depth, max_depth, memo):
+        """
+        处理单个节点
+        
+        Returns:
+            (结果, 子树高度, 是否需要展开) —— 需要展开的容器由调用方入栈遍历
+        """
+        # 防止无限递归；被截断的子树高度记为超限，保证其结果不会被复用
+        if depth > max_depth:
+            return f"<递归深度超限: {type(data).__name__}>", max_depth + 1, False
+        
+        # 基本类型无需处理
+        if data is None or isinstance(data, (int, float, bool)):
+            return data, 0, False
+        
+        if type(data) is _PrecomputedValue:
+            return data.value, 0, False
+        
+        cached = memo.get(id(data))
+        if cached is not None and depth + cached[1] <= max_depth:
+            return cached[0], cached[1], False
+        
+        if isinstance(data, (dict, list, tuple)):
+            if not data:
+                return data, 0, False
+            return None, 0, True
+        
+        if isinstance(data, str):
+            result = self.clean_string(data)
         elif isinstance(data, bytes):
-            return self.decode_bytes_safely(data)
-                    
-        elif isinstance(data, str):
-            return self.clean_string(data)
-            
-        elif isinstance(data, (int, float, bool)) or data is None:
-            return data
-            
+            result = self.decode_bytes_safely(data)
         else:
             # 对于其他类型，尝试转换为字符串
             try:
-                return self.clean_string(str(data))
+                result = self.clean_string(str(data))
             except Exception as e:
-                return f"<无法转换的对象: {type(data).__name__}, 错误: {e}>"
+                result = f"<无法转换的对象: {type(data).__name__}, 错误: {e}>"
+        
+        memo[id(data)] = (result, 0)
+        return result, 0, False
     
     def decode_bytes_safely(self, data):
         """安全解码bytes数据"""
@@ -665,11 +3282,16 @@ class LLMResponseConverter:
         for encoding in encodings:
             try:
                 decoded = data.decode(encoding)
+                if encoding != 'utf-8':
+                    self.metrics.add('fallback_decoded_values')
+                    self.metrics.add('fallback_decoded_bytes', len(data))
                 return self.clean_string(decoded)
             except (UnicodeDecodeError, LookupError):
                 continue
         
         # 如果所有编码都失败，使用错误处理
+        self.metrics.add('fallback_decoded_values')
+        self.metrics.add('fallback_decoded_bytes', len(data))
         try:
             return data.decode('utf-8', errors='replace')
         except Exception:
@@ -680,28 +3302,13 @@ class LLMResponseConverter:
         if not isinstance(text, str):
             text = str(text)
         
-        try:
-            # 保留原始的换行符，不要转换为\\n
-            # 但是要处理其他转义字符
-            
-            # 先处理一些常见的转义序列
-            replacements = {
-                '\\t': '\t',
-                '\\r': '\r',
-                # 保留 \\n 为实际换行符
-                # '\\n': '\n',  # 这个可能是问题所在
-            }
-            
-            for old, new in replacements.items():
-                text = text.replace(old, new)
-            
-            # 移除一些控制字符，但保留换行和制表符
-            import re
-            # 移除不可打印字符，但保留常用的空白字符
-            text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
-            
+        # 快速路径：没有反斜杠且全部可打印（不含任何控制字符）时无需处理
+        if '\\' not in text and text.isprintable():
             return text
-            
+        
+        self.metrics.add('strings_cleaned')
+        try:
+            return _CLEAN_STRING_PATTERN.sub(_replace_dirty_match, text)
         except Exception as e:
             print(f"字符串清理错误: {e}")
             return str(text)
@@ -720,96 +3327,143 @@ class LLMResponseConverter:
     
     def convert_single_pkl_file(self, pkl_file):
         """转换单个PKL文件为JSON"""
-        print(f"\n{'='*80}")
-        print(f"处理文件: {pkl_file.name}")
-        print(f"{'='*80}")
+        processed_data, error = self.prepare_pkl_file(pkl_file)
+        if error is not None:
+            return False, error
+        
+        # 保存为JSON文件
+        json_file_path = self.json_path_for(pkl_file)
+        success, save_error = self.save_single_json_file(processed_data, json_file_path)
+        return self.report_saved_file(pkl_file, json_file_path, success, save_error)
+    
+    def report_saved_file(self, pkl_file, json_file_path, success, save_error):
+        """输出单个文件的保存结果"""
+        if success:
+            self.log(f"✓ 成功转换: {pkl_file.name} -> {json_file_path.name}")
+            return True, None
+        else:
+            print(f"✗ 保存失败 {pkl_file.name}: {save_error}")
+            return False, save_error
+    
+    def prepare_pkl_file(self, pkl_file, buffer=None, source_stat=None):
+        """
+        加载并清理单个PKL文件
+        
+        Args:
+            pkl_file: PKL文件路径
+            buffer: 已预先读取的文件内容，为 None 时读取文件
+            source_stat: 读取 buffer 之前的文件 stat
         
-        # 生成对应的JSON文件路径
-        json_filename = pkl_file.stem + '.json'  # 将.pkl替换为.json
-        json_file_path = self.output_dir / json_filename
+        Returns:
+            (清理后的数据, 错误信息)，成功时错误信息为 None
+        """
+        self.log(f"\n{'='*80}")
+        self.log(f"处理文件: {pkl_file.name}")
+        self.log(f"{'='*80}")
         
         # 加载PKL文件
-        data, error = self.load_pkl_file_safely(pkl_file)
+        data, error = self.load_pkl_file_safely(pkl_file, buffer, source_stat)
         
         if data is None:
-            print(f"✗ 加载失败: {error}")
-            return False, error
+            print(f"✗ 加载失败 {pkl_file.name}: {error}")
+            return None, error
         
         # 在处理前检查原始数据
-        original_info = self.get_detailed_data_info(data)
-        print(f"原始数据: {original_info}")
+        if self.verbose:
+            self.log(f"原始数据: {self.get_detailed_data_info(data)}")
         
         # 递归处理数据，确保完整性
         try:
-            processed_data = self.process_data_recursively(data)
+            with self.metrics.timer('clean'):
+                processed_data = self.process_data_recursively(data)
             
             # 检查处理后的数据
-            processed_info = self.get_detailed_data_info(processed_data)
-            print(f"处理后: {processed_info}")
+            if self.verbose:
+                self.log(f"处理后: {self.get_detailed_data_info(processed_data)}")
             
         except Exception as e:
             error_msg = f"数据处理失败: {e}"
-            print(f"✗ {error_msg}")
-            return False, error_msg
+            print(f"✗ {pkl_file.name} {error_msg}")
+            return None, error_msg
         
-        # 保存为JSON文件
-        success, save_error = self.save_single_json_file(processed_data, json_file_path)
+        return processed_data, None
+    
+    def json_path_for(self, pkl_file):
+        """PKL文件对应的输出路径（后缀取决于输出格式）"""
+        return self.output_dir / (Path(pkl_file).stem + self.output_format.suffix)
+    
+    def convert_and_record(self, pkl_file):
+        """转换单个PKL文件，成功时同时返回其清单记录"""
+        success, error = self.convert_single_pkl_file(pkl_file)
+        return self.record_conversion(pkl_file, success, error)
+    
+    def record_conversion(self, pkl_file, success, error):
+        """转换结果 (success, error, manifest_entry)，成功时生成清单记录"""
+        if not success:
+            return False, error, None
         
-        if success:
-            print(f"✓ 成功转换: {pkl_file.name} -> {json_filename}")
-            return True, None
-        else:
-            print(f"✗ 保存失败: {save_error}")
-            return False, save_error
+        try:
+            entry = self.build_manifest_entry(pkl_file)
+        except OSError as e:
+            # 清单记录失败不影响本次转换结果，下次运行会重新转换
+            print(f"⚠ 生成清单记录失败: {e}")
+            entry = None
+        return True, None, entry
     
-    def save_single_json_file(self, data, json_file_path):
-        """保存单个JSON文件并验证数据完整性"""
+    def save_single_json_file(self, data, json_file_path, encoded=None):
+        """
+        保存单个JSON文件并验证数据完整性
+        
+        Args:
+            data: 清理后的数据
+            json_file_path: 输出路径
+            encoded: 已由 output_format.encode 编码的内容，为 None 时在此编码写入
+        """
         try:
-            print("开始JSON序列化...")
-            
-            # 使用更安全的JSON序列化参数
-            json_str = json.dumps(
-                data, 
-                ensure_ascii=False,  # 允许非ASCII字符
-                indent=2,
-                separators=(',', ': '),
-                sort_keys=False,
-                default=str  # 对于无法序列化的对象，转换为字符串
-            )
-            
-            print(f"JSON序列化完成，长度: {len(json_str)} 字符")
-            
-            # 保存到临时文件先测试
-            temp_path = json_file_path.with_suffix('.tmp')
-            
-            print("保存到临时文件...")
-            with open(temp_path, 'w', encoding='utf-8', newline='') as f:
-                f.write(json_str)
+            # 输出格式自身先写临时文件再原子替换，读取方不会读到一半的内容
+            write_start = time.perf_counter()
+            if encoded is None:
+                # 序列化并写入，写入时同步计算哈希
+                written_size, written_sha256 = self.output_format.write(data, json_file_path)
+            else:
+                written_size, written_sha256 = self.output_format.write_bytes(encoded, json_file_path)
+            write_seconds = time.perf_counter() - write_start
+            self.log(f"文件大小: {self.format_file_size(written_size)}")
             
-            temp_size = temp_path.stat().st_size
-            print(f"临时文件大小: {self.format_file_size(temp_size)}")
+            # 大小与哈希在写入时由内存中的字节计算，默认不再读回文件；
+            # paranoid 模式下重新读取写入的文件，对比磁盘内容哈希与顶层记录数并完整解析
+            verified, verify_error = True, None
+            if self.paranoid:
+                with self.metrics.timer('validate'):
+                    # （顶层记录数按 indent=2 的缩进统计，其他格式只校验大小与哈希）
+                    expected_records = count_top_level_records(data) if self.output_format.name == 'json' else None
+                    verified, verify_error = self.verify_written_file(
+                        json_file_path, written_size, written_sha256, expected_records
+                    )
+                    if verified:
+                        self.log("验证写入的文件 (完整解析)...")
+                        loaded_data = self.output_format.load(json_file_path)
+                        self.detailed_validation(data, loaded_data)
+            if not verified:
+                # 校验失败的输出不保留，下次运行重新转换
+                json_file_path.unlink()
+                self.output_format.remove_siblings(json_file_path)
+                self.metrics.add_time('write', write_seconds)
+                print(f"✗ {json_file_path.name} {verify_error}")
+                return False, verify_error
             
-            # 验证临时文件能否正确读取
-            print("验证临时文件...")
-            with open(temp_path, 'r', encoding='utf-8') as f:
-                loaded_data = json.load(f)
+            compress_start = time.perf_counter()
+            self.output_format.compress(json_file_path)
+            self.metrics.add_time('write', write_seconds + time.perf_counter() - compress_start)
+            self.output_digests[json_file_path.name] = (written_size, written_sha256)
+            self.metrics.add('bytes_out', written_size)
             
-            # 进行详细验证
-            validation_result = self.detailed_validation(data, loaded_data)
+            self.log(f"✓ JSON文件保存成功: {json_file_path.name}")
+            self.log(f"✓ 文件大小: {self.format_file_size(written_size)}")
             
-            # 如果验证通过，将临时文件重命名为最终文件
-            if temp_path.exists():
-                if json_file_path.exists():
-                    json_file_path.unlink()  # 删除旧文件
-                temp_path.rename(json_file_path)
-                
-                final_size = json_file_path.stat().st_size
-                print(f"✓ JSON文件保存成功: {json_file_path.name}")
-                print(f"✓ 文件大小: {self.format_file_size(final_size)}")
-                
-                return True, None
+            return True, None
             
-        except json.JSONEncodeError as e:
+        except (TypeError, ValueError, OverflowError) as e:
             error_msg = f"JSON编码错误: {e}"
             print(f"✗ {error_msg}")
             return False, error_msg
@@ -820,9 +3474,23 @@ class LLMResponseConverter:
             traceback.print_exc()
             return False, error_msg
     
+    def verify_written_file(self, file_path, expected_size, expected_sha256, expected_records):
+        """校验写入的文件：字节数、SHA-256 与顶层记录数"""
+        size, sha256, records = scan_json_file(file_path)
+        
+        if size != expected_size:
+            return False, f"文件大小不一致: 写入{expected_size}字节, 磁盘{size}字节"
+        if sha256 != expected_sha256:
+            return False, "文件哈希不一致: 磁盘内容与写入内容不同"
+        if expected_records is not None and records != expected_records:
+            return False, f"顶层记录数不一致: 原始{expected_records}条, 文件{records}条"
+        
+        self.log(f"哈希验证通过, 顶层记录数: {records if expected_records is not None else '-'}")
+        return True, None
+    
     def detailed_validation(self, original_data, loaded_data):
         """详细验证数据完整性"""
-        print("进行详细数据验证...")
+        self.log("进行详细数据验证...")
         
         if isinstance(original_data, dict) and isinstance(loaded_data, dict):
             # 检查键的完整性
@@ -832,13 +3500,13 @@ class LLMResponseConverter:
             missing_keys = original_keys - loaded_keys
             extra_keys = loaded_keys - original_keys
             
-            print(f"键验证: 原始{len(original_keys)}个, 加载{len(loaded_keys)}个")
+            self.log(f"键验证: 原始{len(original_keys)}个, 加载{len(loaded_keys)}个")
             
             if missing_keys:
-                print(f"⚠ 丢失的键: {list(missing_keys)[:5]}...")  # 只显示前5个
+                self.log(f"⚠ 丢失的键: {list(missing_keys)[:5]}...")  # 只显示前5个
             
             if extra_keys:
-                print(f"⚠ 额外的键: {list(extra_keys)[:5]}...")
+                self.log(f"⚠ 额外的键: {list(extra_keys)[:5]}...")
             
             # 检查一些示例数据的完整性
             sample_keys = list(original_keys)[:3]  # 检查前3个键
@@ -850,15 +3518,15 @@ class LLMResponseConverter:
                     if isinstance(orig_value, dict) and isinstance(loaded_value, dict):
                         orig_len = sum(len(str(v)) for v in orig_value.values() if isinstance(v, (str, list)))
                         loaded_len = sum(len(str(v)) for v in loaded_value.values() if isinstance(v, (str, list)))
-                        print(f"键 '{key}' 内容长度: 原始{orig_len} vs 加载{loaded_len}")
+                        self.log(f"键 '{key}' 内容长度: 原始{orig_len} vs 加载{loaded_len}")
                         
         elif isinstance(original_data, list) and isinstance(loaded_data, list):
-            print(f"列表验证: 原始{len(original_data)}项, 加载{len(loaded_data)}项")
+            self.log(f"列表验证: 原始{len(original_data)}项, 加载{len(loaded_data)}项")
             
         elif isinstance(original_data, str) and isinstance(loaded_data, str):
-            print(f"字符串验证: 原始{len(original_data)}字符, 加载{len(loaded_data)}字符")
+            self.log(f"字符串验证: 原始{len(original_data)}字符, 加载{len(loaded_data)}字符")
             
-        print("验证完成")
+        self.log("验证完成")
         return True
     
     def get_detailed_data_info(self, data):
@@ -888,47 +3556,384 @@ class LLMResponseConverter:
         except Exception as e:
             return f"获取信息失败: {e}"
     
-    def convert_all_llm_responses(self):
-        """转换所有LLM响应文件"""
+    def convert_all_llm_responses(self, workers=1, incremental=True, io_threads=0, changed_files=None, report=True):
+        """
+        转换所有LLM响应文件
+        
+        Args:
+            workers: 并行工作进程数，1 表示在当前进程中逐个转换
+            incremental: 是否根据转换清单跳过未变化的文件
+            io_threads: 单进程时流水线转换的读取/写入线程数，0 表示逐个文件依次转换
+            changed_files: 监视模式下已知发生变化的文件路径，给出时清单中的其他文件不再逐个检查
+            report: 是否输出完整统计并保存转换报告与性能指标（监视模式每轮只输出一行汇总）
+        """
         print("开始批量转换LLM响应文件...")
+        start_time = time.perf_counter()
+        self.metrics.reset()
         
         # 获取所有pkl文件
         pkl_files = self.get_all_llm_files()
+        manifest = self.load_manifest() if incremental else {}
         if not pkl_files:
             print("✗ 没有找到PKL文件")
+            # 源文件已全部删除时，同样移除过期输出并保存空清单
+            self.remove_stale_outputs(manifest, pkl_files)
+            self.save_manifest({})
             return None
         
+        
+        # 清理源PKL已不存在的JSON文件
+        removed_files = self.remove_stale_outputs(manifest, pkl_files)
+        
+        # 跳过未变化的文件
+        changed_names = None if changed_files is None else {Path(path).name for path in changed_files}
+        pending_files = []
+        skipped_files = []
+        for pkl_file in pkl_files:
+            if changed_names is not None and pkl_file.name in manifest and pkl_file.name not in changed_names:
+                skipped_files.append(pkl_file.name)
+            elif self.is_unchanged(pkl_file, manifest.get(pkl_file.name)):
+                skipped_files.append(pkl_file.name)
+            else:
+                pending_files.append(pkl_file)
+        
+        if incremental:
+            print(f"增量转换: 跳过 {len(skipped_files)} 个未变化文件, "
+                  f"待转换 {len(pending_files)} 个, 移除 {len(removed_files)} 个过期文件")
+        
         # 转换统计
-        total_files = len(pkl_files)
+        total_files = len(pending_files)
         successful_conversions = []
         failed_conversions = []
         
-        # 逐个转换文件
-        for i, pkl_file in enumerate(pkl_files, 1):
-            print(f"\n进度: {i}/{total_files}")
-            
-            success, error = self.convert_single_pkl_file(pkl_file)
-            
+        for pkl_file, (success, error, entry) in zip(pending_files, self.iter_conversions(pending_files, workers, io_threads)):
             if success:
                 successful_conversions.append(pkl_file.name)
+                if entry is not None:
+                    manifest[pkl_file.name] = entry
+                else:
+                    manifest.pop(pkl_file.name, None)
             else:
                 failed_conversions.append((pkl_file.name, error))
+                manifest.pop(pkl_file.name, None)
         
-        # 显示最终统计
-        self.print_final_statistics(total_files, successful_conversions, failed_conversions)
+        self.save_manifest(manifest)
+        wall_seconds = time.perf_counter() - start_time
         
-        # 创建转换报告
-        self.create_conversion_report(total_files, successful_conversions, failed_conversions)
+        if report:
+            # 显示最终统计
+            self.print_final_statistics(total_files, successful_conversions, failed_conversions,
+                                        skipped_files, removed_files)
+            
+            # 创建转换报告，并在同一目录保存结构化的性能指标
+            report_path = self.create_conversion_report(total_files, successful_conversions, failed_conversions,
+                                                        skipped_files, removed_files)
+            self.save_metrics(report_path, wall_seconds, {
+                'total': total_files,
+                'successful': len(successful_conversions),
+                'failed': len(failed_conversions),
+                'skipped': len(skipped_files),
+                'removed': len(removed_files)
+            }, workers, io_threads)
+        else:
+            print(f"LLM响应: 转换 {len(successful_conversions)} 个, 失败 {len(failed_conversions)} 个, "
+                  f"移除 {len(removed_files)} 个, 未变化 {len(skipped_files)} 个 ({wall_seconds:.2f}s)")
+            for name, error in failed_conversions:
+                print(f"  ✗ {name}: {error}")
         
         return {
             'total': total_files,
             'successful': len(successful_conversions),
             'failed': len(failed_conversions),
+            'skipped': len(skipped_files),
+            'removed': len(removed_files),
             'successful_files': successful_conversions,
-            'failed_files': failed_conversions
+            'failed_files': failed_conversions,
+            'skipped_files': skipped_files,
+            'removed_files': removed_files
+        }
+    
+    def load_manifest(self):
+        """加载输出目录中的转换清单，返回 {pkl文件名: 记录}"""
+        manifest_path = self.output_dir / self.MANIFEST_FILENAME
+        if not manifest_path.exists():
+            return {}
+        
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠ 转换清单读取失败，将全量转换: {e}")
+            return {}
+        
+        if manifest.get('version') != self.MANIFEST_VERSION:
+            print("⚠ 转换清单版本不匹配，将全量转换")
+            return {}
+        
+        files = manifest.get('files', {})
+        if manifest.get('output_format', OutputFormat().describe()) != self.output_format.describe():
+            # 输出格式变化：删除旧格式的输出，全部重新转换
+            print("⚠ 输出格式已变化，将全量转换")
+            for entry in files.values():
+                output_path = self.output_dir / entry.get('output', '')
+                if entry.get('output') and output_path.exists():
+                    output_path.unlink()
+                self.output_format.remove_siblings(output_path)
+            return {}
+        
+        return files
+    
+    def save_manifest(self, files):
+        """原子地保存转换清单"""
+        manifest_path = self.output_dir / self.MANIFEST_FILENAME
+        temp_path = manifest_path.with_suffix('.tmp')
+        manifest = {
+            'version': self.MANIFEST_VERSION,
+            'updated_at': datetime.now().isoformat(),
+            'source_directory': str(self.llm_response_path),
+            'output_format': self.output_format.describe(),
+            'files': dict(sorted(files.items()))
+        }
+        
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, manifest_path)
+    
+    def build_manifest_entry(self, pkl_file):
+        """记录源PKL的大小、修改时间、内容哈希以及输出JSON的哈希"""
+        json_file_path = self.json_path_for(pkl_file)
+        
+        # 源文件记录取自加载时读取前的 stat 与所解码字节的哈希，转换期间文件被改写时下次运行会重新转换
+        source = self.source_digests.pop(pkl_file.name, None)
+        if source is not None:
+            source_stat, source_sha256 = source
+        else:
+            source_stat, source_sha256 = pkl_file.stat(), file_sha256(pkl_file)
+        
+        # 优先使用写入时计算的摘要，避免再次读取输出文件
+        digest = self.output_digests.pop(json_file_path.name, None)
+        if digest is not None:
+            output_size, output_sha256 = digest
+        else:
+            output_size, output_sha256 = json_file_path.stat().st_size, file_sha256(json_file_path)
+        
+        return {
+            'size': source_stat.st_size,
+            'mtime_ns': source_stat.st_mtime_ns,
+            'sha256': source_sha256,
+            'output': json_file_path.name,
+            'output_size': output_size,
+            'output_sha256': output_sha256
         }
     
-    def print_final_statistics(self, total_files, successful_conversions, failed_conversions):
+    def is_unchanged(self, pkl_file, entry):
+        """判断PKL文件自上次转换以来是否未变化且输出仍然存在"""
+        if not entry:
+            return False
+        
+        try:
+            output_path = self.output_dir / entry['output']
+            output_stat = output_path.stat()
+            if output_stat.st_size != entry['output_size']:
+                return False
+            if not all(sibling.exists() for sibling in self.output_format.sibling_paths(output_path).values()):
+                return False
+            
+            source_stat = pkl_file.stat()
+            if source_stat.st_size != entry['size']:
+                return False
+            if source_stat.st_mtime_ns == entry['mtime_ns']:
+                return True
+            
+            # 仅修改时间变化（例如被重新复制）时，比较内容哈希
+            if file_sha256(pkl_file) != entry['sha256']:
+                return False
+            entry['mtime_ns'] = source_stat.st_mtime_ns
+            return True
+            
+        except (OSError, KeyError):
+            return False
+    
+    def remove_stale_outputs(self, manifest, pkl_files):
+        """删除源PKL已不存在的JSON文件，只处理清单中记录过的输出"""
+        current_names = {pkl_file.name for pkl_file in pkl_files}
+        removed_files = []
+        
+        for name in sorted(set(manifest) - current_names):
+            entry = manifest.pop(name)
+            output_path = self.output_dir / entry.get('output', Path(name).stem + self.output_format.suffix)
+            try:
+                if output_path.exists():
+                    output_path.unlink()
+                self.output_format.remove_siblings(output_path)
+                removed_files.append(name)
+                print(f"  已移除过期输出: {output_path.name}")
+            except OSError as e:
+                print(f"⚠ 移除过期输出失败 {output_path.name}: {e}")
+        
+        return removed_files
+    
+    def worker_options(self):
+        """传递给工作进程中转换器的构造参数"""
+        return {'paranoid': self.paranoid, 'output_format': self.output_format, 'log_level': self.log_level}
+    
+    def iter_conversions(self, pkl_files, workers=1, io_threads=0):
+        """按输入顺序逐个产出每个文件的 (success, error, manifest_entry) 结果"""
+        total_files = len(pkl_files)
+        
+        if workers <= 1 and io_threads > 0 and total_files > 1:
+            yield from self.iter_pipeline_conversions(pkl_files, io_threads)
+            return
+        
+        if workers <= 1 or total_files <= 1:
+            # 逐个转换文件
+            for i, pkl_file in enumerate(pkl_files, 1):
+                result = self.convert_and_record(pkl_file)
+                status = "✓" if result[0] else "✗"
+                self.log(f"进度: {i}/{total_files} {status} {pkl_file.name}", 'info')
+                yield result
+            return
+        
+        # 进程池并行转换，map 保持输入顺序，结果与串行模式一致
+        workers = min(workers, total_files)
+        print(f"使用 {workers} 个工作进程并行转换")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_conversion_worker,
+            initargs=(str(self.llm_response_path), str(self.output_dir), self.worker_options())
+        ) as executor:
+            chunksize = max(1, total_files // (workers * 8))
+            results = executor.map(_convert_in_worker, pkl_files, chunksize=chunksize)
+            for i, (pkl_file, (success, error, entry, metrics, output)) in enumerate(zip(pkl_files, results), 1):
+                # 合并工作进程中的计时与计数，输出工作进程中打印的错误等信息
+                if metrics is not None:
+                    self.metrics.merge(metrics)
+                if output:
+                    print(output, end='')
+                status = "✓" if success else "✗"
+                self.log(f"进度: {i}/{total_files} {status} {pkl_file.name}", 'info')
+                yield success, error, entry
+    
+    def iter_pipeline_conversions(self, pkl_files, io_threads):
+        """
+        分阶段流水线转换，磁盘读写与CPU处理重叠进行
+        
+        读取线程预读PKL文件内容 -> 当前线程解码、清理并编码 -> 写入线程写入、校验、替换并生成清单记录；
+        阶段之间使用有界队列，按输入顺序产出与串行模式相同的 (success, error, manifest_entry) 结果
+        """
+        total_files = len(pkl_files)
+        io_threads = min(io_threads, total_files)
+        print(f"使用流水线转换: {io_threads} 个读取线程, {io_threads} 个写入线程")
+        
+        pending = queue.Queue()
+        for index, pkl_file in enumerate(pkl_files):
+            pending.put((index, pkl_file))
+        read_queue = queue.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+        write_queue = queue.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+        results = {}
+        results_ready = threading.Condition()
+        stop = threading.Event()
+        
+        def put(target_queue, item):
+            # 消费方提前退出时不再阻塞
+            while not stop.is_set():
+                try:
+                    target_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def publish(index, result):
+            with results_ready:
+                results[index] = result
+                results_ready.notify_all()
+        
+        def read_files():
+            while not stop.is_set():
+                try:
+                    index, pkl_file = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    put(read_queue, (index, pkl_file, *self.read_source(pkl_file), None))
+                except Exception as e:
+                    put(read_queue, (index, pkl_file, None, None, f"读取失败: {e}"))
+        
+        def write_files():
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    return
+                index, pkl_file, processed_data, encoded = item
+                try:
+                    json_file_path = self.json_path_for(pkl_file)
+                    success, save_error = self.save_single_json_file(processed_data, json_file_path, encoded)
+                    success, error = self.report_saved_file(pkl_file, json_file_path, success, save_error)
+                    result = self.record_conversion(pkl_file, success, error)
+                except Exception as e:
+                    result = (False, f"保存JSON失败: {e}", None)
+                publish(index, result)
+        
+        readers = [threading.Thread(target=read_files, daemon=True) for _ in range(io_threads)]
+        writers = [threading.Thread(target=write_files, daemon=True) for _ in range(io_threads)]
+        for thread in readers + writers:
+            thread.start()
+        
+        next_index = 0
+        
+        def ready_results(wait):
+            # 按输入顺序取出已完成的结果
+            nonlocal next_index
+            with results_ready:
+                if wait:
+                    results_ready.wait_for(lambda: next_index in results)
+                ready = []
+                while next_index in results:
+                    ready.append((next_index, results.pop(next_index)))
+                    next_index += 1
+            return ready
+        
+        def report(ready):
+            for index, result in ready:
+                status = "✓" if result[0] else "✗"
+                self.log(f"进度: {index + 1}/{total_files} {status} {pkl_files[index].name}", 'info')
+                yield result
+        
+        try:
+            for _ in range(total_files):
+                index, pkl_file, buffer, source_stat, error = read_queue.get()
+                if error is None:
+                    processed_data, error = self.prepare_pkl_file(pkl_file, buffer, source_stat)
+                del buffer
+                
+                if error is None:
+                    try:
+                        with self.metrics.timer('encode'):
+                            encoded = self.output_format.encode(processed_data)
+                    except (TypeError, ValueError, OverflowError) as e:
+                        error = f"JSON编码错误: {e}"
+                        print(f"✗ {error}")
+                
+                if error is None:
+                    write_queue.put((index, pkl_file, processed_data, encoded))
+                else:
+                    print(f"✗ 转换失败: {pkl_file.name}")
+                    publish(index, (False, error, None))
+                processed_data = encoded = None
+                
+                yield from report(ready_results(wait=False))
+            
+            while next_index < total_files:
+                yield from report(ready_results(wait=True))
+        finally:
+            stop.set()
+            for _ in writers:
+                write_queue.put(None)
+            for thread in readers + writers:
+                thread.join()
+    
+    def print_final_statistics(self, total_files, successful_conversions, failed_conversions,
+                               skipped_files=(), removed_files=()):
         """打印最终统计信息"""
         print(f"\n{'='*80}")
         print("转换完成统计")
@@ -936,7 +3941,12 @@ class LLMResponseConverter:
         print(f"总PKL文件数: {total_files}")
         print(f"成功转换: {len(successful_conversions)}")
         print(f"转换失败: {len(failed_conversions)}")
-        print(f"成功率: {(len(successful_conversions)/total_files*100):.1f}%")
+        print(f"未变化跳过: {len(skipped_files)}")
+        print(f"过期移除: {len(removed_files)}")
+        print(f"成功率: {self.format_success_rate(total_files, successful_conversions)}")
+        if self.pickle_cache.hits or self.pickle_cache.misses:
+            print(self.pickle_cache.describe())
+        print(f"阶段耗时: {self.metrics.describe()}")
         
         if successful_conversions:
             print(f"\n✓ 成功转换的文件 ({len(successful_conversions)}个):")
@@ -954,6 +3964,12 @@ class LLMResponseConverter:
         
         print(f"\n输出目录: {self.output_dir}")
     
+    def format_success_rate(self, total_files, successful_conversions):
+        """格式化成功率，没有需要转换的文件时显示为 100%"""
+        if total_files == 0:
+            return "100.0%"
+        return f"{(len(successful_conversions)/total_files*100):.1f}%"
+    
     def format_file_size(self, size_bytes):
         """格式化文件大小"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -962,7 +3978,8 @@ class LLMResponseConverter:
             size_bytes /= 1024
         return f"{size_bytes:.1f} TB"
     
-    def create_conversion_report(self, total_files, successful_conversions, failed_conversions):
+    def create_conversion_report(self, total_files, successful_conversions, failed_conversions,
+                                 skipped_files=(), removed_files=()):
         """创建详细的转换报告"""
         report = f"""
 # LLM响应单文件转换报告
@@ -974,7 +3991,9 @@ class LLMResponseConverter:
 - 总PKL文件数: {total_files}
 - 成功转换: {len(successful_conversions)}
 - 转换失败: {len(failed_conversions)}
-- 成功率: {(len(successful_conversions)/total_files*100):.1f}%
+- 未变化跳过: {len(skipped_files)}
+- 过期移除: {len(removed_files)}
+- 成功率: {self.format_success_rate(total_files, successful_conversions)}
 
 ## 输出目录
 {self.output_dir}
@@ -987,7 +4006,7 @@ class LLMResponseConverter:
         
         if successful_conversions:
             for i, filename in enumerate(successful_conversions, 1):
-                json_filename = filename.replace('.pkl', '.json')
+                json_filename = filename.replace('.pkl', self.output_format.suffix)
                 report += f"{i}. {filename} -> {json_filename}\n"
         else:
             report += "无成功转换的文件\n"
@@ -1001,6 +4020,11 @@ class LLMResponseConverter:
         else:
             report += "无失败文件\n"
         
+        if removed_files:
+            report += "\n## 移除的过期文件\n"
+            for i, filename in enumerate(removed_files, 1):
+                report += f"{i}. {filename}\n"
+        
         # 保存报告
         report_path = self.output_dir / f"conversion_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
@@ -1008,18 +4032,346 @@ class LLMResponseConverter:
             f.write(report)
         
         print(f"✓ 转换报告已保存: {report_path}")
+        return report_path
+    
+    def save_metrics(self, report_path, wall_seconds, file_counts, workers=1, io_threads=0):
+        """保存与转换报告同名的性能指标JSON (conversion_metrics_*.json)"""
+        snapshot = self.metrics.snapshot()
+        counters = snapshot['counters']
+        if workers > 1:
+            mode = 'processes'
+        elif io_threads > 0:
+            mode = 'pipeline'
+        else:
+            mode = 'serial'
+        
+        def throughput(byte_count):
+            return round(byte_count / wall_seconds / (1024 * 1024), 3) if wall_seconds > 0 else None
+        
+        metrics = {
+            'created_at': datetime.now().isoformat(),
+            'mode': mode,
+            'workers': workers,
+            'io_threads': io_threads,
+            'output_format': self.output_format.describe(),
+            'files': file_counts,
+            'wall_seconds': round(wall_seconds, 6),
+            # 各阶段耗时为所有线程/进程的累计时间，并行模式下可能大于总耗时
+            'stages': {
+                stage: {
+                    'seconds': round(snapshot['stage_seconds'][stage], 6),
+                    'calls': snapshot['stage_calls'][stage]
+                }
+                for stage in ConversionMetrics.STAGES
+            },
+            'counters': counters,
+            'throughput_mb_per_s': {
+                'input': throughput(counters['bytes_in']),
+                'output': throughput(counters['bytes_out'])
+            },
+            # 多进程模式下PKL在各工作进程中加载，不记录缓存统计
+            'pickle_cache': None if mode == 'processes' else {
+                'hits': self.pickle_cache.hits,
+                'decodes': self.pickle_cache.misses,
+                'strategy_wins': dict(self.pickle_cache.strategy_wins),
+                'failed_parses': self.pickle_cache.failed_parses
+            }
+        }
+        
+        metrics_path = report_path.with_name(
+            report_path.name.replace('conversion_report_', 'conversion_metrics_', 1)
+        ).with_suffix('.json')
+        with open(metrics_path, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+        print(f"✓ 性能指标已保存: {metrics_path}")
+        return metrics_path
+
+class DirectoryWatcher:
+    """
+    监视目录中匹配的文件（不含子目录）的新增、修改与删除
+    
+    安装 watchdog 时使用系统文件事件 (Linux inotify / macOS FSEvents)，否则每隔 poll_interval 秒扫描一次目录。
+    爬虫可能仍在写入文件，文件大小与修改时间持续 debounce 秒不变后才视为写入完成
+    """
+    
+    def __init__(self, directories, pattern='*.pkl', poll_interval=2.0, debounce=1.0, use_events=True):
+        self.directories = [Path(directory) for directory in directories]
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.events = queue.Queue()
+        self.snapshot = self.scan()
+        # 等待写入完成的文件: {路径: (上次观察到的 (大小, 修改时间), 观察时间)}
+        self.pending = {}
+        
+        self.observer = None
+        if use_events and WatchdogObserver is not None:
+            handler = _WatcherEventHandler(self.events)
+            observer = WatchdogObserver()
+            try:
+                for directory in self.directories:
+                    observer.schedule(handler, str(directory), recursive=False)
+                observer.start()
+            except Exception as e:
+                # 例如 inotify 监视数达到上限、目录不存在或无法监视
+                print(f"⚠️ 无法启动系统文件事件监视，改为每 {poll_interval:g} 秒扫描: {e}")
+            else:
+                self.observer = observer
+    
+    @property
+    def mode(self):
+        return 'events' if self.observer is not None else 'polling'
+    
+    def scan(self):
+        """目录中匹配文件的 {路径: (大小, 修改时间)}"""
+        files = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file() and fnmatch.fnmatch(entry.name, self.pattern):
+                            stat = entry.stat()
+                            files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                continue
+        return files
+    
+    def file_state(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    
+    def collect_changes(self, timeout):
+        """收集 timeout 秒内变化的文件路径"""
+        if self.observer is None:
+            time.sleep(timeout)
+            current = self.scan()
+            changed = {path for path, state in current.items() if self.snapshot.get(path) != state}
+            changed.update(set(self.snapshot) - set(current))
+            self.snapshot = current
+            return changed
+        
+        changed = set()
+        try:
+            changed.add(self.events.get(timeout=timeout))
+            while True:
+                changed.add(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return {path for path in changed if fnmatch.fnmatch(os.path.basename(path), self.pattern)}
+    
+    def wait_for_changes(self, stop_event=None):
+        """
+        阻塞直到有文件写入完成（或被删除），返回这批文件的路径集合
+        
+        Args:
+            stop_event: threading.Event，设置后返回空集合
+        """
+        while stop_event is None or not stop_event.is_set():
+            # 有文件等待写入完成时缩短检查间隔
+            timeout = self.debounce / 2 if self.pending else self.poll_interval
+            now = time.monotonic()
+            for path in self.collect_changes(timeout):
+                self.pending[path] = (self.file_state(path), now)
+            
+            # 文件状态仍在变化时重新计时；全部稳定后一起返回，同一批写入只触发一次转换
+            now = time.monotonic()
+            settled = True
+            for path, (state, since) in list(self.pending.items()):
+                current = self.file_state(path)
+                if current != state:
+                    self.pending[path] = (current, now)
+                    settled = False
+                elif current is not None and now - since < self.debounce:
+                    settled = False
+            if self.pending and settled:
+                ready = set(self.pending)
+                self.pending.clear()
+                return ready
+        return set()
+    
+    def close(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+
+class _WatcherEventHandler(FileSystemEventHandler):
+    """把 watchdog 的文件事件路径放入队列（移动事件取目标路径，爬虫先写临时文件再改名时同样能收到）"""
+    
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+    
+    # 只关心写入类事件；转换器读取文件产生的 opened / closed_no_write 事件忽略
+    EVENT_TYPES = ('created', 'modified', 'moved', 'deleted', 'closed')
+    
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in self.EVENT_TYPES:
+            return
+        self.events.put(getattr(event, 'dest_path', '') or event.src_path)
+
+def watch_loop(watcher, convert):
+    """
+    监视模式主循环：先转换一次，之后每批文件写入完成后再次转换，Ctrl+C 退出
+    
+    Args:
+        watcher: DirectoryWatcher
+        convert: 执行一次转换的函数，参数为变化的文件路径集合（首次为 None）
+    """
+    def run_round(changed):
+        """执行一轮转换；失败时输出错误并返回 False，监视继续进行"""
+        try:
+            convert(changed)
+            return True
+        except Exception:
+            print("✗ 本轮转换失败，下次有文件变化时重试:")
+            traceback.print_exc()
+            return False
+    
+    # 失败的轮次中的变化并入下一轮重新处理；首次转换失败时下一轮重新完整转换
+    retry_all = not run_round(None)
+    retry = set()
+    print(f"\n👀 监视中 ({'文件事件' if watcher.mode == 'events' else f'每 {watcher.poll_interval:g} 秒扫描'}, "
+          f"写入完成判定 {watcher.debounce:g} 秒): {', '.join(str(d) for d in watcher.directories)}")
+    print("按 Ctrl+C 退出")
+    try:
+        while True:
+            changed = watcher.wait_for_changes()
+            started = time.perf_counter()
+            print(f"\n🔔 {datetime.now():%H:%M:%S} 检测到 {len(changed)} 个文件变化")
+            if run_round(None if retry_all else changed | retry):
+                retry_all, retry = False, set()
+                print(f"✓ 本轮更新耗时 {time.perf_counter() - started:.2f}s，继续监视...")
+            elif not retry_all:
+                retry |= changed
+    except KeyboardInterrupt:
+        print("\n已停止监视")
+    finally:
+        watcher.close()
+
+# 固定路径配置（命令行未指定时使用）
+DEFAULT_DATA_PATH = "/Users/roychen/Desktop/xhs/Rednote"
+DEFAULT_FRONTEND_DATA_PATH = "/Users/roychen/Desktop/xhs/xiaohongshu/frontend/public/data"
+
+def build_output_format(args):
+    """根据命令行参数创建输出格式，依赖缺失时退出"""
+    try:
+        return OutputFormat(args.format, args.compress or ())
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+def batch_main(args):
+    """分区数据批量转换"""
+    input_path = args.input or DEFAULT_DATA_PATH
+    output_path = args.output or DEFAULT_FRONTEND_DATA_PATH
+    
+    print("批量PKL文件转JSON转换工具")
+    print("=" * 60)
+    print(f"输入目录: {input_path}")
+    print(f"输出目录: {output_path}")
+    print("=" * 60)
+    
+    # 验证输入路径
+    if not Path(input_path).exists():
+        print(f"✗ 输入路径不存在: {input_path}")
+        sys.exit(1)
+    
+    output_format = build_output_format(args)
+    
+    # 创建转换器并执行转换
+    converter = BatchPKLToJSONConverter(input_path, output_path, shard_size=args.shard_size,
+                                        output_format=output_format, columnar=args.columnar,
+                                        thumbnails=args.thumbnails, image_workers=args.workers,
+                                        image_store=args.image_store, perceptual_dedup=args.perceptual_dedup,
+                                        image_store_hardlink=args.image_store_hardlink,
+                                        dedup=args.dedup, cache_llm_responses=args.watch)
+    if args.watch:
+        # 分区PKL位于输入根目录，LLM响应位于 LLMResponse 子目录；每轮只重新转换受影响的分区
+        watcher = DirectoryWatcher([input_path, Path(input_path) / converter.llm_response_folder],
+                                   poll_interval=args.poll_interval, debounce=args.debounce)
+        
+        def convert(changed):
+            converter.convert_all_partitions(changed)
+            if changed is None:
+                converter.create_copy_instructions()
+        
+        watch_loop(watcher, convert)
+        return
+    
+    converter.convert_all_partitions()
+    converter.create_copy_instructions()
+    
+    print(f"\n✓ 批量转换完成！")
+    print(f"请查看 {converter.base_output_path}/COPY_INSTRUCTIONS.txt 了解如何复制文件到前端项目")
 
 def main():
     """主函数"""
-    # 固定路径配置
-    llm_response_path = "/Users/roychen/Desktop/xhs/Rednote/LLMResponse"
-    output_dir = "/Users/roychen/Desktop/xhs/xiaohongshu/frontend/public/data/all_llm_response"
+    parser = argparse.ArgumentParser(description='LLM响应PKL转JSON单文件转换工具 / 分区数据批量转换工具')
+    parser.add_argument('--batch', action='store_true',
+                        help='批量转换分区数据 (Part1.pkl, Part2.pkl, PartNormal.pkl 及对应LLM响应)')
+    parser.add_argument('--input', '-i',
+                        help='输入路径: LLMResponse文件夹，--batch 时为PKL文件根目录')
+    parser.add_argument('--output', '-o',
+                        help='输出路径: JSON文件输出目录，--batch 时为前端data目录')
+    parser.add_argument('--shard-size', type=int, default=200,
+                        help='--batch 时每个分片的帖子数 (默认200，0 表示不生成分片)')
+    parser.add_argument('--columnar', action='store_true',
+                        help='--batch 时额外导出 Parquet 列式文件到 columnar/ (需要 pyarrow)')
+    parser.add_argument('--thumbnails', action='store_true',
+                        help='--batch 时生成图片缩略图、详情尺寸与模糊占位图到 derivatives/ (需要 Pillow，'
+                             '进程数同 --workers)')
+    parser.add_argument('--image-store', action='store_true',
+                        help='--batch 时把图片按内容哈希存入 blobs/ 并去重，帖子图片清单指向共享路径')
+    parser.add_argument('--dedup', choices=('off', 'note_id', 'near'), default='near',
+                        help='--batch 时跨分区帖子去重: near (默认，相同 note_id 与标题+正文近似重复), '
+                             'note_id (只合并相同 note_id), off (不去重)；每组保留 last_modify_ts 最新的一条')
+    parser.add_argument('--perceptual-dedup', action='store_true',
+                        help='配合 --image-store 按感知哈希 (dHash) 合并近似重复图片 (需要 Pillow)')
+    parser.add_argument('--image-store-hardlink', action='store_true',
+                        help='配合 --image-store 硬链接原图而不是复制 (节省磁盘空间；每次运行校验存储文件的哈希，'
+                             '原图被原地改写时重新存放)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='并行工作进程数 (默认1，即串行转换)')
+    parser.add_argument('--io-threads', type=int, default=0,
+                        help='单进程时使用流水线转换的读取/写入线程数 (默认0，即逐个文件依次转换)')
+    parser.add_argument('--log-level', choices=LLMResponseConverter.LOG_LEVELS, default='info',
+                        help='LLM响应转换的输出级别: quiet (只输出汇总与错误), info (默认，另外输出逐文件进度), '
+                             'verbose (另外输出逐文件的详细过程)')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略转换清单，全量重新转换')
+    parser.add_argument('--paranoid', action='store_true',
+                        help='写入后重新读取文件，校验哈希与记录数并完整解析JSON进行验证 (较慢)')
+    parser.add_argument('--format', choices=OutputFormat.FORMATS, default='json',
+                        help='输出格式: json (indent=2, 默认), minified (紧凑JSON), msgpack (需要 msgpack)')
+    parser.add_argument('--compress', nargs='+', choices=sorted(OutputFormat.COMPRESSIONS),
+                        help='同时生成预压缩副本: gzip (.gz), br (.br, 需要 brotli)')
+    parser.add_argument('--watch', action='store_true',
+                        help='转换后持续监视输入目录，新增或修改的PKL写入完成后自动增量转换 (Ctrl+C 退出)；'
+                             '安装 watchdog 时使用系统文件事件，否则定期扫描')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='--watch 时扫描目录的间隔秒数 (默认2)')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                        help='--watch 时文件大小与修改时间保持不变多少秒后视为写入完成 (默认1)')
+    args = parser.parse_args()
+    
+    if args.batch:
+        batch_main(args)
+        return
+    
+    llm_response_path = args.input or f"{DEFAULT_DATA_PATH}/LLMResponse"
+    output_dir = args.output or f"{DEFAULT_FRONTEND_DATA_PATH}/all_llm_response"
     
     print("LLM响应PKL转JSON单文件转换工具")
     print("=" * 80)
     print(f"输入目录: {llm_response_path}")
     print(f"输出目录: {output_dir}")
     print("转换模式: 每个PKL文件转换为对应的JSON文件")
+    print(f"工作进程数: {args.workers}")
+    print(f"增量转换: {'否' if args.force else '是'}")
+    print(f"输出格式: {args.format}, 预压缩: {', '.join(args.compress) if args.compress else '无'}")
     print("=" * 80)
     
     # 验证输入路径
@@ -1027,13 +4379,28 @@ def main():
         print(f"✗ LLMResponse目录不存在: {llm_response_path}")
         sys.exit(1)
     
+    output_format = build_output_format(args)
+    
     # 创建转换器并执行转换
-    converter = LLMResponseConverter(llm_response_path, output_dir)
-    result = converter.convert_all_llm_responses()
+    converter = LLMResponseConverter(llm_response_path, output_dir, paranoid=args.paranoid,
+                                     output_format=output_format, log_level=args.log_level)
+    
+    if args.watch:
+        # 首次按命令行参数转换并生成报告，之后每轮只检查变化的文件
+        watcher = DirectoryWatcher([llm_response_path], poll_interval=args.poll_interval, debounce=args.debounce)
+        watch_loop(watcher, lambda changed: converter.convert_all_llm_responses(
+            workers=args.workers, incremental=not args.force or changed is not None, io_threads=args.io_threads,
+            changed_files=changed, report=changed is None
+        ))
+        return
+    
+    result = converter.convert_all_llm_responses(workers=args.workers, incremental=not args.force,
+                                                 io_threads=args.io_threads)
     
-    if result and result['successful'] > 0:
+    if result and result['successful'] + result['skipped'] > 0:
         print(f"\n✓ LLM响应转换完成！")
         print(f"成功转换: {result['successful']}/{result['total']} 个文件")
+        print(f"跳过: {result['skipped']} 个, 移除: {result['removed']} 个")
         print(f"输出目录: {output_dir}")
     else:
         print(f"\n✗ 转换失败或没有成功转换的文件")
@@ -0,0 +1,484 @@
+# converter_benchmark.py
+# 转换脚本性能基准测试
+# 使用方法:
+#   python converter_benchmark.py [--pkl PartNormal.pkl]      # clean_string / 数值字段微基准
+#   python converter_benchmark.py --suite --sizes 1k 10k 1m    # 合成数据集端到端基准
+
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from converter import BatchPKLToJSONConverter, ConversionMetrics, LLMResponseConverter, parse_count
+
+def legacy_clean_string(text):
+    """旧版 clean_string 实现（逐次 replace + 运行时编译正则），作为对照基准"""
+    if not isinstance(text, str):
+        text = str(text)
+
+    replacements = {
+        '\\t': '\t',
+        '\\r': '\r',
+    }
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+
+    import re
+    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+    return text
+
+def collect_strings(data, strings):
+    """收集数据中所有的字符串（dict的键和字符串叶子节点）"""
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            for key, value in item.items():
+                strings.append(str(key))
+                stack.append(value)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, str):
+            strings.append(item)
+    return strings
+
+def time_function(func, strings, repeat):
+    """对全部字符串重复执行 repeat 轮，返回最快一轮的耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in strings:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_clean_string(pkl_path, repeat=5):
+    """clean_string 微基准：新旧实现结果一致性检查 + 耗时对比"""
+    with open(pkl_path, 'rb') as f:
+        data = pickle.load(f)
+
+    strings = collect_strings(data, [])
+    # 补充一些需要真正清理的字符串，覆盖慢路径
+    strings.extend(['转义\\t字符\\r测试', '控制\x07字符\x1b测试', 'C1\x85控制符'] * 100)
+    total_chars = sum(len(text) for text in strings)
+
+    converter = LLMResponseConverter.__new__(LLMResponseConverter)
+    converter.metrics = ConversionMetrics()
+
+    mismatches = [text for text in strings if converter.clean_string(text) != legacy_clean_string(text)]
+    if mismatches:
+        print(f"✗ 新旧实现结果不一致: {len(mismatches)} 个字符串, 示例: {mismatches[0][:50]!r}")
+        return False
+
+    legacy_time = time_function(legacy_clean_string, strings, repeat)
+    current_time = time_function(converter.clean_string, strings, repeat)
+
+    print(f"clean_string 基准: {len(strings)} 个字符串, {total_chars} 字符 (来源: {pkl_path})")
+    print(f"  旧实现: {legacy_time * 1000:.2f} ms")
+    print(f"  新实现: {current_time * 1000:.2f} ms")
+    print(f"  加速比: {legacy_time / current_time:.1f}x")
+    return True
+
+def legacy_safe_int(value):
+    """旧版 safe_int 实现（逐字符过滤数字，不识别 万/千/k 单位），作为对照基准"""
+    try:
+        if isinstance(value, str):
+            cleaned = ''.join(c for c in value if c.isdigit() or c == '-')
+            return int(cleaned) if cleaned and cleaned != '-' else 0
+        return int(value) if value is not None else 0
+    except (ValueError, TypeError):
+        return 0
+
+def legacy_normalize_numeric_fields(posts_data):
+    """旧版逐帖子、逐字段调用 safe_int"""
+    for post in posts_data:
+        for field in BatchPKLToJSONConverter.POST_NUMERIC_FIELDS:
+            legacy_safe_int(post.get(field, 0))
+        for comment in post.get('all_comments') or ():
+            for field in BatchPKLToJSONConverter.COMMENT_NUMERIC_FIELDS:
+                legacy_safe_int(comment.get(field, 0))
+
+def bench_numeric_fields(pkl_path, repeat=5):
+    """数值字段规整基准：单位展开正确性检查 + 逐字段解析与分区批量解析耗时对比"""
+    with open(pkl_path, 'rb') as f:
+        posts_data = [post for post in pickle.load(f) if isinstance(post, dict)]
+
+    expected = {'1.2万': 12000, '86.9万': 869000, '1万+': 10000, '3千': 3000, '5k': 5000, '1,234': 1234, '': 0}
+    wrong = {text: parse_count(text) for text, value in expected.items() if parse_count(text) != value}
+    if wrong:
+        print(f"✗ 计数解析错误: {wrong}")
+        return False
+
+    converter = BatchPKLToJSONConverter.__new__(BatchPKLToJSONConverter)
+    field_count = sum(
+        len(BatchPKLToJSONConverter.POST_NUMERIC_FIELDS)
+        + len(BatchPKLToJSONConverter.COMMENT_NUMERIC_FIELDS) * len(post.get('all_comments') or ())
+        for post in posts_data
+    )
+
+    def time_once(func):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(posts_data)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    legacy_time = time_once(legacy_normalize_numeric_fields)
+    current_time = time_once(converter.normalize_numeric_fields)
+
+    print(f"数值字段规整基准: {len(posts_data)} 个帖子, {field_count} 个字段 (来源: {pkl_path})")
+    print(f"  逐字段解析: {legacy_time * 1000:.2f} ms ({legacy_time / len(posts_data) * 1e6:.1f} µs/帖子)")
+    print(f"  分区批量解析: {current_time * 1000:.2f} ms ({current_time / len(posts_data) * 1e6:.1f} µs/帖子)")
+    print(f"  加速比: {legacy_time / current_time:.1f}x")
+    return True
+
+# 合成数据集: 分区与转换器 data_sources 中的PKL文件对应
+SYNTHETIC_PARTITIONS = ('Part1.pkl', 'Part2.pkl', 'PartNormal.pkl')
+SYNTHETIC_FRAGMENTS = ('周末', '旅游', '美食探店', '可爱小狗', '穿搭分享', '护肤', '好物推荐', '日常vlog', '打卡', '攻略')
+SYNTHETIC_DECISIONS = ('safe', 'safe', 'safe', 'review', 'block')
+# 生成数据集时每次序列化写入的帖子数，大规模数据集不在内存中保留整个分区
+CORPUS_CHUNK_SIZE = 1000
+# 分块写入的分区PKL使用的协议：协议 4 起 memo 按出现顺序隐式编号，逐块拼接后编号会错位；协议 3 使用显式编号
+CORPUS_PICKLE_PROTOCOL = 3
+
+def parse_size(text):
+    """数据集规模: 1000、1k、1m"""
+    text = text.strip().lower()
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1000, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1000000, text[:-1]
+    return int(float(text) * multiplier)
+
+def synthetic_text(rng, words):
+    """随机文本，少量包含需要清理的转义序列与控制字符"""
+    text = ''.join(rng.choice(SYNTHETIC_FRAGMENTS) for _ in range(words))
+    roll = rng.random()
+    if roll < 0.05:
+        text += '\\t转义'
+    elif roll < 0.08:
+        text += '控制\x07字符'
+    return text
+
+def synthetic_count(rng):
+    """计数字段: 纯数字或 "1.2万"、"10万+" 等写法"""
+    roll = rng.random()
+    if roll < 0.7:
+        return str(rng.randint(0, 9999))
+    if roll < 0.95:
+        return f"{rng.randint(10, 999) / 10}万"
+    return '10万+'
+
+def synthetic_post(rng, index, partition, comments_per_post):
+    """与 convert_single_post 处理的结构一致的帖子"""
+    note_id = f"{index:024x}"
+    comments = []
+    for comment_index in range(rng.randint(0, comments_per_post * 2)):
+        comments.append({
+            'comment_id': f"{index:016x}{comment_index:08x}",
+            'content': synthetic_text(rng, rng.randint(2, 20)),
+            'user_id': f"{rng.getrandbits(96):024x}",
+            'nickname': f"用户{rng.randint(1, 50000)}",
+            'avatar': 'https://sns-avatar-qc.xhscdn.com/avatar/synthetic.jpg',
+            'like_count': synthetic_count(rng),
+            'sub_comment_count': str(rng.randint(0, 30)),
+            'create_time': 1700000000000 + rng.randint(0, 10 ** 10),
+            'parent_comment_id': comments[-1]['comment_id'] if comments and rng.random() < 0.3 else '0'
+        })
+
+    return {
+        'note_id': note_id,
+        'type': rng.choice(('normal', 'video')),
+        'title': synthetic_text(rng, rng.randint(2, 8)),
+        'desc': synthetic_text(rng, rng.randint(10, 60)),
+        'video_url': '',
+        'time': 1700000000000 + rng.randint(0, 10 ** 10),
+        'last_update_time': 1700000000000 + rng.randint(0, 10 ** 10),
+        'user_id': f"{rng.getrandbits(96):024x}",
+        'nickname': f"用户{rng.randint(1, 50000)}",
+        'avatar': 'https://sns-avatar-qc.xhscdn.com/avatar/synthetic.jpg',
+        'liked_count': synthetic_count(rng),
+        'collected_count': synthetic_count(rng),
+        'comment_count': str(len(comments)),
+        'share_count': synthetic_count(rng),
+        'ip_location': rng.choice(('', '浙江', '上海', '广东', '北京')),
+        'image_list': '',
+        'tag_list': ','.join(rng.choice(SYNTHETIC_FRAGMENTS) for _ in range(rng.randint(0, 6))),
+        'last_modify_ts': 1700000000000 + rng.randint(0, 10 ** 10),
+        'note_url': f"https://www.xiaohongshu.com/explore/{note_id}",
+        'source_keyword': rng.choice(SYNTHETIC_FRAGMENTS),
+        'xsec_token': '',
+        'all_comments': comments,
+        'comments_n': len(comments),
+        'image_folder_path': f"{partition}/{note_id}"
+    }
+
+def synthetic_reasons(rng):
+    """审核理由: 混合需要清理的字符串、UTF-8 与 GBK 编码的 bytes"""
+    reasons = [synthetic_text(rng, rng.randint(2, 6)) for _ in range(rng.randint(0, 3))]
+    if rng.random() < 0.3:
+        reasons.append(synthetic_text(rng, 3).encode('utf-8'))
+    if rng.random() < 0.2:
+        reasons.append(synthetic_text(rng, 3).encode('gbk'))
+    return reasons
+
+def synthetic_llm_responses(rng):
+    """与 process_data_recursively / build_moderation_block 处理的结构一致的 overall/text/image 响应"""
+    decision = rng.choice(SYNTHETIC_DECISIONS)
+    overall = {
+        'analysis': {
+            'final_decision': decision,
+            'reasons': synthetic_reasons(rng),
+            'confidence': round(rng.uniform(0.5, 1.0), 2),
+            'violent_content': decision == 'block' and rng.random() < 0.5,
+            'emotional_content': rng.random() < 0.1,
+            'text': {'is_safe': decision != 'block', 'reasons': synthetic_reasons(rng)},
+        },
+        'raw': (rng.randint(0, 9), rng.random(), synthetic_text(rng, 2)),
+        'comments': {'is_safe': rng.random() < 0.9, 'blocked_count': rng.randint(0, 3)}
+    }
+    text = {
+        'is_safe': decision != 'block',
+        'reasons': synthetic_reasons(rng),
+        'nested': [[{'segment': synthetic_text(rng, 4), 'score': rng.random()}] for _ in range(rng.randint(1, 3))]
+    }
+    image = {
+        'is_safe': rng.random() < 0.95,
+        'reasons': synthetic_reasons(rng),
+        'per_image': [{'index': i, 'labels': {rng.choice(SYNTHETIC_FRAGMENTS): rng.random()}} for i in range(rng.randint(0, 4))]
+    }
+    return {'overall': overall, 'text': text, 'image': image}
+
+class ChunkedPickleListWriter:
+    """
+    分块写入一个 pickle 列表，结果与 pickle.dump(list) 一样可以用 pickle.load 读回
+
+    文件结构: PROTO 3, EMPTY_LIST，每块为 MARK + 各元素单独序列化的操作码 + APPENDS，最后 STOP；
+    各元素的 memo 编号只在自身内部引用，后写入的元素覆盖同一编号不影响已读完的元素
+    """
+
+    def __init__(self, file_path):
+        self.file = open(file_path, 'wb')
+        self.file.write(pickle.PROTO + bytes([CORPUS_PICKLE_PROTOCOL]) + pickle.EMPTY_LIST)
+
+    def write_chunk(self, items):
+        if not items:
+            return
+        # 去掉每个元素自身的 PROTO 头 (2 字节) 与 STOP
+        body = b''.join(pickle.dumps(item, protocol=CORPUS_PICKLE_PROTOCOL)[2:-1] for item in items)
+        self.file.write(pickle.MARK + body + pickle.APPENDS)
+
+    def close(self):
+        self.file.write(pickle.STOP)
+        self.file.close()
+
+def generate_corpus(root, post_count, llm_ratio=0.1, comments_per_post=5, seed=0):
+    """
+    生成合成数据集: 三个分区PKL + LLMResponse/{note_id}{类型}.pkl
+
+    分区帖子每 CORPUS_CHUNK_SIZE 个序列化写入一次，生成 1m 规模的数据集时内存中只有一块帖子
+
+    Returns:
+        {'posts', 'llm_notes', 'partition_bytes', 'llm_bytes'}
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    llm_dir = root / 'LLMResponse'
+    llm_dir.mkdir(parents=True, exist_ok=True)
+
+    partition_bytes = 0
+    llm_bytes = 0
+    llm_notes = 0
+    index = 0
+    for partition_index, pkl_name in enumerate(SYNTHETIC_PARTITIONS):
+        partition = Path(pkl_name).stem
+        count = post_count // len(SYNTHETIC_PARTITIONS)
+        if partition_index == len(SYNTHETIC_PARTITIONS) - 1:
+            count = post_count - index
+
+        writer = ChunkedPickleListWriter(root / pkl_name)
+        posts = []
+        for _ in range(count):
+            post = synthetic_post(rng, index, partition, comments_per_post)
+            posts.append(post)
+            index += 1
+            if len(posts) >= CORPUS_CHUNK_SIZE:
+                writer.write_chunk(posts)
+                posts = []
+
+            if rng.random() < llm_ratio:
+                llm_notes += 1
+                for response_type, response in synthetic_llm_responses(rng).items():
+                    response_path = llm_dir / f"{post['note_id']}{response_type}.pkl"
+                    with open(response_path, 'wb') as f:
+                        pickle.dump(response, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    llm_bytes += response_path.stat().st_size
+
+        writer.write_chunk(posts)
+        writer.close()
+        partition_bytes += (root / pkl_name).stat().st_size
+
+    return {'posts': post_count, 'llm_notes': llm_notes, 'partition_bytes': partition_bytes, 'llm_bytes': llm_bytes}
+
+def peak_rss_bytes():
+    """当前进程的峰值常驻内存 (字节)，平台不支持时为 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def run_batch_stage(data_dir, output_dir, options):
+    """分区批量转换阶段，返回转换器的分阶段计时 (load / dedup / convert / shard_stats / write)"""
+    converter = BatchPKLToJSONConverter(data_dir, output_dir, shard_size=options.get('shard_size', 200))
+    converter.convert_all_partitions()
+    return converter.metrics.snapshot()
+
+def run_llm_stage(data_dir, output_dir, options):
+    """LLM响应逐文件转换阶段，返回转换器的分阶段计时"""
+    converter = LLMResponseConverter(Path(data_dir) / 'LLMResponse', output_dir, log_level='quiet')
+    converter.convert_all_llm_responses(workers=options.get('workers', 1), incremental=False,
+                                        io_threads=options.get('io_threads', 0))
+    return converter.metrics.snapshot()
+
+BENCHMARK_STAGES = {
+    'batch': run_batch_stage,
+    'llm': run_llm_stage
+}
+
+def _stage_process(stage, data_dir, output_dir, options, connection):
+    """在独立进程中运行一个阶段，峰值内存只反映该阶段"""
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+    try:
+        start = time.perf_counter()
+        details = BENCHMARK_STAGES[stage](data_dir, output_dir, options)
+        connection.send({'wall_seconds': time.perf_counter() - start, 'peak_rss': peak_rss_bytes(),
+                         'details': details, 'error': None})
+    except Exception as e:
+        connection.send({'wall_seconds': None, 'peak_rss': peak_rss_bytes(), 'details': None, 'error': repr(e)})
+    finally:
+        connection.close()
+
+def run_stage(stage, data_dir, output_dir, options):
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_stage_process, args=(stage, str(data_dir), str(output_dir), options, sender))
+    process.start()
+    sender.close()
+    result = receiver.recv()
+    process.join()
+    return result
+
+def format_megabytes(byte_count):
+    return f"{byte_count / (1024 * 1024):.1f} MB" if byte_count is not None else '-'
+
+def format_throughput(byte_count, seconds):
+    return f"{byte_count / (1024 * 1024) / seconds:.1f} MB/s" if seconds else '-'
+
+def bench_suite(sizes, workdir=None, keep=False, llm_ratio=0.1, comments_per_post=5, options=None):
+    """合成数据集端到端基准：每个规模生成数据后分别运行批量转换与LLM响应转换"""
+    options = options or {}
+    results = []
+
+    for size in sizes:
+        root = Path(tempfile.mkdtemp(prefix=f'converter_bench_{size}_', dir=workdir))
+        try:
+            print(f"\n{'='*60}")
+            print(f"合成数据集: {size} 个帖子 ({root})")
+            start = time.perf_counter()
+            corpus = generate_corpus(root / 'data', size, llm_ratio, comments_per_post)
+            print(f"  生成: {time.perf_counter() - start:.1f}s, 分区PKL {format_megabytes(corpus['partition_bytes'])}, "
+                  f"LLM响应 {corpus['llm_notes'] * 3} 个文件 {format_megabytes(corpus['llm_bytes'])}")
+
+            stage_inputs = {
+                'batch': corpus['partition_bytes'] + corpus['llm_bytes'],
+                'llm': corpus['llm_bytes']
+            }
+            size_result = {'posts': size, 'corpus': corpus, 'stages': {}}
+            for stage in BENCHMARK_STAGES:
+                stage_result = run_stage(stage, root / 'data', root / f'out_{stage}', options)
+                stage_result['input_bytes'] = stage_inputs[stage]
+                size_result['stages'][stage] = stage_result
+
+                if stage_result['error']:
+                    print(f"  ✗ {stage}: {stage_result['error']}")
+                    continue
+                wall = stage_result['wall_seconds']
+                print(f"  {stage:<6} {wall:8.2f}s  峰值内存 {format_megabytes(stage_result['peak_rss']):>10}  "
+                      f"{format_throughput(stage_inputs[stage], wall):>12}")
+
+                # 转换器内部各阶段耗时与吞吐 (读取、去重与清理按输入字节，其余阶段按输出字节)
+                details = stage_result['details']
+                if details:
+                    counters = details['counters']
+                    for name, seconds in details['stage_seconds'].items():
+                        if not seconds:
+                            continue
+                        input_stage = name in ('load', 'dedup', 'clean')
+                        byte_count = counters['bytes_in'] if input_stage else counters['bytes_out']
+                        print(f"    - {name:<11} {seconds:8.2f}s  {seconds / wall:6.1%}  "
+                              f"{format_throughput(byte_count, seconds):>12}")
+            results.append(size_result)
+        finally:
+            if keep:
+                print(f"  保留数据集: {root}")
+            else:
+                shutil.rmtree(root, ignore_errors=True)
+
+    return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='转换脚本性能基准测试')
+    parser.add_argument('--pkl', default=str(Path(__file__).parent / 'PartNormal.pkl'),
+                        help='用于基准测试的PKL文件 (默认: PartNormal.pkl)')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测试重复轮数')
+    parser.add_argument('--suite', action='store_true',
+                        help='运行合成数据集端到端基准 (批量转换与LLM响应转换的耗时、峰值内存、吞吐)')
+    parser.add_argument('--sizes', nargs='+', default=['1k', '10k'],
+                        help='--suite 的数据集规模 (帖子数，支持 k/m 后缀，如 1k 100k 1m)')
+    parser.add_argument('--llm-ratio', type=float, default=0.1, help='--suite 中带LLM响应的帖子比例')
+    parser.add_argument('--comments', type=int, default=5, help='--suite 中每个帖子的平均评论数')
+    parser.add_argument('--workers', type=int, default=1, help='--suite 中LLM响应转换的工作进程数')
+    parser.add_argument('--io-threads', type=int, default=0, help='--suite 中LLM响应转换的流水线线程数')
+    parser.add_argument('--workdir', help='--suite 生成数据集的目录 (默认系统临时目录)')
+    parser.add_argument('--keep', action='store_true', help='--suite 结束后保留生成的数据集')
+    parser.add_argument('--output-json', help='--suite 结果另存为JSON，便于对比不同版本')
+    args = parser.parse_args()
+
+    if args.suite:
+        results = bench_suite(
+            [parse_size(size) for size in args.sizes], args.workdir, args.keep, args.llm_ratio, args.comments,
+            {'workers': args.workers, 'io_threads': args.io_threads}
+        )
+        if args.output_json:
+            with open(args.output_json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"\n✓ 结果已保存: {args.output_json}")
+        if any(stage['error'] for result in results for stage in result['stages'].values()):
+            sys.exit(1)
+        return
+
+    if not Path(args.pkl).exists():
+        print(f"✗ PKL文件不存在: {args.pkl}")
+        sys.exit(1)
+
+    if not bench_clean_string(args.pkl, args.repeat):
+        sys.exit(1)
+
+    if not bench_numeric_fields(args.pkl, args.repeat):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,14 @@ import { Search, Filter, RefreshCw, XCircle, TrendingUp, Users, FileText, AlertT
 import ContentCard from './components/content/ContentCard';
 import PostDetail from './components/PostDetail';
 import Pagination from './components/common/Pagination';
-import DataService from './services/dataService';
+import { dataService } from './services/dataService';
 import './index.css';
 
 function App() {
   // 状态管理
-  const [posts, setPosts] = useState([]);
-  const [filteredPosts, setFilteredPosts] = useState([]);
+  const [dataVersion, setDataVersion] = useState(0);
   const [currentPagePosts, setCurrentPagePosts] = useState([]);
+  const [totalItems, setTotalItems] = useState(0);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [selectedPost, setSelectedPost] = useState(null);
@@ -34,9 +34,7 @@ function App() {
     blockedContent: 0
   });
 
-  const dataService = new DataService();
-
-  // 数据加载
+  // 数据加载：只加载第一页所需的数据，其余数据在翻页时按需加载
   const loadData = useCallback(async () => {
     setLoading(true);
     setError(null);
@@ -44,22 +42,22 @@ function App() {
     try {
       console.log('🔄 App: 开始加载数据...');
       
-      // 加载所有帖子数据
-      const allPosts = await dataService.getAllPosts();
+      dataService.clearCache();
+      const firstPage = await dataService.getPostsPage(1, postsPerPage);
       const stats = await dataService.getStatistics();
       
-      if (!allPosts || allPosts.length === 0) {
+      if (firstPage.pagination.totalItems === 0) {
         throw new Error('没有找到有效的帖子数据，请检查数据文件是否存在');
       }
 
       console.log(`✅ App: 数据加载完成`);
-      console.log(`📊 总帖子数: ${allPosts.length}`);
+      console.log(`📊 总帖子数: ${firstPage.pagination.totalItems}`);
       console.log(`📊 统计信息:`, stats);
 
       // 数据预处理和调试 - 修改为使用新的图片结构
       if (process.env.NODE_ENV === 'development') {
         console.log('\n🔍 数据预览 (前5条):');
-        allPosts.slice(0, 5).forEach((post, index) => {
+        firstPage.data.slice(0, 5).forEach((post, index) => {
           const imageInfo = post.images && post.images.length > 0 
             ? `${post.images.length}张图片: ${post.images[0]}` 
             : '无图片';
@@ -67,81 +65,45 @@ function App() {
         });
       }
       
-      setPosts(allPosts);
       setStatistics(stats);
+      setCurrentPage(1);
+      setDataVersion(version => version + 1);
       
     } catch (error) {
       console.error('❌ App: 数据加载失败:', error);
       setError(error.message);
-      setPosts([]);
+      setCurrentPagePosts([]);
     } finally {
       setLoading(false);
     }
-  }, []);
+  }, [postsPerPage]);
 
-  // 搜索和筛选逻辑
-  const filterPosts = useCallback(() => {
-    let result = posts;
+  // 搜索、筛选与分页 - 由数据服务返回当前页，无筛选时只加载该页所在的分片
+  const loadCurrentPage = useCallback(async (isCancelled) => {
+    const filters = {
+      search: searchQuery.trim(),
+      type: filterType
+    };
+    const { data, pagination } = await dataService.getPostsPage(currentPage, postsPerPage, filters);
+    if (isCancelled()) return;
 
-    // 搜索过滤
-    if (searchQuery.trim()) {
-      const keyword = searchQuery.toLowerCase();
-      result = result.filter(post => 
-        post.title?.toLowerCase().includes(keyword) ||
-        post.content?.toLowerCase().includes(keyword) ||
-        post.desc?.toLowerCase().includes(keyword) ||
-        post.nickname?.toLowerCase().includes(keyword) ||
-        post.tags?.some(tag => tag.toLowerCase().includes(keyword))
-      );
-    }
+    setCurrentPagePosts(data);
+    setTotalItems(pagination.totalItems);
+    setTotalPages(pagination.totalPages);
 
-    // 类型过滤
-    if (filterType !== 'all') {
-      switch (filterType) {
-        case 'text':
-          result = result.filter(post => post.content && (!post.images || post.images.length === 0));
-          break;
-        case 'image':
-          result = result.filter(post => post.images && post.images.length > 0);
-          break;
-        case 'safe':
-          result = result.filter(post => post.moderation?.isSafe);
-          break;
-        case 'blocked':
-          result = result.filter(post => post.moderation?.isBlocked);
-          break;
-        case 'review':
-          result = result.filter(post => post.moderation?.needsReview);
-          break;
-        default:
-          break;
-      }
-    }
-
-    setFilteredPosts(result);
-    
-    // 重新计算分页
-    const newTotalPages = Math.ceil(result.length / postsPerPage);
-    setTotalPages(newTotalPages);
-    
     // 如果当前页超出范围，重置到第一页
-    if (currentPage > newTotalPages && newTotalPages > 0) {
+    if (currentPage > pagination.totalPages && pagination.totalPages > 0) {
       setCurrentPage(1);
     }
-    
-    console.log(`🔍 筛选结果: ${result.length} 条 (搜索: "${searchQuery}", 类型: ${filterType}, 总页数: ${newTotalPages})`);
-  }, [posts, searchQuery, filterType, currentPage, postsPerPage]);
 
-  // 分页逻辑 - 计算当前页的帖子
-  const updateCurrentPagePosts = useCallback(() => {
-    const startIndex = (currentPage - 1) * postsPerPage;
-    const endIndex = startIndex + postsPerPage;
-    const pageData = filteredPosts.slice(startIndex, endIndex);
-    
-    setCurrentPagePosts(pageData);
+    // 新加载的分片会更新统计信息
+    const stats = await dataService.getStatistics();
+    if (!isCancelled()) {
+      setStatistics(stats);
+    }
     
-    console.log(`📄 当前第${currentPage}页: ${pageData.length} 条帖子 (${startIndex + 1}-${Math.min(endIndex, filteredPosts.length)})`);
-  }, [filteredPosts, currentPage, postsPerPage]);
+    console.log(`📄 当前第${currentPage}页: ${data.length} 条帖子 (搜索: "${searchQuery}", 类型: ${filterType}, 总计: ${pagination.totalItems}, 总页数: ${pagination.totalPages})`);
+  }, [searchQuery, filterType, currentPage, postsPerPage]);
 
   // 页面跳转处理
   const handlePageChange = (page) => {
@@ -173,12 +135,16 @@ function App() {
   }, [loadData]);
 
   useEffect(() => {
-    filterPosts();
-  }, [filterPosts]);
+    if (dataVersion === 0) return undefined;
 
-  useEffect(() => {
-    updateCurrentPagePosts();
-  }, [updateCurrentPagePosts]);
+    let cancelled = false;
+    loadCurrentPage(() => cancelled).catch(error => {
+      console.error('❌ App: 页面数据加载失败:', error);
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, [loadCurrentPage, dataVersion]);
 
   // 渲染逻辑
   if (loading) {
@@ -259,7 +225,7 @@ function App() {
 
             {/* 页面信息 */}
             <div className="text-sm text-gray-600">
-              第 {currentPage} 页，共 {totalPages} 页 (总计 {filteredPosts.length} 条)
+              第 {currentPage} 页，共 {totalPages} 页 (总计 {totalItems} 条)
             </div>
           </div>
 
@@ -335,7 +301,7 @@ function App() {
                 currentPage={currentPage}
                 totalPages={totalPages}
                 onPageChange={handlePageChange}
-                totalItems={filteredPosts.length}
+                totalItems={totalItems}
                 itemsPerPage={postsPerPage}
               />
             </div>
@@ -30,8 +30,15 @@ const DataManagementPage = () => {
     loadData();
   }, []);
 
+  // 搜索为异步操作，输入变化后较早的查询可能较晚返回，只采用最新一次的结果
   useEffect(() => {
-    filterPosts();
+    let cancelled = false;
+    filterPosts(() => cancelled).catch(error => {
+      console.error('❌ DataManagementPage: 搜索失败:', error);
+    });
+    return () => {
+      cancelled = true;
+    };
   }, [posts, searchQuery, filterStatus]);
 
   const loadData = async () => {
@@ -54,7 +61,7 @@ const DataManagementPage = () => {
     }
   };
 
-  const filterPosts = async () => {
+  const filterPosts = async (isCancelled) => {
     let result = posts;
 
     // 根据状态过滤
@@ -74,16 +81,11 @@ const DataManagementPage = () => {
       }
     }
 
-    // 根据搜索关键词过滤
+    // 根据搜索关键词过滤（数据服务使用搜索索引，不再逐条扫描）
     if (searchQuery.trim()) {
-      const lowerKeyword = searchQuery.toLowerCase();
-      result = result.filter(post => 
-        post.title.toLowerCase().includes(lowerKeyword) ||
-        post.content.toLowerCase().includes(lowerKeyword) ||
-        post.author.nickname.toLowerCase().includes(lowerKeyword) ||
-        post.tags.some(tag => tag.toLowerCase().includes(lowerKeyword)) ||
-        (post.sourceKeyword && post.sourceKeyword.toLowerCase().includes(lowerKeyword))
-      );
+      const matchedIds = new Set((await dataService.findMatchingPosts(searchQuery)).map(post => post.id));
+      if (isCancelled()) return;
+      result = result.filter(post => matchedIds.has(post.id));
     }
 
     setFilteredPosts(result);
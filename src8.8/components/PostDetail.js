@@ -18,6 +18,10 @@ const PostDetail = ({ post, isOpen, onClose, dataService }) => {
   const [isLoadingMoreComments, setIsLoadingMoreComments] = useState(false);
   const COMMENTS_PER_PAGE = 30; // 每次加载30条评论
   
+  // 完整评论树：分片数据中的帖子只带前几条评论，打开详情时按需加载
+  const [comments, setComments] = useState(post?.comments || []);
+  const [isLoadingComments, setIsLoadingComments] = useState(false);
+  
   // 敏感内容显示状态
   const [textContentRevealed, setTextContentRevealed] = useState(false);
   const [imageContentRevealed, setImageContentRevealed] = useState(false);
@@ -33,6 +37,30 @@ const PostDetail = ({ post, isOpen, onClose, dataService }) => {
     }
   }, [post]);
 
+  // 按需加载完整评论
+  useEffect(() => {
+    if (!post || !isOpen) return undefined;
+
+    let cancelled = false;
+    setComments(post.comments || []);
+    if (post.commentsLoaded === false && dataService?.loadComments) {
+      setIsLoadingComments(true);
+      dataService.loadComments(post)
+        .then(loaded => {
+          if (!cancelled) setComments(loaded || []);
+        })
+        .catch(error => {
+          console.error('❌ 评论加载失败:', error);
+        })
+        .finally(() => {
+          if (!cancelled) setIsLoadingComments(false);
+        });
+    }
+    return () => {
+      cancelled = true;
+    };
+  }, [post, isOpen, dataService]);
+
   // 如果没有帖子数据或未打开，不渲染
   if (!isOpen || !post) return null;
 
@@ -44,9 +72,9 @@ const PostDetail = ({ post, isOpen, onClose, dataService }) => {
     return `${Math.floor(num / 1000)}k`;
   };
 
-  // 获取所有图片路径
+  // 获取所有图片路径（有详情尺寸衍生版本时使用衍生版本）
   const getAllImages = () => {
-    return post.images || [];
+    return post.detailImages?.length ? post.detailImages : post.images || [];
   };
 
   // 获取头像路径
@@ -170,6 +198,7 @@ const PostDetail = ({ post, isOpen, onClose, dataService }) => {
         <div className="space-y-4">
           <ImageGallery 
             images={images} 
+            thumbnails={post.thumbnails}
             initialIndex={0}
             alt={post.title || '小红书图片'}
           />
@@ -178,14 +207,18 @@ const PostDetail = ({ post, isOpen, onClose, dataService }) => {
     );
   };
 
-  // 渲染单个评论
-  const renderComment = (comment, index) => {
+  // 渲染单个评论（回复缩进显示在评论下方）
+  const renderComment = (comment, index, isReply = false) => {
     const commentModeration = post.moderation?.results?.comments;
     const isCommentBlocked = commentModeration && !commentModeration.isSafe;
     const isRevealed = revealedComments.has(comment.id);
+    const replies = comment.replies || [];
 
     return (
-      <div key={comment.id || index} className="border-b border-gray-100 pb-4 last:border-b-0">
+      <div
+        key={comment.id || index}
+        className={isReply ? 'pt-3' : 'border-b border-gray-100 pb-4 last:border-b-0'}
+      >
         <CommentModerationOverlay
           moderationResult={isCommentBlocked ? commentModeration : null}
           isRevealed={isRevealed}
@@ -221,14 +254,18 @@ const PostDetail = ({ post, isOpen, onClose, dataService }) => {
             </div>
           </div>
         </CommentModerationOverlay>
+        {replies.length > 0 && (
+          <div className="ml-11 pl-3 border-l-2 border-gray-100">
+            {replies.map((reply, replyIndex) => renderComment(reply, replyIndex, true))}
+          </div>
+        )}
       </div>
     );
   };
 
   // 渲染评论区域
   const renderCommentsSection = () => {
-    const comments = post.comments || [];
-    const totalCommentsCount = post.commentCount || comments.length; // 优先使用帖子的评论计数
+    const totalCommentsCount = post.commentCount || post.commentsTotal || comments.length; // 优先使用帖子的评论计数
     const hasComments = comments.length > 0;
     
     // 当前显示的评论（限制在 commentsDisplayed 数量内）
@@ -254,7 +291,7 @@ const PostDetail = ({ post, isOpen, onClose, dataService }) => {
               </div>
             )}
             <div className="text-xs text-gray-500 bg-gray-100 px-2 py-1 rounded-full">
-              显示 {commentsToShow.length} / {comments.length}
+              {isLoadingComments ? '评论加载中...' : `显示 ${commentsToShow.length} / ${comments.length}`}
             </div>
           </div>
         </div>
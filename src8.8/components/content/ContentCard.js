@@ -71,9 +71,9 @@ const ContentCard = ({ post, onClick, dataService }) => {
     }
   };
 
-  // 获取所有图片路径
+  // 获取所有图片路径（有缩略图时使用缩略图）
   const getAllImages = () => {
-    return post.images || [];
+    return post.thumbnails?.length ? post.thumbnails : post.images || [];
   };
 
   // 获取主图片路径（向后兼容）
@@ -152,8 +152,11 @@ const ContentCard = ({ post, onClick, dataService }) => {
       >
         <div className="relative bg-gray-100 rounded-lg overflow-hidden">
           {images.length === 1 ? (
-            // 单张图片显示
-            <div className="relative">
+            // 单张图片显示（加载前显示模糊占位图）
+            <div
+              className="relative"
+              style={post.placeholder ? { backgroundImage: `url(${post.placeholder})`, backgroundSize: 'cover' } : undefined}
+            >
               {!imagesLoaded.has(images[0]) && !imagesError.has(images[0]) && (
                 <div className="aspect-square flex items-center justify-center">
                   <div className="animate-pulse bg-gray-200 w-8 h-8 rounded"></div>
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { ChevronLeft, ChevronRight, RotateCcw, ZoomIn, ZoomOut } from 'lucide-react';
 
-const ImageGallery = ({ images, initialIndex = 0, alt = '图片' }) => {
+const ImageGallery = ({ images, thumbnails, initialIndex = 0, alt = '图片' }) => {
   const [currentIndex, setCurrentIndex] = useState(initialIndex);
   const [isLoaded, setIsLoaded] = useState(false);
   const [isError, setIsError] = useState(false);
@@ -296,7 +296,7 @@ const ImageGallery = ({ images, initialIndex = 0, alt = '图片' }) => {
                 }`}
               >
                 <img
-                  src={image}
+                  src={thumbnails?.[index] || image}
                   alt={`缩略图 ${index + 1}`}
                   className="w-full h-full object-cover"
                   onError={(e) => {
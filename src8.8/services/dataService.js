@@ -8,12 +8,27 @@ class DataService {
     this.isLoaded = false;
     this.cache = new Map(); // 缓存加载的数据
     this.imageCache = new Map(); // 缓存每个帖子的图片数组
+
+    // 分片模式（存在 /data/shards/index.json 时启用）
+    this.shardIndex = null;
+    this.shardPosts = []; // 每个分片处理后的帖子数组
+    this.shardLoading = new Map(); // 正在加载的分片 Promise
+    this.commentsLoading = new Map(); // 正在加载的分片评论文件 Promise
+
+    // 转换脚本生成的预压缩副本（来自 /data/config.json 的 encodings）
+    this.encodings = [];
+    // 转换脚本预先计算的看板统计 (stats.json)，存在时不再在浏览器中遍历帖子统计
+    this.statsPath = null;
+    this.rollupStatistics = null;
   }
 
   async getAllPosts() {
     if (!this.isLoaded) {
       await this.loadData();
     }
+    if (this.shardIndex) {
+      await this.loadAllShards();
+    }
     return this.posts;
   }
 
@@ -29,12 +44,37 @@ class DataService {
       console.log('🔄 DataService: 开始加载数据文件...');
       
       const startTime = performance.now();
+
+      await this.loadDataConfig();
+      if (this.statsPath) {
+        const rollup = await this.loadJsonFile(this.statsPath);
+        this.rollupStatistics = rollup ? this.statisticsFromRollup(rollup) : null;
+      }
+
+      // 优先使用分片数据：只加载索引和第一个分片，其余分片按需加载
+      const shardIndex = await this.loadJsonFile('/data/shards/index.json');
+      if (shardIndex && shardIndex.format === 'msgpack') {
+        throw new Error('分片数据为 MessagePack 格式，前端需要使用 --format json 或 minified 重新转换');
+      }
+      if (shardIndex && Array.isArray(shardIndex.shards)) {
+        await this.loadShardedData(shardIndex);
+        console.log(`✅ DataService: 首个分片加载完成，耗时 ${Math.round(performance.now() - startTime)}ms`);
+        this.isLoaded = true;
+        return;
+      }
       
       // 根据实际文件结构加载数据
-      const [part1Data, part2Data, partNormalData, part1LLM, part2LLM, partNormalLLM] = await Promise.all([
+      const [part1Data, part2Data, partNormalData] = await Promise.all([
         this.loadJsonFile('/data/part1_data/part1_posts.json'),
         this.loadJsonFile('/data/part2_data/part2_posts.json'), 
-        this.loadJsonFile('/data/partnormal_data/partnormal_posts.json'),
+        this.loadJsonFile('/data/partnormal_data/partnormal_posts.json')
+      ]);
+
+      // 转换脚本已将审核结论合并到帖子中时，无需加载原始LLM响应
+      const hasModeration = [part1Data, part2Data, partNormalData]
+        .filter(Array.isArray)
+        .every(posts => posts.every(post => 'moderation' in post));
+      const [part1LLM, part2LLM, partNormalLLM] = hasModeration ? [] : await Promise.all([
         this.loadJsonFile('/data/part1_data/part1_llm_responses.json'),
         this.loadJsonFile('/data/part2_data/part2_llm_responses.json'),
         this.loadJsonFile('/data/partnormal_data/partnormal_llm_responses.json')
@@ -78,6 +118,9 @@ class DataService {
         })));
       }
 
+      // 同一帖子出现在多个分区时只保留 last_modify_ts 最新的一条（转换脚本去重后的数据不会出现）
+      allPosts = this.dedupePosts(allPosts);
+
       console.log(`🔗 合并后总数据量: ${allPosts.length} 条`);
 
       // 合并所有LLM响应
@@ -91,8 +134,8 @@ class DataService {
       const processedPosts = await this.processPosts(allPosts, allLLMData);
       this.posts = processedPosts;
       
-      // 生成统计信息
-      this.statistics = this.generateStatistics(processedPosts);
+      // 生成统计信息（优先使用预先计算的统计）
+      this.statistics = this.rollupStatistics || this.generateStatistics(processedPosts);
       
       const endTime = performance.now();
       console.log(`✅ DataService: 数据处理完成，耗时 ${Math.round(endTime - startTime)}ms`);
@@ -106,6 +149,217 @@ class DataService {
     }
   }
 
+  /**
+   * 按帖子ID去重：保留 last_modify_ts 最新的一条，相同时保留先出现的一条（与转换脚本规则一致）
+   */
+  dedupePosts(posts) {
+    const kept = new Map();
+    posts.forEach(post => {
+      const existing = kept.get(post.id);
+      if (!existing || this.safeParseInt(post.last_modify_ts) > this.safeParseInt(existing.last_modify_ts)) {
+        kept.set(post.id, post);
+      }
+    });
+    if (kept.size === posts.length) return posts;
+
+    console.warn(`⚠️ 分区间存在 ${posts.length - kept.size} 条重复帖子，已按 last_modify_ts 去重`);
+    return posts.filter(post => kept.get(post.id) === post);
+  }
+
+  async loadShardedData(shardIndex) {
+    console.log(`🧩 分片模式: ${shardIndex.total_posts} 条帖子, ${shardIndex.shards.length} 个分片`);
+
+    this.shardIndex = shardIndex;
+    this.shardPosts = new Array(shardIndex.shards.length).fill(null);
+    this.shardLoading.clear();
+
+    if (shardIndex.shards.length > 0) {
+      await this.loadShard(0);
+    } else {
+      this.updateLoadedPosts();
+    }
+  }
+
+  /**
+   * 加载单个分片（同一分片只请求一次）
+   * @param {number} shardNumber - 分片序号
+   */
+  loadShard(shardNumber) {
+    if (this.shardPosts[shardNumber]) {
+      return Promise.resolve(this.shardPosts[shardNumber]);
+    }
+    if (this.shardLoading.has(shardNumber)) {
+      return this.shardLoading.get(shardNumber);
+    }
+
+    const shardInfo = this.shardIndex.shards[shardNumber];
+    const promise = (async () => {
+      const shard = await this.loadJsonFile(`/data/shards/${shardInfo.file}`);
+      const posts = (shard?.posts || []).map((post, offset) => ({
+        ...post,
+        id: post.note_id || post.id || `${post.source}_${post.original_index}`,
+        originalIndex: post.original_index,
+        shardOffset: offset // 分片内序号，对应搜索索引中的倒排列表
+      }));
+
+      const processedPosts = await this.processPosts(posts, shard?.llm_responses || {});
+      this.shardPosts[shardNumber] = processedPosts;
+      this.shardLoading.delete(shardNumber);
+      // 分片数据已处理，原始JSON不再需要缓存
+      this.cache.delete(`/data/shards/${shardInfo.file}`);
+      this.updateLoadedPosts();
+      console.log(`🧩 分片 ${shardNumber + 1}/${this.shardIndex.shards.length} 加载完成: ${processedPosts.length} 条`);
+      return processedPosts;
+    })();
+
+    this.shardLoading.set(shardNumber, promise);
+    return promise;
+  }
+
+  /**
+   * 确保 [startIndex, endIndex) 范围内的帖子所在分片都已加载
+   */
+  async ensureShardsLoaded(startIndex, endIndex) {
+    const shardNumbers = this.shardIndex.shards
+      .map((shard, number) => ({ shard, number }))
+      .filter(({ shard }) => shard.start < endIndex && shard.start + shard.count > startIndex)
+      .map(({ number }) => number);
+
+    await Promise.all(shardNumbers.map(number => this.loadShard(number)));
+  }
+
+  async loadAllShards() {
+    await Promise.all(this.shardIndex.shards.map((_, number) => this.loadShard(number)));
+  }
+
+  /**
+   * 按需加载帖子的完整评论（分片中的帖子只带前几条评论）
+   * 同一评论文件只请求一次，文件中按 note_id 分组的评论已组装成回复树并排好序
+   * @param {Object} post - 处理后的帖子
+   * @returns {Promise<Array>} 完整评论树
+   */
+  async loadComments(post) {
+    if (!post.commentsFile || post.commentsLoaded) {
+      return post.comments;
+    }
+
+    const path = `/data/shards/${post.commentsFile}`;
+    if (!this.commentsLoading.has(path)) {
+      this.commentsLoading.set(path, this.loadJsonFile(path).then(data => {
+        if (!data) this.commentsLoading.delete(path);
+        return data;
+      }));
+    }
+
+    const data = await this.commentsLoading.get(path);
+    if (!data) {
+      return post.comments;
+    }
+    post.comments = this.processComments(data.comments?.[post.noteId] || []);
+    post.commentsLoaded = true;
+    return post.comments;
+  }
+
+  /**
+   * 用已加载分片的连续前缀更新 posts 与统计信息
+   */
+  updateLoadedPosts() {
+    const loadedPosts = [];
+    for (const posts of this.shardPosts) {
+      if (!posts) break;
+      loadedPosts.push(...posts);
+    }
+    this.posts = loadedPosts;
+
+    if (this.rollupStatistics) {
+      this.statistics = this.rollupStatistics;
+      return;
+    }
+
+    const allLoaded = this.shardPosts.every(posts => posts !== null);
+    this.statistics = {
+      ...this.generateStatistics(loadedPosts),
+      totalPosts: this.shardIndex.total_posts,
+      isPartial: !allLoaded
+    };
+  }
+
+  /**
+   * 分片模式下取某一页：只加载该页所在的分片
+   */
+  async getShardedPage(page, pageSize) {
+    const totalItems = this.shardIndex.total_posts;
+    const startIndex = (page - 1) * pageSize;
+    const endIndex = Math.min(startIndex + pageSize, totalItems);
+
+    await this.ensureShardsLoaded(startIndex, endIndex);
+
+    const pageData = [];
+    this.shardIndex.shards.forEach((shard, number) => {
+      const posts = this.shardPosts[number];
+      if (!posts || shard.start >= endIndex || shard.start + shard.count <= startIndex) return;
+      const from = Math.max(startIndex - shard.start, 0);
+      const to = Math.min(endIndex - shard.start, posts.length);
+      pageData.push(...posts.slice(from, to));
+    });
+
+    return this.buildPageResult(pageData, page, pageSize, totalItems);
+  }
+
+  buildPageResult(pageData, page, pageSize, totalItems) {
+    const totalPages = Math.ceil(totalItems / pageSize);
+    return {
+      data: pageData,
+      pagination: {
+        currentPage: page,
+        pageSize: pageSize,
+        totalItems: totalItems,
+        totalPages: totalPages,
+        hasNextPage: page < totalPages,
+        hasPrevPage: page > 1
+      }
+    };
+  }
+
+  /**
+   * 读取数据配置，记录可用的预压缩编码；配置不存在时按未压缩文件加载
+   */
+  async loadDataConfig() {
+    try {
+      const response = await fetch('/data/config.json');
+      const config = response.ok ? await response.json() : null;
+      this.encodings = Array.isArray(config?.encodings) ? config.encodings : [];
+      this.statsPath = config?.stats || null;
+    } catch (error) {
+      this.encodings = [];
+      this.statsPath = null;
+    }
+  }
+
+  /**
+   * 请求JSON文件：存在 .gz 预压缩副本且浏览器支持 DecompressionStream 时请求更小的副本，
+   * 副本不可用时回退到原文件
+   */
+  async fetchJson(path) {
+    if (this.encodings.includes('gzip') && typeof DecompressionStream !== 'undefined') {
+      try {
+        const response = await fetch(`${path}.gz`);
+        if (response.ok) {
+          const stream = response.body.pipeThrough(new DecompressionStream('gzip'));
+          return { ok: true, data: await new Response(stream).json() };
+        }
+      } catch (error) {
+        console.warn(`⚠️ 预压缩文件加载失败，改用原文件: ${path}.gz`, error);
+      }
+    }
+
+    const response = await fetch(path);
+    if (!response.ok) {
+      return { ok: false, response };
+    }
+    return { ok: true, data: await response.json() };
+  }
+
   async loadJsonFile(path) {
     // 检查缓存
     if (this.cache.has(path)) {
@@ -115,17 +369,16 @@ class DataService {
 
     try {
       console.log(`📄 加载文件: ${path}`);
-      const response = await fetch(path);
+      const { ok, response, data } = await this.fetchJson(path);
       
-      if (!response.ok) {
+      if (!ok) {
         if (response.status === 404) {
           console.warn(`⚠️ 文件不存在: ${path}`);
           return null;
         }
         throw new Error(`HTTP ${response.status}: ${response.statusText}`);
       }
-      
-      const data = await response.json();
+
       console.log(`✅ 文件加载成功: ${path} (${Array.isArray(data) ? data.length : Object.keys(data || {}).length} 条记录)`);
       
       // 缓存数据
@@ -165,6 +418,7 @@ class DataService {
         noteId: post.note_id || post.id,
         source: post.source,
         originalIndex: post.originalIndex,
+        shardOffset: post.shardOffset,
         
         // 内容信息
         title: post.title || '',
@@ -182,6 +436,7 @@ class DataService {
         imageCount: 0, // 将在后面异步设置
         imageFolder: post.image_folder_path || '',
         originalImageList: post.image_list || post.image || '',
+        imageManifest: Array.isArray(post.images) ? post.images : null, // 转换脚本生成的图片清单
         
         // 互动数据
         likedCount: this.safeParseInt(post.liked_count) || 0,
@@ -199,16 +454,21 @@ class DataService {
         tags: this.parseTags(post.tag_list),
         sourceKeyword: post.source_keyword || '',
         
-        // 评论数据
+        // 评论数据：分片中只有前几条顶层评论，完整评论树在 commentsFile 中按需加载
         comments: this.processComments(post.all_comments || []),
+        commentsFile: post.comments_file || null,
+        commentsTotal: post.comments_total ?? (post.all_comments || []).length,
+        commentsLoaded: !post.comments_file,
         
         // 其他
         noteUrl: post.note_url || '',
         videoUrl: post.video_url || ''
       };
 
-      // 添加审核信息
-      processed.moderation = this.createModerationResult(llmData, processed);
+      // 添加审核信息：优先使用转换脚本预先生成的审核结论
+      processed.moderation = 'moderation' in post
+        ? this.expandModeration(post.moderation)
+        : this.createModerationResult(llmData, processed);
       
       return processed;
       
@@ -229,9 +489,9 @@ class DataService {
         nickname: comment.nickname || '匿名用户',
         avatar: comment.avatar || '',
         time: this.safeParseInt(comment.create_time) || Date.now(),
-        likedCount: this.safeParseInt(comment.liked_count) || 0,
+        likedCount: this.safeParseInt(comment.like_count ?? comment.liked_count) || 0,
         parentId: comment.parent_comment_id || '0',
-        replies: comment.replies || []
+        replies: this.processComments(comment.replies || [])
       }))
       .filter(comment => comment.content.trim().length > 0);
   }
@@ -309,6 +569,18 @@ class DataService {
       return;
     }
 
+    // 转换脚本已提供图片清单时直接使用，不再发起任何探测请求
+    if (post.imageManifest) {
+      post.images = post.imageManifest.map(image => image.path);
+      post.imageCount = post.images.length;
+      post.image = post.images.length > 0 ? post.images[0] : null;
+      // --thumbnails 生成的衍生版本：网格用缩略图，详情页用详情尺寸，缺失时回退到原图
+      post.thumbnails = post.imageManifest.map(image => image.variants?.thumb?.path || image.path);
+      post.detailImages = post.imageManifest.map(image => image.variants?.detail?.path || image.path);
+      post.placeholder = post.imageManifest[0]?.placeholder || null;
+      return;
+    }
+
     try {
       const cacheKey = `${post.source}_${post.userId}`;
       
@@ -447,6 +719,43 @@ class DataService {
     }
   }
 
+  /**
+   * 展开转换脚本生成的精简审核结论 (decision/reasons/confidence/flags)
+   * @param {Object|null} block - 审核结论，null 表示该帖子没有LLM响应
+   */
+  expandModeration(block) {
+    if (!block) {
+      return this.createModerationResult(null, null);
+    }
+
+    const decision = block.decision || 'safe';
+    const normalizedDecision = decision.toLowerCase();
+    const isBlocked = normalizedDecision === 'block' || normalizedDecision === 'blocked';
+    const needsReview = normalizedDecision === 'review' || normalizedDecision === 'needs_review';
+    const flags = block.flags || [];
+
+    return {
+      isSafe: !isBlocked && !needsReview,
+      needsReview: needsReview,
+      isBlocked: isBlocked,
+      reasons: block.reasons || [],
+      confidence: block.confidence,
+      commentsBlocked: isBlocked,
+      results: {
+        overall: {
+          decision: decision,
+          hasViolentContent: flags.includes('violent_content'),
+          hasInappropriateContent: flags.includes('inappropriate_content'),
+          hasEmotionalContent: flags.includes('emotional_content'),
+          hasExcessiveSlang: flags.includes('excessive_slang')
+        },
+        text: block.text || { isSafe: true, reasons: [] },
+        image: block.image || { isSafe: true, reasons: [] },
+        comments: block.comments || { isSafe: true, reasons: [], blockedCount: 0 }
+      }
+    };
+  }
+
   parseLLMResult(llmResult) {
     try {
       // 处理不同格式的LLM结果
@@ -574,6 +883,41 @@ class DataService {
     };
   }
 
+  /**
+   * 将 stats.json 转换为 generateStatistics 的结构，并附带各维度分组与直方图
+   * @param {Object} rollup - 转换脚本生成的统计数据
+   */
+  statisticsFromRollup(rollup) {
+    const totals = rollup.totals || {};
+    const toDate = time => (time ? new Date(time > 1e10 ? time : time * 1000) : null);
+    const byPartition = rollup.by_partition || {};
+
+    return {
+      totalPosts: totals.totalPosts || 0,
+      totalUsers: totals.totalUsers || 0,
+      safeContent: totals.safeContent || 0,
+      blockedContent: totals.blockedContent || 0,
+      reviewContent: totals.reviewContent || 0,
+      withImages: totals.withImages ?? 0,
+      withComments: totals.withComments || 0,
+      avgInteractions: totals.avgInteractions || 0,
+      sourcesBreakdown: Object.fromEntries(
+        Object.entries(byPartition).map(([source, group]) => [source, group.posts])
+      ),
+      timeRange: {
+        earliest: toDate(totals.timeRange?.earliest),
+        latest: toDate(totals.timeRange?.latest)
+      },
+      breakdowns: {
+        partition: byPartition,
+        keyword: rollup.by_keyword || {},
+        location: rollup.by_location || {},
+        day: rollup.by_day || {}
+      },
+      histograms: rollup.histograms || {}
+    };
+  }
+
   generateStatistics(posts) {
     const stats = {
       totalPosts: posts.length,
@@ -649,37 +993,135 @@ class DataService {
   }
 
   // 分页支持方法
-  async getPostsPage(page = 1, pageSize = 20, filters = {}) {
+  /**
+   * 搜索帖子：标题、正文、昵称、标签、搜索关键词与评论内容
+   * 分片模式下使用转换脚本生成的倒排索引，只加载含有候选帖子的分片
+   * @param {string} query - 查询词
+   */
+  async findMatchingPosts(query) {
+    if (!this.isLoaded) {
+      await this.loadData();
+    }
+
+    const keyword = query.trim().toLowerCase();
+    if (!keyword) {
+      return this.getAllPosts();
+    }
+
+    if (this.shardIndex && this.shardIndex.shards.every(shard => shard.search)) {
+      return this.searchShardedPosts(keyword);
+    }
+
     const allPosts = await this.getAllPosts();
-    
-    // 应用过滤器
-    let filteredPosts = allPosts;
-    
-    if (filters.search) {
-      const keyword = filters.search.toLowerCase();
-      filteredPosts = filteredPosts.filter(post => 
-        post.title?.toLowerCase().includes(keyword) ||
-        post.content?.toLowerCase().includes(keyword) ||
-        post.nickname?.toLowerCase().includes(keyword)
-      );
+    return allPosts.filter(post => this.matchesSearch(post, keyword));
+  }
+
+  matchesSearch(post, keyword) {
+    return Boolean(
+      post.title?.toLowerCase().includes(keyword) ||
+      post.content?.toLowerCase().includes(keyword) ||
+      post.nickname?.toLowerCase().includes(keyword) ||
+      post.sourceKeyword?.toLowerCase().includes(keyword) ||
+      post.tags?.some(tag => String(tag).toLowerCase().includes(keyword)) ||
+      this.commentsMatch(post.comments, keyword)
+    );
+  }
+
+  commentsMatch(comments, keyword) {
+    return Boolean(comments?.some(comment =>
+      comment.content.toLowerCase().includes(keyword) || this.commentsMatch(comment.replies, keyword)
+    ));
+  }
+
+  /**
+   * 按分片倒排索引求候选帖子，逐条确认后按分片顺序（时间倒序）返回
+   */
+  async searchShardedPosts(keyword) {
+    const matchedByShard = await Promise.all(this.shardIndex.shards.map(async (shard, number) => {
+      const searchIndex = await this.loadJsonFile(`/data/shards/${shard.search}`);
+      const candidates = this.intersectPostings(searchIndex?.postings || {}, keyword, searchIndex?.ngram || 2);
+      if (candidates.length === 0) return [];
+
+      const posts = await this.loadShard(number);
+      const postsByOffset = new Map(posts.map(post => [post.shardOffset, post]));
+      const matched = [];
+      for (const post of candidates.map(offset => postsByOffset.get(offset)).filter(Boolean)) {
+        // 候选帖子可能只匹配到未加载的评论，此时加载完整评论后再确认
+        if (this.matchesSearch(post, keyword) ||
+            (!post.commentsLoaded && this.commentsMatch(await this.loadComments(post), keyword))) {
+          matched.push(post);
+        }
+      }
+      return matched;
+    }));
+    return matchedByShard.flat();
+  }
+
+  /**
+   * 查询词各 n-gram 倒排列表的交集；查询词短于 n 时合并所有包含它的词项
+   */
+  intersectPostings(postings, keyword, ngram) {
+    const chars = Array.from(keyword);
+
+    if (chars.length < ngram) {
+      const offsets = new Set();
+      Object.keys(postings)
+        .filter(gram => gram.includes(keyword))
+        .forEach(gram => postings[gram].forEach(offset => offsets.add(offset)));
+      return [...offsets].sort((a, b) => a - b);
+    }
+
+    const lists = [];
+    for (let i = 0; i + ngram <= chars.length; i++) {
+      const list = postings[chars.slice(i, i + ngram).join('')];
+      if (!list) return [];
+      lists.push(list);
+    }
+
+    // 从最短的列表开始求交集
+    lists.sort((a, b) => a.length - b.length);
+    let result = lists[0];
+    for (const list of lists.slice(1)) {
+      const members = new Set(list);
+      result = result.filter(offset => members.has(offset));
+      if (result.length === 0) break;
+    }
+    return result;
+  }
+
+  async getPostsPage(page = 1, pageSize = 20, filters = {}) {
+    if (!this.isLoaded) {
+      await this.loadData();
     }
+
+    // 分片模式且没有过滤条件时，只加载当前页所在的分片
+    const hasFilters = Boolean(filters.search) || (filters.type && filters.type !== 'all');
+    if (this.shardIndex && !hasFilters) {
+      return this.getShardedPage(page, pageSize);
+    }
+
+    // 应用过滤器：搜索优先使用倒排索引
+    let filteredPosts = filters.search
+      ? await this.findMatchingPosts(filters.search)
+      : await this.getAllPosts();
     
     if (filters.type && filters.type !== 'all') {
       switch (filters.type) {
         case 'safe':
-          filteredPosts = filteredPosts.filter(post => post.moderation.isSafe);
+          filteredPosts = filteredPosts.filter(post => post.moderation?.isSafe);
           break;
         case 'blocked':
-          filteredPosts = filteredPosts.filter(post => post.moderation.isBlocked);
+          filteredPosts = filteredPosts.filter(post => post.moderation?.isBlocked);
           break;
         case 'review':
-          filteredPosts = filteredPosts.filter(post => post.moderation.needsReview);
+          filteredPosts = filteredPosts.filter(post => post.moderation?.needsReview);
           break;
         case 'image':
-          filteredPosts = filteredPosts.filter(post => post.image);
+          filteredPosts = filteredPosts.filter(post => post.images && post.images.length > 0);
           break;
         case 'text':
-          filteredPosts = filteredPosts.filter(post => !post.image);
+          // 纯文字：有正文且没有图片
+          filteredPosts = filteredPosts.filter(post => post.content && (!post.images || post.images.length === 0));
           break;
         default:
           // 保持原有的filteredPosts，不做额外过滤
@@ -688,23 +1130,11 @@ class DataService {
     }
 
     // 分页计算
-    const totalItems = filteredPosts.length;
-    const totalPages = Math.ceil(totalItems / pageSize);
     const startIndex = (page - 1) * pageSize;
     const endIndex = startIndex + pageSize;
     const pageData = filteredPosts.slice(startIndex, endIndex);
 
-    return {
-      data: pageData,
-      pagination: {
-        currentPage: page,
-        pageSize: pageSize,
-        totalItems: totalItems,
-        totalPages: totalPages,
-        hasNextPage: page < totalPages,
-        hasPrevPage: page > 1
-      }
-    };
+    return this.buildPageResult(pageData, page, pageSize, filteredPosts.length);
   }
 
   // 清理缓存
@@ -713,6 +1143,11 @@ class DataService {
     this.isLoaded = false;
     this.posts = [];
     this.statistics = null;
+    this.shardIndex = null;
+    this.shardPosts = [];
+    this.shardLoading.clear();
+    this.commentsLoading.clear();
+    this.rollupStatistics = null;
   }
 
   // 获取帖子详情（包含完整评论数据）
@@ -723,19 +1158,10 @@ class DataService {
 
   // 搜索相关帖子
   async searchPosts(query, limit = 10) {
-    if (!query || typeof query !== 'string') return [];
+    if (!query || typeof query !== 'string' || !query.trim()) return [];
     
-    const allPosts = await this.getAllPosts();
-    const keyword = query.toLowerCase().trim();
-    
-    return allPosts
-      .filter(post => 
-        post.title?.toLowerCase().includes(keyword) ||
-        post.content?.toLowerCase().includes(keyword) ||
-        post.nickname?.toLowerCase().includes(keyword) ||
-        post.tags?.some(tag => tag.toLowerCase().includes(keyword))
-      )
-      .slice(0, limit);
+    const matchedPosts = await this.findMatchingPosts(query);
+    return matchedPosts.slice(0, limit);
   }
 
   // 获取用户的所有帖子
@@ -771,4 +1197,7 @@ class DataService {
   }
 }
 
+// 应用内共享的数据服务实例（已加载的分片与搜索索引在各页面间复用）
+export const dataService = new DataService();
+
 export default DataService;
\ No newline at end of file